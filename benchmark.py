@@ -0,0 +1,263 @@
+import csv
+import os
+import py_compile
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import openpyxl
+import pandas as pd
+from openpyxl.styles import Alignment, Border, Font, PatternFill, Side
+
+from pr_statistics import (STATUS_CLA_FAILED, STATUS_CONFLICT, STATUS_DRAFT, PullRecord, group_pulls_by_repo,
+                           status_text, write_statistics_xlsx)
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HEAVY_MODULES = ['pandas', 'openpyxl', 'requests', 'yaml', 'smtplib', 'email']
+# budgets over a bare interpreter start, in seconds
+IMPORT_BUDGET = float(os.getenv('IMPORT_BUDGET', '0.1'))
+HELP_BUDGET = float(os.getenv('HELP_BUDGET', '0.15'))
+
+
+def generate_pulls(repo_count=30000, pull_count=10000, seed=0):
+    """
+    Generate a synthetic list of repositories and open pulls
+    :param repo_count: number of repositories
+    :param pull_count: number of open pulls
+    :param seed: seed of the random generator
+    :return: repos, pulls
+    """
+    rand = random.Random(seed)
+    repos = ['{}/repo-{}'.format('src-openeuler' if i % 10 else 'openeuler', i) for i in range(repo_count)]
+    pulls = []
+    for i in range(pull_count):
+        repo = rand.choice(repos)
+        pulls.append({'link': 'https://gitee.com/{}/pulls/{}'.format(repo, i + 1)})
+    return repos, pulls
+
+
+def prefix_scan(repos, pulls):
+    """
+    Look up open pulls of every repository by scanning the whole mapping (the former implementation)
+    :param repos: full names of repositories
+    :param pulls: a list of pulls
+    :return: number of matched pulls
+    """
+    mapping = {x['link'].split('/', 3)[3]: x for x in pulls}
+    matched = 0
+    for full_repo in repos:
+        for mapping_key in mapping.keys():
+            if mapping_key.startswith(full_repo + '/'):
+                matched += 1
+    return matched
+
+
+def index_lookup(repos, pulls):
+    """
+    Look up open pulls of every repository through the index built by group_pulls_by_repo
+    :param repos: full names of repositories
+    :param pulls: a list of pulls
+    :return: number of matched pulls
+    """
+    mapping = group_pulls_by_repo(pulls)
+    matched = 0
+    for full_repo in repos:
+        matched += len(mapping.get(full_repo, []))
+    return matched
+
+
+def timeit(func, *args):
+    """
+    Time a single call of func
+    :return: result, elapsed seconds
+    """
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_pulls_index(repo_count=30000, pull_count=10000, scan_sample=1000):
+    """
+    Compare the prefix scan with the index lookup
+    :param repo_count: number of repositories
+    :param pull_count: number of open pulls
+    :param scan_sample: number of repositories timed with the prefix scan, the rest is extrapolated
+    """
+    repos, pulls = generate_pulls(repo_count, pull_count)
+    _, scan_elapsed = timeit(prefix_scan, repos[:scan_sample], pulls)
+    scan_elapsed = scan_elapsed * repo_count / scan_sample
+    matched, index_elapsed = timeit(index_lookup, repos, pulls)
+    print('pulls index: {} repos, {} pulls, {} matched'.format(repo_count, pull_count, matched))
+    print('  prefix scan (extrapolated from {} repos): {:.3f}s'.format(scan_sample, scan_elapsed))
+    print('  index lookup: {:.3f}s ({:.0f}x)'.format(index_elapsed, scan_elapsed / index_elapsed))
+
+
+def generate_pr_list(pr_count=5000, sig_count=20, seed=0):
+    """
+    Generate the ordered Pull Requests of a reviewer
+    :param pr_count: number of Pull Requests
+    :param sig_count: number of sigs
+    :param seed: seed of the random generator
+    :return: PullRecords ordered by sig
+    """
+    rand = random.Random(seed)
+    pr_list = []
+    for i in range(pr_count):
+        sig = 'sig-{:02d}'.format(rand.randrange(sig_count))
+        link = 'https://gitee.com/src-openeuler/repo-{}/pulls/{}'.format(rand.randrange(1000), i)
+        status = rand.choice([0, 0, STATUS_DRAFT, STATUS_CLA_FAILED | STATUS_CONFLICT])
+        pr_list.append(PullRecord(sig, link.split('/', 3)[3].rsplit('/', 2)[0], 'master', link, 'title {}'.format(i),
+                                  rand.randrange(800), status))
+    pr_list.sort(key=lambda x: (x.sig, -x.age))
+    return pr_list
+
+
+def legacy_rows(pr_list):
+    """
+    Convert PullRecords to the csv rows of the former pipeline
+    :param pr_list: PullRecords
+    :return: rows of [sig, repo, branch, number link, title link, status, duration]
+    """
+    return [[x.sig, x.repo, x.branch, x.number_link, x.title_link, status_text(x.status), str(x.age)]
+            for x in pr_list]
+
+
+def legacy_xlsx_pipeline(filepath, pr_list, compare_dict):
+    """
+    Build the report the former way: csv, two pandas round trips, then inserting and styling rows with openpyxl
+    :param filepath: path of the xlsx file
+    :param pr_list: Pull Requests ordered by sig
+    :param compare_dict: a dict of every sig and its compare info
+    """
+    csv_file = filepath.replace('.xlsx', '.csv')
+    with open(csv_file, 'w', encoding='utf-8') as f:
+        csv.writer(f).writerows(pr_list)
+    pd.read_csv(csv_file, encoding='utf-8').to_csv(csv_file, mode='w', index=False)
+    pd.read_csv(csv_file, encoding='utf-8').to_excel(filepath, sheet_name='open_pull_requests_statistics')
+    wb = openpyxl.load_workbook(filepath)
+    ws = wb.active
+    tmp_list = [row[1].value for row in ws.rows]
+    insert_rows = {}
+    for i in tmp_list:
+        if i not in insert_rows.keys():
+            insert_rows[tmp_list.index(i) + 1] = i
+    ws.delete_cols(1)
+    ws.delete_cols(1)
+    alignment_center = Alignment(horizontal='center', vertical='center')
+    insert_count = 0
+    for i in sorted(insert_rows.keys()):
+        sig_name = insert_rows[i]
+        i += insert_count
+        ws.insert_rows(i)
+        ws['A' + str(i)] = sig_name
+        ws['A' + str(i)].font = Font(name='黑体', size=20, bold=True)
+        ws.merge_cells(start_row=i, end_row=i, start_column=1, end_column=6)
+        ws.insert_rows(i + 1)
+        ws['A' + str(i + 1)] = compare_dict.get(sig_name)
+        ws['A' + str(i + 1)].font = Font(name='黑体', color='FF0000')
+        ws.merge_cells(start_row=i + 1, end_row=i + 1, start_column=1, end_column=6)
+        ws.insert_rows(i + 2)
+        for col, title in zip('ABCDEF', ['仓库', '目标分支', '编号', '标题', '状态', '开启天数']):
+            ws[col + str(i + 2)] = title
+            ws[col + str(i + 2)].font = Font(bold=True)
+            ws[col + str(i + 2)].alignment = alignment_center
+        insert_count += 3
+    fills = [(365, PatternFill('solid', start_color='FF4500')), (30, PatternFill('solid', start_color='FF7F50')),
+             (7, PatternFill('solid', start_color='FFDAB9'))]
+    for i in ws.iter_rows(min_row=3, min_col=6, max_col=6):
+        try:
+            value = int(i[0].value)
+        except (TypeError, ValueError):
+            continue
+        for threshold, fill in fills:
+            if value > threshold:
+                i[0].fill = fill
+                break
+    yellow_fill = PatternFill('solid', start_color='FFFF00')
+    for j in ws.iter_rows(min_row=3, min_col=5, max_col=5):
+        if j[0].value and (len(j[0].value) > 3 or j[0].value == '草稿'):
+            j[0].fill = yellow_fill
+    side = Side(border_style='thin', color='000000')
+    border = Border(left=side, right=side, top=side, bottom=side)
+    for row in ws.rows:
+        row[5].alignment = alignment_center
+        for cell in row:
+            cell.border = border
+    wb.save(filepath)
+    wb.close()
+
+
+def bench_xlsx_writer(pr_count=5000):
+    """
+    Compare the former csv/pandas/openpyxl pipeline with the streaming writer
+    :param pr_count: number of Pull Requests of the reviewer
+    """
+    pr_list = generate_pr_list(pr_count)
+    compare_dict = {x.sig: 'PR处理率为50.0%, 同比上周不变' for x in pr_list}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _, legacy_elapsed = timeit(legacy_xlsx_pipeline, os.path.join(tmp_dir, 'legacy.xlsx'), legacy_rows(pr_list),
+                                   compare_dict)
+        _, stream_elapsed = timeit(write_statistics_xlsx, os.path.join(tmp_dir, 'stream.xlsx'), pr_list, compare_dict)
+    print('xlsx report: {} pull requests'.format(pr_count))
+    print('  csv/pandas/openpyxl pipeline: {:.3f}s'.format(legacy_elapsed))
+    print('  streaming writer: {:.3f}s ({:.1f}x)'.format(stream_elapsed, legacy_elapsed / stream_elapsed))
+
+
+def time_python(args, cwd, repeat):
+    """
+    Time a fresh interpreter running args
+    :param args: arguments of the interpreter
+    :param cwd: working directory of the interpreter
+    :param repeat: number of runs
+    :return: median elapsed seconds, stdout of the last run
+    """
+    env = dict(os.environ, PYTHONPATH=HERE)
+    elapsed = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable] + args, cwd=cwd, env=env, capture_output=True, text=True, check=True)
+        elapsed.append(time.perf_counter() - start)
+    return statistics.median(elapsed), result.stdout
+
+
+def bench_startup(repeat=7):
+    """
+    Guard the start of the CLI: importing pr_statistics must not load heavy libraries nor write files, and importing
+    it or printing the help must stay within its budget over a bare interpreter start
+    :param repeat: number of runs timed
+    :return: whether the start is within its budget
+    """
+    ok = True
+    # time the import from bytecode even if PYTHONDONTWRITEBYTECODE is set, the script is compiled on every run
+    py_compile.compile(os.path.join(HERE, 'pr_statistics.py'))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        probe = 'import sys, pr_statistics; print(",".join(m for m in {!r} if m in sys.modules))'.format(HEAVY_MODULES)
+        _, loaded = time_python(['-c', probe], tmp_dir, 1)
+        if loaded.strip():
+            print('  importing pr_statistics loads {}'.format(loaded.strip()))
+            ok = False
+        if os.listdir(tmp_dir):
+            print('  importing pr_statistics writes {}'.format(', '.join(sorted(os.listdir(tmp_dir)))))
+            ok = False
+        bare, _ = time_python(['-c', 'pass'], tmp_dir, repeat)
+        imported, _ = time_python(['-c', 'import pr_statistics'], tmp_dir, repeat)
+        helped, _ = time_python([os.path.join(HERE, 'pr_statistics.py'), '--help'], tmp_dir, repeat)
+    print('startup: median of {} runs, bare interpreter {:.3f}s'.format(repeat, bare))
+    for name, elapsed, budget in [('import', imported, IMPORT_BUDGET), ('--help', helped, HELP_BUDGET)]:
+        over = elapsed - bare
+        print('  {}: {:.3f}s (+{:.3f}s, budget {:.3f}s)'.format(name, elapsed, over, budget))
+        if over > budget:
+            ok = False
+    return ok
+
+
+if __name__ == '__main__':
+    if sys.argv[1:] == ['startup']:
+        sys.exit(0 if bench_startup() else 1)
+    bench_pulls_index()
+    bench_xlsx_writer()
+    if not bench_startup():
+        sys.exit(1)
@@ -0,0 +1,577 @@
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import random
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import yaml
+
+SCALES = {
+    'small': {'sigs': 20, 'repos_per_sig': 10, 'maintainers': 3, 'sig_info_ratio': 0.7, 'pulls': 1000},
+    'medium': {'sigs': 100, 'repos_per_sig': 30, 'maintainers': 4, 'sig_info_ratio': 0.7, 'pulls': 10000},
+    'large': {'sigs': 300, 'repos_per_sig': 100, 'maintainers': 5, 'sig_info_ratio': 0.7, 'pulls': 30000}
+}
+# stages of main() timed in the child process, in the order they start
+STAGES = ['prepare_env', 'get_sigs', 'all_sigs_compare', 'get_repos_pulls_mapping', 'build_open_pr_dict',
+          'pr_statistics']
+RESULTS_FILE = 'benchmark_results.jsonl'
+
+
+def generate_community(path, sigs, repos_per_sig, maintainers, sig_info_ratio, seed=0):
+    """
+    Generate a community repository with a synthetic sig tree. A share of sigs declares maintainers and committers
+    with email addresses in sig-info.yaml, the others only have an OWNERS file.
+    :param path: path of the repository
+    :param sigs: number of sigs
+    :param repos_per_sig: number of repositories of every sig
+    :param maintainers: number of maintainers of every sig
+    :param sig_info_ratio: share of sigs with a sig-info.yaml
+    :param seed: seed of the random generator
+    :return: full names of all repositories
+    """
+    rand = random.Random(seed)
+    sig_path = os.path.join(path, 'sig')
+    os.makedirs(os.path.join(sig_path, 'sig-template'))
+    with open(os.path.join(sig_path, 'README.md'), 'w') as f:
+        f.write('sigs\n')
+    # members are shared across sigs, like in the real community
+    users = ['user{}'.format(i) for i in range(max(sigs * maintainers // 2, maintainers + 1))]
+    all_repos = []
+    for i in range(sigs):
+        sig = 'sig-{}'.format(i)
+        repos = []
+        for j in range(repos_per_sig):
+            org = 'src-openeuler' if j % 3 else 'openeuler'
+            name = 'repo-{}-{}'.format(i, j)
+            repo_dir = os.path.join(sig_path, sig, org, name[0])
+            os.makedirs(repo_dir, exist_ok=True)
+            with open(os.path.join(repo_dir, name + '.yaml'), 'w') as f:
+                f.write('name: {}\n'.format(name))
+            repos.append('{}/{}'.format(org, name))
+        members = rand.sample(users, maintainers + 1)
+        if rand.random() < sig_info_ratio:
+            sig_info = {
+                'name': sig,
+                'maintainers': [{'gitee_id': x, 'email': '{}@example.com'.format(x)} for x in members[:-1]],
+                'repositories': [{'repo': repos[:len(repos) // 2],
+                                  'committers': [{'gitee_id': members[-1],
+                                                  'email': '{}@example.com'.format(members[-1])}]},
+                                 {'repo': repos[len(repos) // 2:]}]
+            }
+            with open(os.path.join(sig_path, sig, 'sig-info.yaml'), 'w') as f:
+                yaml.safe_dump(sig_info, f)
+        else:
+            with open(os.path.join(sig_path, sig, 'OWNERS'), 'w') as f:
+                yaml.safe_dump({'maintainers': members[:-1]}, f)
+        all_repos += repos
+    git = ['git', '-C', path, '-c', 'user.name=benchmark', '-c', 'user.email=benchmark@example.com']
+    subprocess.check_call(['git', 'init', '--quiet', '--initial-branch', 'master', path])
+    subprocess.check_call(git + ['add', '--all'])
+    subprocess.check_call(git + ['commit', '--quiet', '--message', 'synthetic community'])
+    # shallow partial clones over file:// need filters to be allowed
+    subprocess.check_call(git + ['config', 'uploadpack.allowFilter', 'true'])
+    return all_repos
+
+
+def generate_pulls(repos, count, seed=0):
+    """
+    Generate open pulls of the repositories, one out of ten pulls belongs to a repository of no sig
+    :param repos: full names of repositories
+    :param count: number of pulls
+    :param seed: seed of the random generator
+    :return: a list of pulls in the format of the pulls API
+    """
+    rand = random.Random(seed)
+    now = datetime.datetime.today()
+    pulls = []
+    for i in range(count):
+        repo = rand.choice(repos) if rand.random() < 0.9 else 'openeuler/no-sig-{}'.format(rand.randrange(100))
+        labels = ['openeuler-cla/yes'] if rand.random() < 0.8 else []
+        if rand.random() < 0.2:
+            labels.append('ci_failed')
+        created_at = now - datetime.timedelta(days=rand.choice([0, 3, 10, 45, 200, 800]),
+                                              seconds=rand.randrange(86400))
+        pulls.append({
+            'link': 'https://gitee.com/{}/pulls/{}'.format(repo, i + 1),
+            'title': 'Update package {}'.format(i),
+            'ref': rand.choice(['master', 'openEuler-22.03-LTS-SP1']),
+            'created_at': created_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'draft': rand.random() < 0.05,
+            'labels': ','.join(labels),
+            'mergeable': rand.random() < 0.9
+        })
+    return pulls
+
+
+class StubAPIHandler(BaseHTTPRequestHandler):
+    """
+    Serve /pulls and /query/sig/pr/state like ipb.osinfra.cn and dsapi.osinfra.cn, responses carry an ETag and
+    a request with a matching If-None-Match is answered with 304 Not Modified
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        time.sleep(self.server.latency)
+        if url.path == '/pulls':
+            per_page = int(query['per_page'][0])
+            start = (int(query['page'][0]) - 1) * per_page
+            body = {'total': len(self.server.pulls), 'data': self.server.pulls[start:start + per_page]}
+        elif url.path == '/query/sig/pr/state':
+            h = zlib.crc32((query['sig'][0] + query['timestamp'][0]).encode('utf-8'))
+            body = {'data': {'merged': h % 50, 'closed': h % 7, 'open': h % 13}}
+        else:
+            self.send_error(404)
+            return
+        data = json.dumps(body).encode('utf-8')
+        etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            data = b''
+            self.send_response(304)
+        else:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+        with self.server.lock:
+            self.server.requests[url.path] = self.server.requests.get(url.path, 0) + 1
+            self.server.bytes += len(data)
+
+
+class StubAPIServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, pulls, latency):
+        super().__init__(('127.0.0.1', 0), StubAPIHandler)
+        self.pulls = pulls
+        self.latency = latency
+        self.lock = threading.Lock()
+        self.requests = {}
+        self.bytes = 0
+
+
+class SinkSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Accept every message and drop it, no STARTTLS and no authentication
+    """
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('utf-8'))
+
+    def handle(self):
+        self.reply('220 sink')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip().upper()
+            if command.startswith(('EHLO', 'HELO')):
+                self.reply('250-sink')
+                self.reply('250 8BITMIME')
+            elif command == 'DATA':
+                self.reply('354 end data with <CR><LF>.<CR><LF>')
+                size = 0
+                for line in iter(self.rfile.readline, b''):
+                    if line == b'.\r\n':
+                        break
+                    size += len(line)
+                with self.server.lock:
+                    self.server.messages += 1
+                    self.server.bytes += size
+                self.reply('250 queued')
+            elif command == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class SinkSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), SinkSMTPHandler)
+        self.lock = threading.Lock()
+        self.messages = 0
+        self.bytes = 0
+
+
+def serve(server):
+    """
+    Serve in a daemon thread
+    :param server: server to start
+    :return: the server
+    """
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_child(result_file):
+    """
+    Run main() of pr_statistics in the current directory with every stage timed, configured by the environment
+    :param result_file: path of the json file to write timings to
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    start = time.perf_counter()
+    import pr_statistics
+    timings = {'import': time.perf_counter() - start}
+
+    def timed(name, func):
+        def wrapper(*args, **kwargs):
+            stage_start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[name] = time.perf_counter() - stage_start
+        return wrapper
+
+    for stage in STAGES:
+        setattr(pr_statistics, stage, timed(stage, getattr(pr_statistics, stage)))
+    start = time.perf_counter()
+    pr_statistics.main([])
+    timings['main'] = time.perf_counter() - start
+    with open(result_file, 'w') as f:
+        json.dump(timings, f)
+
+
+def stub_env(source, api, smtp):
+    """
+    Get the environment running pr_statistics against the stubs
+    :param source: path of the community repository
+    :param api: StubAPIServer
+    :param smtp: SinkSMTPServer
+    :return: environment variables
+    """
+    return dict(os.environ,
+                COMMUNITY_URL='file://' + source,
+                PULLS_URL='http://127.0.0.1:{}/pulls'.format(api.server_address[1]),
+                SIG_STATE_URL='http://127.0.0.1:{}/query/sig/pr/state'.format(api.server_address[1]),
+                SMTP_HOST='127.0.0.1',
+                SMTP_PORT=str(smtp.server_address[1]),
+                SMTP_STARTTLS='false',
+                SMTP_USERNAME='',
+                SMTP_SENDER='benchmark@example.com')
+
+
+def run_scale(name, params, latency, runs, api, smtp):
+    """
+    Run the job against a synthetic community and pulls of a scale. The first run starts from an empty working
+    directory, the following runs reuse it like successive cron runs do.
+    :param name: name of the scale
+    :param params: sigs, repos_per_sig, maintainers, sig_info_ratio and pulls of the scale
+    :param latency: seconds every API request waits before responding
+    :param runs: number of runs
+    :param api: StubAPIServer
+    :param smtp: SinkSMTPServer
+    :return: a list of results of every run
+    """
+    results = []
+    with tempfile.TemporaryDirectory(prefix='pr-statistics-benchmark-') as tmp_dir:
+        source = os.path.join(tmp_dir, 'community.git')
+        repos = generate_community(source, params['sigs'], params['repos_per_sig'], params['maintainers'],
+                                   params['sig_info_ratio'])
+        api.pulls = generate_pulls(repos, params['pulls'])
+        api.latency = latency
+        work_dir = os.path.join(tmp_dir, 'work')
+        os.makedirs(work_dir)
+        env = stub_env(source, api, smtp)
+        for run in range(runs):
+            api.requests = {}
+            api.bytes = 0
+            smtp.messages = smtp.bytes = 0
+            # every run is a new run of the job, a run with the id of the former one would resume it
+            env['RUN_ID'] = 'benchmark-{}'.format(run + 1)
+            result_file = os.path.join(tmp_dir, 'result.json')
+            with open(os.path.join(tmp_dir, 'output.log'), 'w') as output:
+                code = subprocess.call([sys.executable, os.path.abspath(__file__), '--child', result_file],
+                                       cwd=work_dir, env=env, stdout=output, stderr=subprocess.STDOUT)
+            if code != 0:
+                with open(os.path.join(tmp_dir, 'output.log')) as f:
+                    print(f.read()[-4000:], file=sys.stderr)
+                raise RuntimeError('Run {} of scale {} exited with {}'.format(run + 1, name, code))
+            with open(result_file) as f:
+                timings = json.load(f)
+            results.append({
+                'scale': name,
+                'params': params,
+                'latency': latency,
+                'run': 'cold' if run == 0 else 'warm',
+                'timings': timings,
+                'requests': dict(api.requests),
+                'api_bytes': api.bytes,
+                'emails': smtp.messages,
+                'email_bytes': smtp.bytes
+            })
+    return results
+
+
+def generate_events(repos, pulls, count, seed=0):
+    """
+    Generate pull webhook events: new pulls of sig repositories, updates and closes of open pulls
+    :param repos: full names of repositories
+    :param pulls: open pulls in the format of the pulls API
+    :param count: number of events
+    :param seed: seed of the random generator
+    :return: a list of events
+    """
+    rand = random.Random(seed)
+    open_pulls = list(pulls)
+    events = []
+    for i in range(count):
+        kind = rand.random()
+        if kind < 0.4 or not open_pulls:
+            pull = generate_pulls([rand.choice(repos)], 1, seed + i)[0]
+            pull['link'] = pull['link'].rsplit('/', 1)[0] + '/{}'.format(len(pulls) + i + 1)
+            open_pulls.append(pull)
+            events.append({'action': 'open', 'pull': pull})
+        elif kind < 0.8:
+            pull = dict(rand.choice(open_pulls), mergeable=rand.random() < 0.9)
+            events.append({'action': 'update', 'pull': pull})
+        else:
+            pull = open_pulls.pop(rand.randrange(len(open_pulls)))
+            events.append({'action': rand.choice(['close', 'merge']), 'pull': {'link': pull['link']}})
+    return events
+
+
+def post(url, payload=None):
+    """
+    Send a POST request
+    :param url: url of the request
+    :param payload: json body of the request
+    :return: decoded json response
+    """
+    data = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    with urllib.request.urlopen(request, timeout=600) as r:
+        return json.loads(r.read())
+
+
+def get(url):
+    """
+    Send a GET request
+    :param url: url of the request
+    :return: status code and body of the response
+    """
+    try:
+        with urllib.request.urlopen(url, timeout=600) as r:
+            return r.status, r.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+def run_daemon(name, params, latency, events, api, smtp):
+    """
+    Start the daemon against a synthetic community and pulls of a scale, send a digest, apply webhook events through
+    its HTTP endpoint, send a digest again and request the pages of every sig and reviewer twice
+    :param name: name of the scale
+    :param params: sigs, repos_per_sig, maintainers, sig_info_ratio and pulls of the scale
+    :param latency: seconds every API request waits before responding
+    :param events: number of webhook events
+    :param api: StubAPIServer
+    :param smtp: SinkSMTPServer
+    :return: result of the run
+    """
+    with tempfile.TemporaryDirectory(prefix='pr-statistics-benchmark-') as tmp_dir:
+        source = os.path.join(tmp_dir, 'community.git')
+        repos = generate_community(source, params['sigs'], params['repos_per_sig'], params['maintainers'],
+                                   params['sig_info_ratio'])
+        api.pulls = generate_pulls(repos, params['pulls'])
+        api.latency = latency
+        api.requests = {}
+        api.bytes = 0
+        smtp.messages = smtp.bytes = 0
+        work_dir = os.path.join(tmp_dir, 'work')
+        os.makedirs(work_dir)
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        url = 'http://127.0.0.1:{}'.format(port)
+        env = dict(stub_env(source, api, smtp), DAEMON_SEND_AT='')
+        timings = {}
+        start = time.perf_counter()
+        with open(os.path.join(tmp_dir, 'output.log'), 'w') as output:
+            daemon = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                    'pr_statistics.py'), 'daemon', '--port',
+                                       str(port), '--log-level', 'info'],
+                                      cwd=work_dir, env=env, stdout=output, stderr=subprocess.STDOUT)
+        try:
+            while True:
+                if daemon.poll() is not None:
+                    with open(os.path.join(tmp_dir, 'output.log')) as f:
+                        print(f.read()[-4000:], file=sys.stderr)
+                    raise RuntimeError('Daemon of scale {} exited with {}'.format(name, daemon.returncode))
+                try:
+                    with urllib.request.urlopen(url + '/healthz', timeout=1):
+                        break
+                except OSError:
+                    time.sleep(0.1)
+            timings['daemon_load'] = time.perf_counter() - start
+            start = time.perf_counter()
+            post(url + '/digest')
+            timings['digest_cold'] = time.perf_counter() - start
+            elapsed = []
+            for event in generate_events(repos, api.pulls, events):
+                start = time.perf_counter()
+                post(url + '/webhook', event)
+                elapsed.append(time.perf_counter() - start)
+            elapsed.sort()
+            if elapsed:
+                timings['event_median'] = elapsed[len(elapsed) // 2]
+                timings['event_p95'] = elapsed[int(len(elapsed) * 0.95)]
+            start = time.perf_counter()
+            post(url + '/digest')
+            timings['digest'] = time.perf_counter() - start
+            users = max(params['sigs'] * params['maintainers'] // 2, params['maintainers'] + 1)
+            pages = ['/sig/sig-{}'.format(i) for i in range(params['sigs'])]
+            pages += ['/reviewer/user{}'.format(i) for i in range(users)]
+            for run in ['page_cold', 'page_warm']:
+                elapsed = []
+                for page in pages:
+                    start = time.perf_counter()
+                    get(url + page)
+                    elapsed.append(time.perf_counter() - start)
+                timings[run] = sorted(elapsed)[len(elapsed) // 2]
+            page_cache = json.loads(get(url + '/stats')[1])['cache']
+        finally:
+            daemon.send_signal(signal.SIGINT)
+            daemon.wait()
+        return {
+            'scale': name,
+            'params': dict(params, events=events),
+            'latency': latency,
+            'run': 'daemon',
+            'timings': timings,
+            'page_cache': page_cache,
+            'requests': dict(api.requests),
+            'api_bytes': api.bytes,
+            'emails': smtp.messages,
+            'email_bytes': smtp.bytes
+        }
+
+
+def get_version():
+    """
+    Get the commit of the checkout the benchmark runs on
+    :return: commit hash with a -dirty suffix if there are local changes, or None if it is not a git checkout
+    """
+    repo = os.path.dirname(os.path.abspath(__file__))
+    p = subprocess.run(['git', '-C', repo, 'describe', '--always', '--dirty', '--abbrev=12'], stdout=subprocess.PIPE,
+                       stderr=subprocess.DEVNULL, universal_newlines=True)
+    if p.returncode != 0:
+        return
+    return p.stdout.strip()
+
+
+def load_results(path):
+    """
+    Load results of former benchmark runs
+    :param path: path of the results file
+    :return: a list of results
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(x) for x in f if x.strip()]
+
+
+def find_baseline(history, result):
+    """
+    Find the latest result of another version with the same scale, parameters and run
+    :param history: results of former benchmark runs
+    :param result: result to compare
+    :return: the baseline result, or None if there is none
+    """
+    for former in reversed(history):
+        if former.get('version') == result['version']:
+            continue
+        if all(former.get(x) == result[x] for x in ['scale', 'params', 'latency', 'run']):
+            return former
+
+
+def print_result(result, baseline=None):
+    """
+    Print timings of a run, with the change against the baseline if any
+    :param result: result of a run
+    :param baseline: result of a former version
+    """
+    print('{} ({} run, {} pulls, {} sigs): {} emails, requests {}, {} bytes of API responses'.format(
+        result['scale'], result['run'], result['params']['pulls'], result['params']['sigs'], result['emails'],
+        result['requests'], result.get('api_bytes')))
+    stages = ['import'] + STAGES + ['main']
+    for stage in stages + sorted(set(result['timings']) - set(stages)):
+        if stage not in result['timings']:
+            continue
+        elapsed = result['timings'][stage]
+        line = '  {:<24} {:8.3f}s'.format(stage, elapsed)
+        former = baseline['timings'].get(stage) if baseline else None
+        if former:
+            line += '  {:+6.1%} vs {}'.format(elapsed / former - 1, baseline['version'])
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end benchmark of pr_statistics.py against local stubs')
+    parser.add_argument('--scales', default='small,medium', help='comma separated scales: {}'.format(
+        ', '.join(SCALES)))
+    parser.add_argument('--sigs', type=int, help='number of sigs, overrides the scales')
+    parser.add_argument('--repos-per-sig', type=int, default=20)
+    parser.add_argument('--maintainers', type=int, default=4)
+    parser.add_argument('--sig-info-ratio', type=float, default=0.7)
+    parser.add_argument('--pulls', type=int, default=5000)
+    parser.add_argument('--latency', type=float, default=0.05, help='seconds every API request waits')
+    parser.add_argument('--runs', type=int, default=2, help='the first run is cold, the following ones are warm')
+    parser.add_argument('--daemon-events', type=int, default=0,
+                        help='also run the daemon of every scale and send it this many webhook events')
+    parser.add_argument('--output', default=RESULTS_FILE, help='json lines file keeping the results')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child(args.child)
+        return
+    if args.sigs:
+        scales = {'custom': {'sigs': args.sigs, 'repos_per_sig': args.repos_per_sig, 'maintainers': args.maintainers,
+                             'sig_info_ratio': args.sig_info_ratio, 'pulls': args.pulls}}
+    else:
+        scales = {x: SCALES[x] for x in args.scales.split(',')}
+    version = get_version()
+    history = load_results(args.output)
+    api = serve(StubAPIServer([], args.latency))
+    smtp = serve(SinkSMTPServer())
+    try:
+        for name, params in scales.items():
+            results = run_scale(name, params, args.latency, args.runs, api, smtp)
+            if args.daemon_events:
+                results.append(run_daemon(name, params, args.latency, args.daemon_events, api, smtp))
+            for result in results:
+                result['version'] = version
+                result['time'] = datetime.datetime.now().isoformat(timespec='seconds')
+                print_result(result, find_baseline(history, result))
+                with open(args.output, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(result, sort_keys=True) + '\n')
+    finally:
+        api.shutdown()
+        smtp.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,21 +1,28 @@
-import codecs
-import csv
+import argparse
+import cProfile
+import collections
+import contextlib
 import datetime
+import functools
+import gzip
+import hashlib
+import json
 import logging
-import openpyxl
+import math
 import os
-import pandas as pd
-import requests
-import smtplib
+import pickle
+import queue
+import random
+import sqlite3
 import subprocess
 import sys
+import threading
 import time
-import yaml
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from html import escape
+from itertools import repeat
 from logging import handlers
-from openpyxl.styles import Alignment, Border, PatternFill, Side, Font
-from xlsx2html import xlsx2html
+from string import Template
 
 
 class Logger(object):
@@ -27,9 +34,22 @@ class Logger(object):
         'crit': logging.CRITICAL
     }
 
-    def __init__(self, filename, level='info', when='D', backCount=3,
-                 fmt='%(asctime)s - %(pathname)s[line:%(lineno)d] - %(levelname)s: %(message)s'):
-        self.logger = logging.getLogger(filename)
+    def __init__(self, name):
+        self.logger = logging.getLogger(name)
+
+    def setup(self, filename, level='info', when='D', backCount=3,
+              fmt='%(asctime)s - %(pathname)s[line:%(lineno)d] - %(levelname)s: %(message)s'):
+        """
+        Log to stderr and to a file rotated every day, nothing is written to the file before it is set up
+        :param filename: path of the log file
+        :param level: name of the level
+        :param when: when to rotate the log file
+        :param backCount: number of rotated log files kept
+        :param fmt: format of log lines
+        """
+        for handler in list(self.logger.handlers):
+            self.logger.removeHandler(handler)
+            handler.close()
         format_str = logging.Formatter(fmt)
         self.logger.setLevel(self.level_relations.get(level))
         sh = logging.StreamHandler()
@@ -40,7 +60,390 @@ class Logger(object):
         self.logger.addHandler(th)
 
 
-log = Logger('statistics.log', level='debug')
+log = Logger('statistics.log')
+
+SIG_EXCLUDES = ['README.md', 'sig-template', 'sig-recycle', 'create_sig_info_template.py']
+SIG_INDEX_WORKERS = int(os.getenv('SIG_INDEX_WORKERS', '0'))
+# bumped whenever the layout of parsed sigs changes, persisted indexes of another version are built again
+SIG_INDEX_VERSION = 1
+CACHE_DIR = os.getenv('CACHE_DIR', 'cache')
+COMMUNITY_URL = os.getenv('COMMUNITY_URL', 'https://gitee.com/openeuler/community.git')
+COMMUNITY_BRANCH = os.getenv('COMMUNITY_BRANCH', 'master')
+COMMUNITY_SYNC = os.getenv('COMMUNITY_SYNC', 'incremental')
+LOG_FILE = os.getenv('LOG_FILE', 'statistics.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'debug')
+PULLS_URL = os.getenv('PULLS_URL', 'https://ipb.osinfra.cn/pulls')
+SIG_STATE_URL = os.getenv('SIG_STATE_URL', 'https://dsapi.osinfra.cn/query/sig/pr/state')
+PULLS_PER_PAGE = 100
+PULLS_STORE = os.getenv('PULLS_STORE', os.path.join(CACHE_DIR, 'pulls.sqlite3'))
+PULLS_CONCURRENCY = int(os.getenv('PULLS_CONCURRENCY', '8'))
+COMPARE_CONCURRENCY = int(os.getenv('COMPARE_CONCURRENCY', '16'))
+RATE_HISTORY = os.getenv('RATE_HISTORY', os.path.join(CACHE_DIR, 'rates.sqlite3'))
+RATE_HISTORY_DAYS = int(os.getenv('RATE_HISTORY_DAYS', '35'))
+RATE_LOCAL = os.getenv('RATE_LOCAL', 'false').lower() == 'true'
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '30'))
+HTTP_RETRIES = int(os.getenv('HTTP_RETRIES', '3'))
+HTTP_BACKOFF = float(os.getenv('HTTP_BACKOFF', '1'))
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# responses of the upstream APIs younger than the TTL of their endpoint are used without a request, older ones are
+# revalidated with their ETag or Last-Modified
+HTTP_CACHE = os.getenv('HTTP_CACHE', os.path.join(CACHE_DIR, 'http.sqlite3'))
+HTTP_CACHE_DAYS = int(os.getenv('HTTP_CACHE_DAYS', '7'))
+PULLS_CACHE_TTL = float(os.getenv('PULLS_CACHE_TTL', '0'))
+SIG_STATE_CACHE_TTL = float(os.getenv('SIG_STATE_CACHE_TTL', '3600'))
+HTTP_CACHE_TTLS = {PULLS_URL: PULLS_CACHE_TTL, SIG_STATE_URL: SIG_STATE_CACHE_TTL}
+STATUS_DRAFT = 1
+STATUS_CLA_FAILED = 2
+STATUS_CI_FAILED = 4
+STATUS_CONFLICT = 8
+STATUS_WAIT_FOR_UPDATE = 16
+STATUS_TEXTS = [(STATUS_DRAFT, '草稿'), (STATUS_CLA_FAILED, 'CLA认证失败'), (STATUS_CI_FAILED, '门禁检查失败'),
+                (STATUS_CONFLICT, '存在冲突'), (STATUS_WAIT_FOR_UPDATE, '等待更新')]
+REPORT_HEADER = ['仓库', '目标分支', '编号', '标题', '状态', '开启天数']
+# named styles and fills of durations longer than a week, a month and a year
+DURATION_FILLS = [('pr_duration_month', 'FFDAB9'), ('pr_duration_year', 'FF7F50'), ('pr_duration_years', 'FF4500')]
+REPORT_WORKERS = int(os.getenv('REPORT_WORKERS', str(os.cpu_count() or 1)))
+REPORT_ATTACH_XLSX = os.getenv('REPORT_ATTACH_XLSX', 'false').lower() == 'true'
+SMTP_HOST = os.getenv('SMTP_HOST', '')
+SMTP_PORT = int(os.getenv('SMTP_PORT') or '0')
+SMTP_USERNAME = os.getenv('SMTP_USERNAME', '')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD', '')
+SMTP_SENDER = os.getenv('SMTP_SENDER')
+SMTP_STARTTLS = os.getenv('SMTP_STARTTLS', 'true').lower() == 'true'
+SMTP_POOL_SIZE = int(os.getenv('SMTP_POOL_SIZE', '2'))
+SMTP_RATE = float(os.getenv('SMTP_RATE', '0'))
+SMTP_RETRIES = int(os.getenv('SMTP_RETRIES', '2'))
+SMTP_TIMEOUT = float(os.getenv('SMTP_TIMEOUT', '60'))
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE', '')
+METRICS_SUMMARY = os.getenv('METRICS_SUMMARY', os.path.join(CACHE_DIR, 'run_summary.json'))
+METRICS_PREFIX = 'pr_statistics_'
+METRICS_HELP = {
+    'stage_duration_seconds': 'Duration of stages of the last run',
+    'http_requests_total': 'HTTP requests sent by endpoint and status',
+    'http_request_duration_seconds': 'Latency of HTTP requests by endpoint',
+    'http_response_bytes_total': 'Bytes of HTTP responses by endpoint',
+    'http_cache_total': 'Lookups of the HTTP cache by endpoint and result',
+    'http_cache_saved_bytes_total': 'Bytes of responses served from the HTTP cache instead of downloaded',
+    'render_duration_seconds': 'Duration of rendering the report of a reviewer',
+    'rows_rendered_total': 'Pull Request rows rendered in reports',
+    'fragment_cache_total': 'Lookups of rendered fragments by result',
+    'smtp_emails_total': 'Report emails by outcome',
+    'smtp_send_duration_seconds': 'Duration of sending an email, retries included',
+    'smtp_bytes_total': 'Bytes of report emails handed to the SMTP server',
+    'report_changes_total': 'Reports by change since the last one sent to the reviewer',
+    'reports_skipped_total': 'Reports neither rendered nor sent under the send policy',
+    'webhook_events_total': 'Pull webhook events by action and result',
+    'webhook_apply_duration_seconds': 'Duration of applying a pull webhook event to the state of the daemon',
+    'digest_duration_seconds': 'Duration of a digest sent by the daemon, from its state to the last email',
+    'daemon_failures_total': 'Failed resyncs and scheduled digests of the daemon by task',
+    'page_request_duration_seconds': 'Latency of page requests of reviewers and sigs by view',
+    'page_cache_total': 'Lookups of rendered pages of reviewers and sigs by result',
+    'last_run_timestamp_seconds': 'Time when the last run finished'
+}
+# stages run under a profiler, cProfile writes <stage>.prof and pyinstrument writes <stage>.html to PROFILE_DIR
+PROFILE_STAGES = [x for x in os.getenv('PROFILE_STAGES', '').split(',') if x]
+PROFILER = os.getenv('PROFILER', 'cprofile')
+PROFILE_DIR = os.getenv('PROFILE_DIR', os.path.join(CACHE_DIR, 'profiles'))
+SNAPSHOT_VERSION = 1
+# runs are identified by their day unless RUN_ID is set, a restarted run resumes from the checkpoints of its id
+RUN_ID = os.getenv('RUN_ID', '')
+CHECKPOINTS = os.getenv('CHECKPOINTS', 'true').lower() == 'true'
+CHECKPOINT_DIR = os.getenv('CHECKPOINT_DIR', os.path.join(CACHE_DIR, 'checkpoints'))
+SEND_LEDGER = os.getenv('SEND_LEDGER', os.path.join(CACHE_DIR, 'ledger.sqlite3'))
+# digests of the last report sent to every reviewer, the changed policy skips reviewers whose report is unchanged and
+# changed-or-days sends an unchanged report again SEND_POLICY_DAYS after the last one
+REPORT_DIGESTS = os.getenv('REPORT_DIGESTS', os.path.join(CACHE_DIR, 'digests.sqlite3'))
+SEND_POLICIES = ['always', 'changed', 'changed-or-days']
+SEND_POLICY = os.getenv('SEND_POLICY', 'always')
+SEND_POLICY_DAYS = float(os.getenv('SEND_POLICY_DAYS', '7'))
+# the daemon keeps the state of a run in memory, applies pull webhook events to it, sends digests every day at
+# DAEMON_SEND_AT (HH:MM, none if empty) and fetches everything again every DAEMON_RESYNC_HOURS
+DAEMON_HOST = os.getenv('DAEMON_HOST', '127.0.0.1')
+DAEMON_PORT = int(os.getenv('DAEMON_PORT', '8080'))
+DAEMON_SEND_AT = os.getenv('DAEMON_SEND_AT', '09:30')
+DAEMON_RESYNC_HOURS = float(os.getenv('DAEMON_RESYNC_HOURS', '24'))
+# a failed resync or scheduled digest is retried after DAEMON_RETRY_MINUTES
+DAEMON_RETRY_MINUTES = float(os.getenv('DAEMON_RETRY_MINUTES', '15'))
+# compared with the X-Gitee-Token header of POST requests if set
+WEBHOOK_TOKEN = os.getenv('WEBHOOK_TOKEN', '')
+WEBHOOK_ACTIONS = ['open', 'update', 'close', 'merge']
+PULL_FIELDS = ['link', 'title', 'ref', 'created_at', 'draft', 'labels', 'mergeable']
+# pages of reviewers and sigs served by the daemon, the least recently used ones are evicted beyond the size
+REPORT_CACHE_BYTES = int(os.getenv('REPORT_CACHE_BYTES', str(64 * 1024 * 1024)))
+REPORT_CONTENT_TYPES = {
+    'html': 'text/html; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+# share of matched Pull Requests written to the debug log
+LOG_PR_SAMPLE = float(os.getenv('LOG_PR_SAMPLE', '0'))
+
+HTML_BORDER = 'border: 1px solid #000000; border-collapse: collapse; '
+HTML_STYLES = {
+    'sig_title': HTML_BORDER + 'font-family: 黑体; font-size: 20px; font-weight: bold; text-align: center',
+    'sig_compare': HTML_BORDER + 'font-family: 黑体; color: #FF0000; text-align: center',
+    'table_header': HTML_BORDER + 'font-weight: bold; text-align: center',
+    'pr_cell': HTML_BORDER + 'font-size: 11px',
+    'pr_status_abnormal': HTML_BORDER + 'font-size: 11px; background-color: #FFFF00',
+    'pr_duration': HTML_BORDER + 'font-size: 11px; text-align: center',
+    'pr_duration_month': HTML_BORDER + 'font-size: 11px; text-align: center; background-color: #FFDAB9',
+    'pr_duration_year': HTML_BORDER + 'font-size: 11px; text-align: center; background-color: #FF7F50',
+    'pr_duration_years': HTML_BORDER + 'font-size: 11px; text-align: center; background-color: #FF4500'
+}
+HTML_REPORT = Template('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>openEuler 待处理PR汇总</title>
+</head>
+<body>
+<p>Dear ${nickname},</p>
+<p>以下是您参与openEuler社区的SIG仓库下待处理的PR，烦请您及时跟进</p>
+<table style="border-collapse: collapse" border="0" cellspacing="0" cellpadding="0">
+${rows}
+</table>
+</body>
+</html>
+''')
+HTML_SIG_PAGE = Template('''<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="UTF-8">
+<title>openEuler ${sig} 待处理PR</title>
+</head>
+<body>
+<p>以下是${sig}的仓库下待处理的PR</p>
+<table style="border-collapse: collapse" border="0" cellspacing="0" cellpadding="0">
+${rows}
+</table>
+</body>
+</html>
+''')
+HTML_MERGED_ROW = Template('<tr><td colspan="6" style="${style}">${value}</td></tr>')
+HTML_HEADER_ROW = '<tr>{}</tr>'.format(''.join('<td style="{}">{}</td>'.format(HTML_STYLES['table_header'], x)
+                                               for x in REPORT_HEADER))
+HTML_PR_ROW = Template('<tr><td style="${cell_style}">${repo}</td><td style="${cell_style}">${branch}</td>'
+                       '<td style="${cell_style}">${number_link}</td><td style="${cell_style}">${link}</td>'
+                       '<td style="${status_style}">${status}</td><td style="${duration_style}">${duration}</td></tr>')
+
+
+class Metrics(object):
+    """
+    Metrics of a run: durations of stages, counters and summaries (count and sum) labelled like Prometheus metrics.
+    Counters and summaries are shared by threads, rendering in worker processes is reported back to the parent.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.shards = []
+        self.stages = {}
+        self.counters = {}
+        self.summaries = {}
+
+    def inc(self, name, value=1, **labels):
+        """
+        Increase a counter
+        :param name: name of the counter
+        :param value: value to add
+        :param labels: labels of the counter
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        Add an observation to a summary
+        :param name: name of the summary
+        :param value: observed value
+        :param labels: labels of the summary
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            count, total = self.summaries.get(key, (0, 0))
+            self.summaries[key] = (count + 1, total + value)
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """
+        Time a stage, and profile it if it is one of PROFILE_STAGES
+        :param name: name of the stage
+        """
+        profiler = start_profiler(name) if name in PROFILE_STAGES else None
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if profiler is not None:
+                stop_profiler(profiler, name)
+            with self.lock:
+                self.stages[name] = self.stages.get(name, 0) + elapsed
+
+    def summary(self):
+        """
+        Get the summary of the run
+        :return: a dict of stages, counters and summaries
+        """
+        with self.lock:
+            return {
+                'finished_at': int(time.time()),
+                'shards': list(self.shards),
+                'stages': dict(self.stages),
+                'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                             for (name, labels), value in sorted(self.counters.items(), key=str)],
+                'summaries': [{'name': name, 'labels': dict(labels), 'count': count, 'sum': total}
+                              for (name, labels), (count, total) in sorted(self.summaries.items(), key=str)]
+            }
+
+    def merge(self, summary):
+        """
+        Add the metrics of a run summary, a stage takes the longest duration since shards run side by side
+        :param summary: a dict returned by summary()
+        """
+        with self.lock:
+            self.shards += summary.get('shards', [])
+            for stage, elapsed in summary['stages'].items():
+                self.stages[stage] = max(self.stages.get(stage, 0), elapsed)
+            for x in summary['counters']:
+                key = (x['name'], tuple(sorted(x['labels'].items())))
+                self.counters[key] = self.counters.get(key, 0) + x['value']
+            for x in summary['summaries']:
+                key = (x['name'], tuple(sorted(x['labels'].items())))
+                count, total = self.summaries.get(key, (0, 0))
+                self.summaries[key] = (count + x['count'], total + x['sum'])
+
+    def summary_json(self):
+        """
+        Format the summary of the run as json
+        :return: json text
+        """
+        return json.dumps(self.summary(), indent=2, sort_keys=True)
+
+    def prometheus(self):
+        """
+        Format the metrics in the Prometheus text format
+        :return: text of the metrics
+        """
+        summary = self.summary()
+        samples = {'last_run_timestamp_seconds': [('', summary['finished_at'])],
+                   'stage_duration_seconds': [('{{stage="{}"}}'.format(k), v) for k, v in summary['stages'].items()]}
+        types = {'last_run_timestamp_seconds': 'gauge', 'stage_duration_seconds': 'gauge'}
+        for x in summary['counters']:
+            samples.setdefault(x['name'], []).append((format_labels(x['labels']), x['value']))
+            types[x['name']] = 'counter'
+        for x in summary['summaries']:
+            labels = format_labels(x['labels'])
+            samples.setdefault(x['name'], []).extend([('_count' + labels, x['count']), ('_sum' + labels, x['sum'])])
+            types[x['name']] = 'summary'
+        lines = []
+        for name in sorted(samples):
+            lines.append('# HELP {}{} {}'.format(METRICS_PREFIX, name, METRICS_HELP.get(name, name)))
+            lines.append('# TYPE {}{} {}'.format(METRICS_PREFIX, name, types[name]))
+            lines += ['{}{}{} {}'.format(METRICS_PREFIX, name, suffix, value) for suffix, value in samples[name]]
+        return '\n'.join(lines) + '\n'
+
+    def export(self, textfile=METRICS_TEXTFILE, summary_file=METRICS_SUMMARY):
+        """
+        Write the Prometheus textfile and the json summary of the run, files are replaced atomically so that a
+        collector never reads a partial file
+        :param textfile: path of the Prometheus textfile, skipped if empty
+        :param summary_file: path of the json summary, skipped if empty
+        """
+        for path, content in [(textfile, self.prometheus), (summary_file, self.summary_json)]:
+            if not path:
+                continue
+            os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(content())
+            os.replace(tmp_path, path)
+            log.logger.info('Write metrics to {}'.format(path))
+
+
+def format_labels(labels):
+    """
+    Format labels of a sample in the Prometheus text format
+    :param labels: a dict of labels
+    :return: labels text
+    """
+    if not labels:
+        return ''
+    values = []
+    for k, v in sorted(labels.items()):
+        values.append('{}="{}"'.format(k, str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')))
+    return '{' + ','.join(values) + '}'
+
+
+def start_profiler(stage):
+    """
+    Start profiling a stage in the current thread
+    :param stage: name of the stage
+    :return: the started profiler
+    """
+    if PROFILER == 'pyinstrument':
+        try:
+            import pyinstrument
+        except ImportError:
+            log.logger.warning('pyinstrument is not installed, profile {} with cProfile.'.format(stage))
+        else:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def stop_profiler(profiler, stage):
+    """
+    Stop profiling a stage and write the profile to PROFILE_DIR
+    :param profiler: profiler started by start_profiler
+    :param stage: name of the stage
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        path = os.path.join(PROFILE_DIR, '{}.prof'.format(stage))
+        profiler.dump_stats(path)
+    else:
+        profiler.stop()
+        path = os.path.join(PROFILE_DIR, '{}.html'.format(stage))
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profiler.output_html())
+    log.logger.info('Write profile of {} to {}'.format(stage, path))
+
+
+def instrumented(stage):
+    """
+    Decorate a function to time every call as a stage
+    :param stage: name of the stage
+    :return: decorator
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with metrics.stage(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+metrics = Metrics()
+
+
+@instrumented('prepare_env')
+def create_process_pool(workers, initializer=None):
+    """
+    Create a pool of worker processes started by a fork server. Pools are created while threads of the run are
+    fetching or sending, forking the current process could copy locks held by those threads.
+    :param workers: number of worker processes
+    :param initializer: function called in every worker process when it starts
+    :return: ProcessPoolExecutor
+    """
+    import multiprocessing
+
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('forkserver'),
+                               initializer=initializer)
 
 
 def prepare_env():
@@ -48,99 +451,273 @@ def prepare_env():
     Prepare repository and directory
     """
     log.logger.info('=' * 25 + ' PREPARE ENVIRONMENT ' + '=' * 25)
-    if os.path.exists('community'):
-        subprocess.call('rm -rf community', shell=True)
-    subprocess.call('git clone https://gitee.com/openeuler/community.git', shell=True)
-    if not os.path.exists('community'):
+    commit, changed = sync_community()
+    if not commit:
         log.logger.error('Fail to clone code, exit...')
         sys.exit(1)
-    data_dir = 'data'
+    if changed:
+        log.logger.info('Community is synced to {}'.format(commit))
+    else:
+        log.logger.info('Community is unchanged at {}'.format(commit))
+    data_dir = prepare_data_dir()
+    log.logger.info('ENV is already.\n')
+    return data_dir
+
+
+def prepare_data_dir(data_dir='data'):
+    """
+    Make an empty data directory
+    :param data_dir: path of the data directory
+    :return: path of the data directory
+    """
     if os.path.exists(data_dir):
         subprocess.call('rm -rf {}'.format(data_dir), shell=True)
-    subprocess.call('mkdir data', shell=True)
-    if not os.path.exists('data'):
+    subprocess.call('mkdir {}'.format(data_dir), shell=True)
+    if not os.path.exists(data_dir):
         log.logger.error('Fail to make data directory, exit...')
         sys.exit(1)
-    log.logger.info('ENV is already.\n')
     return data_dir
 
 
-def get_sigs():
+def clone_community(community='community'):
     """
-    Get relationship between sigs and repositories
+    Clone the community repository. In the incremental mode, only the latest commit and the sig directory are
+    checked out.
+    :param community: path of the community repository
+    :return: True if succeeded, otherwise False
     """
-    log.logger.info('=' * 25 + ' GET SIGS INFO ' + '=' * 25)
-    sig_path = os.path.join('community', 'sig')
-    sigs = []
-    sigs_list = []
-    for i in sorted(os.listdir(sig_path)):
-        if i in ['README.md', 'sig-template', 'sig-recycle', 'create_sig_info_template.py']:
-            continue
-        if i not in [x['name'] for x in sigs]:
-            sigs.append({'name': i, 'repositories': []})
-            sigs_list.append(i)
-        if 'openeuler' in os.listdir(os.path.join(sig_path, i)):
-            for filesdir, _, repos in os.walk(os.path.join(sig_path, i, 'openeuler')):
-                for repo in repos:
-                    for sig in sigs:
-                        if sig['name'] == i:
-                            repositories = sig['repositories']
-                            repositories.append(os.path.join('openeuler', repo.split('.yaml')[0]))
-        if 'src-openeuler' in os.listdir(os.path.join(sig_path, i)):
-            for filesdir, _, src_repos in os.walk(os.path.join(sig_path, i, 'src-openeuler')):
-                for src_repo in src_repos:
-                    for sig in sigs:
-                        if sig['name'] == i:
-                            repositories = sig['repositories']
-                            repositories.append(os.path.join('src-openeuler', src_repo.split('.yaml')[0]))
-    log.logger.info('Get sigs info.\n')
-    return sigs, sigs_list
+    if os.path.exists(community):
+        subprocess.call(['rm', '-rf', community])
+    if COMMUNITY_SYNC == 'full':
+        return subprocess.call(['git', 'clone', COMMUNITY_URL, community]) == 0
+    if subprocess.call(['git', 'clone', '--depth', '1', '--filter=blob:none', '--no-checkout', '--branch',
+                        COMMUNITY_BRANCH, COMMUNITY_URL, community]) != 0:
+        return False
+    if subprocess.call(['git', '-C', community, 'sparse-checkout', 'set', 'sig']) != 0:
+        return False
+    return subprocess.call(['git', '-C', community, 'checkout', COMMUNITY_BRANCH]) == 0
+
 
+def fetch_community(community='community'):
+    """
+    Fetch the latest commit of the community repository into an existing checkout
+    :param community: path of the community repository
+    :return: True if succeeded, otherwise False
+    """
+    if subprocess.call(['git', '-C', community, 'fetch', '--depth', '1', 'origin', COMMUNITY_BRANCH]) != 0:
+        return False
+    return subprocess.call(['git', '-C', community, 'reset', '--hard', '--quiet', 'FETCH_HEAD']) == 0
+
+
+def sync_community(community='community'):
+    """
+    Sync the community repository. COMMUNITY_SYNC=full clones it again on every run, COMMUNITY_SYNC=incremental
+    keeps a shallow sparse checkout and only fetches new commits.
+    :param community: path of the community repository
+    :return: commit of the checkout (None if failed) and whether it changed since the last run
+    """
+    last_commit = get_community_commit(community)
+    synced = False
+    if COMMUNITY_SYNC != 'full' and last_commit:
+        synced = fetch_community(community)
+        if not synced:
+            log.logger.warning('Fail to fetch community, clone it again.')
+    if not synced:
+        clone_community(community)
+    commit = get_community_commit(community)
+    return commit, commit != last_commit
 
-def get_maintainers(sig):
+
+def parse_sig(sig_path, sig):
     """
-    Get maintainers of the sig and mark where "maintainers" come from
+    Parse repositories, OWNERS and sig-info.yaml of a sig in one go
+    :param sig_path: path of the sig directory of the community repository
     :param sig: sig name
-    :return: maintainers, sig_info_mark
+    :return: a dict of repositories, maintainers, committers and emails of the sig
     """
-    owners_file = os.path.join('community', 'sig', sig, 'OWNERS')
-    sig_info_file = os.path.join('community', 'sig', sig, 'sig-info.yaml')
+    import yaml
+
+    yaml_loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    repositories = []
+    for org in ['openeuler', 'src-openeuler']:
+        for _, _, repos in os.walk(os.path.join(sig_path, sig, org)):
+            for repo in repos:
+                repositories.append(os.path.join(org, repo.split('.yaml')[0]))
+    owners_file = os.path.join(sig_path, sig, 'OWNERS')
+    sig_info_file = os.path.join(sig_path, sig, 'sig-info.yaml')
+    owners = None
+    sig_info = None
     if os.path.exists(owners_file):
         with open(owners_file, 'r', encoding='utf-8') as f:
-            maintainers = yaml.load(f.read(), Loader=yaml.Loader)['maintainers']
-            return maintainers, False
-    elif os.path.exists(sig_info_file):
+            owners = yaml.load(f, Loader=yaml_loader)
+    if os.path.exists(sig_info_file):
         with open(sig_info_file, 'r', encoding='utf-8') as f:
-            sig_info = yaml.load(f.read(), Loader=yaml.Loader)
+            sig_info = yaml.load(f, Loader=yaml_loader)
+    # gitee_id and email pairs in the order they are declared, email is None if it comes from OWNERS
+    emails = []
+    maintainers = None
+    sig_info_mark = False
+    committers_mapping = {}
+    if owners is not None:
+        maintainers = owners['maintainers']
+        emails += [(x, None) for x in maintainers]
+    if sig_info is not None:
+        for maintainer in sig_info['maintainers']:
+            emails.append((maintainer['gitee_id'], maintainer.get('email') or ''))
+        for r in sig_info.get('repositories') or []:
+            if 'committers' not in r.keys():
+                continue
+            committers = [x['gitee_id'] for x in r['committers']]
+            for repo in r['repo']:
+                committers_mapping[repo] = committers
+            emails += [(x['gitee_id'], x.get('email') or '') for x in r['committers']]
+        if owners is None:
             maintainers = [x['gitee_id'] for x in sig_info['maintainers']]
-            return maintainers, True
-    else:
-        log.logger.error('ERROR! Find SIG {} has neither OWNERS file nor sig-info.yaml.'.format(sig))
-        sys.exit(1)
+            sig_info_mark = True
+    return {
+        'name': sig,
+        'repositories': repositories,
+        'maintainers': maintainers,
+        'sig_info_mark': sig_info_mark,
+        'committers_mapping': committers_mapping,
+        'emails': emails
+    }
 
 
-def get_committers_mapping(sig):
+class SigIndex(object):
     """
-    Get mappings between repos and committers
-    :param sig: sig name
-    :return: committers_mapping
+    Index of sigs, repositories, reviewers and email addresses built in one walk over the community repository
     """
-    sig_info_file = os.path.join('community', 'sig', sig, 'sig-info.yaml')
-    if not os.path.exists(sig_info_file):
-        return {}
-    with open(sig_info_file, 'r', encoding='utf-8') as f:
-        sig_info = yaml.load(f.read(), Loader=yaml.Loader)
-    repositories = sig_info.get('repositories')
-    if not repositories:
-        return {}
-    committers_mapping = {}
-    for i in repositories:
-        if 'committers' in i.keys():
-            repos = i['repo']
-            committers = [x['gitee_id'] for x in i['committers']]
-            for repo in repos:
-                committers_mapping[repo] = committers
-    return committers_mapping
+
+    def __init__(self, parsed_sigs, commit=None):
+        self.parsed_sigs = parsed_sigs
+        self.commit = commit
+        self.sigs = [{'name': x['name'], 'repositories': x['repositories']} for x in parsed_sigs]
+        self.sigs_list = [x['name'] for x in parsed_sigs]
+        self.maintainers = {x['name']: (x['maintainers'], x['sig_info_mark']) for x in parsed_sigs}
+        self.committers_mappings = {x['name']: x['committers_mapping'] for x in parsed_sigs}
+        email_mappings = {}
+        for parsed_sig in parsed_sigs:
+            for gitee_id, email in parsed_sig['emails']:
+                if email is None:
+                    email_mappings.setdefault(gitee_id, '')
+                    continue
+                if email in ['null', 'NA']:
+                    email = ''
+                email_mappings[gitee_id] = email
+        self.email_mappings = {k: v for k, v in email_mappings.items() if v}
+
+    @classmethod
+    def build(cls, community='community', workers=SIG_INDEX_WORKERS, commit=None):
+        """
+        Build the index from a checkout of the community repository
+        :param community: path of the community repository
+        :param workers: number of processes parsing sigs, parse in the current process if less than 2
+        :param commit: commit of the checkout
+        :return: SigIndex
+        """
+        sig_path = os.path.join(community, 'sig')
+        sig_names = [x for x in sorted(os.listdir(sig_path))
+                     if x not in SIG_EXCLUDES and os.path.isdir(os.path.join(sig_path, x))]
+        if workers > 1:
+            with create_process_pool(workers) as executor:
+                parsed_sigs = list(executor.map(parse_sig, [sig_path] * len(sig_names), sig_names))
+        else:
+            parsed_sigs = [parse_sig(sig_path, x) for x in sig_names]
+        return cls(parsed_sigs, commit)
+
+    def get_maintainers(self, sig):
+        """
+        Get maintainers of the sig and mark where "maintainers" come from
+        :param sig: sig name
+        :return: maintainers, sig_info_mark
+        """
+        return self.maintainers[sig]
+
+    def get_reviewers(self, sig, repo):
+        """
+        Get reviewers of a repo
+        :param sig: sig name
+        :param repo: full name of repo
+        :return: reviewers
+        """
+        maintainers, sig_info_mark = self.maintainers[sig]
+        if not sig_info_mark:
+            return maintainers
+        return get_repo_members(maintainers, self.committers_mappings[sig], repo)
+
+    def save(self, path):
+        """
+        Persist the index
+        :param path: path of the index file
+        """
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'version': SIG_INDEX_VERSION, 'commit': self.commit, 'sigs': self.parsed_sigs}, f,
+                        protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Load a persisted index
+        :param path: path of the index file
+        :return: SigIndex, or None if the file is missing, broken or of another version
+        """
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, 'rb') as f:
+                data = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            log.logger.warning('Fail to load sig index {}: {}'.format(path, e))
+            return
+        if not isinstance(data, dict) or data.get('version') != SIG_INDEX_VERSION:
+            log.logger.info('Sig index {} is of another version, build it again.'.format(path))
+            return
+        return cls(data['sigs'], data['commit'])
+
+
+def get_community_commit(community='community'):
+    """
+    Get the commit of the community checkout
+    :param community: path of the community repository
+    :return: commit hash, or None if it is not a git checkout
+    """
+    if not os.path.exists(os.path.join(community, '.git')):
+        return
+    p = subprocess.run(['git', '-C', community, 'rev-parse', 'HEAD'], stdout=subprocess.PIPE,
+                       stderr=subprocess.DEVNULL, universal_newlines=True)
+    if p.returncode != 0:
+        return
+    return p.stdout.strip()
+
+
+@instrumented('get_sigs')
+def get_sigs(community='community', workers=SIG_INDEX_WORKERS):
+    """
+    Get relationship between sigs, repositories, reviewers and email addresses. The index is persisted in
+    CACHE_DIR by commit of the community repository and reused while the checkout does not change.
+    :param community: path of the community repository
+    :param workers: number of processes parsing sigs, parse in the current process if less than 2
+    :return: SigIndex
+    """
+    log.logger.info('=' * 25 + ' GET SIGS INFO ' + '=' * 25)
+    commit = get_community_commit(community)
+    index_file = os.path.join(CACHE_DIR, 'sig_index_{}.pickle'.format(commit))
+    sig_index = SigIndex.load(index_file) if commit else None
+    if sig_index is not None:
+        log.logger.info('Load sigs info of commit {}.\n'.format(commit))
+        return sig_index
+    sig_index = SigIndex.build(community, workers=workers, commit=commit)
+    if commit:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        for i in os.listdir(CACHE_DIR):
+            if i.startswith('sig_index_'):
+                os.remove(os.path.join(CACHE_DIR, i))
+        sig_index.save(index_file)
+    log.logger.info('Get sigs info.\n')
+    return sig_index
 
 
 def get_repo_members(maintainers, committers_mapping, repo):
@@ -157,132 +734,207 @@ def get_repo_members(maintainers, committers_mapping, repo):
     return reviewers
 
 
-def count_duration(start_time):
+class PullRecord(object):
     """
-    Count open days of a Pull Request by its start_time
-    :param start_time: time when the Pull Request starts
-    :return: duration in days
+    An open Pull Request of a sig. Repo, sig and branch names are interned since many records share them, the
+    status is kept as bit flags and only turned into text when rendering.
     """
-    today = datetime.datetime.today()
-    start_date = datetime.datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
-    duration = str((today - start_date).days)
-    return duration
+    __slots__ = ('sig', 'repo', 'branch', 'link', 'number', 'title', 'age', 'status')
+
+    def __init__(self, sig, repo, branch, link, title, age, status):
+        self.sig = sys.intern(sig)
+        self.repo = sys.intern(repo)
+        self.branch = sys.intern(branch)
+        self.link = link
+        self.number = link.rsplit('/', 1)[-1]
+        self.title = title
+        self.age = age
+        self.status = status
+
+    @property
+    def number_link(self):
+        return "<a href='{0}'>#{1}</a>".format(self.link, self.number)
+
+    @property
+    def title_link(self):
+        return "<a href='{0}'>{1}</a>".format(self.link, escape(self.title))
+
+    @property
+    def status_text(self):
+        return status_text(self.status)
 
 
-def create_email_mappings():
+def pulls_status(pulls):
     """
-    Generate mappings between gitee_id and email addresses
+    Get status flags of pulls
+    :param pulls: a frame of pulls with draft, labels and mergeable columns
+    :return: a series of status flags
     """
-    email_mappings = {}
-    if not os.path.exists('community'):
-        subprocess.call('git clone https://gitee.com/openeuler/community.git', shell=True)
-    sig_path = os.path.join('community', 'sig')
-    for i in sorted(os.listdir(sig_path)):
-        if i in ['README.md', 'sig-template', 'sig-recycle', 'create_sig_info_template.py']:
-            continue
-        log.logger.info('Starting to get email mappings of sig {}'.format(i))
-        owners_file = os.path.join(sig_path, i, 'OWNERS')
-        sig_info_file = os.path.join(sig_path, i, 'sig-info.yaml')
-        if os.path.exists(owners_file):
-            f = open(owners_file, 'r', encoding='utf-8')
-            maintainers = yaml.safe_load(f)['maintainers']
-            f.close()
-            for maintainer in maintainers:
-                if maintainer not in email_mappings.keys():
-                    email_mappings[maintainer] = ''
-        if os.path.exists(sig_info_file):
-            f = open(sig_info_file, 'r', encoding='utf-8')
-            sig_info = yaml.safe_load(f)
-            f.close()
-            maintainers = sig_info['maintainers']
-            for maintainer in maintainers:
-                maintainer_gitee_id = maintainer['gitee_id']
-                maintainer_email = maintainer.get('email')
-                if maintainer_email in ['null', 'NA'] or not maintainer_email:
-                    maintainer_email = ''
-                email_mappings[maintainer_gitee_id] = maintainer_email
-            repositories = sig_info.get('repositories')
-            if not repositories:
-                continue
-            for r in repositories:
-                if 'committers' in r.keys():
-                    commtters = r['committers']
-                    for committer in commtters:
-                        committer_gitee_id = committer['gitee_id']
-                        committer_email = committer.get('email')
-                        if committer_email in ['null', 'NA'] or not committer_email:
-                            committer_email = ''
-                        email_mappings[committer_gitee_id] = committer_email
-    ready_to_remove = []
-    for email_mapping in email_mappings:
-        if not email_mappings[email_mapping]:
-            ready_to_remove.append(email_mapping)
-    for i in ready_to_remove:
-        del email_mappings[i]
-    # generate email_mappings.yaml
-    with open('email_mapping.yaml', 'w', encoding='utf-8') as f:
-        yaml.dump(email_mappings, f, default_flow_style=False)
-
-
-def get_email_mappings():
-    """
-    Get email_mappings
-    :return: email_mappings
-    """
-    create_email_mappings()
-    if not os.path.exists('email_mapping.yaml'):
-        log.logger.error('ERROR! Fail to generate email_mappings.')
-        return {}
-    email_mappings = yaml.safe_load(open('email_mapping.yaml'))
-    return email_mappings
+    labels = ',' + pulls['labels'].fillna('') + ','
+    status = pulls['draft'].astype(bool) * STATUS_DRAFT
+    status |= ~labels.str.contains(',openeuler-cla/yes,', regex=False) * STATUS_CLA_FAILED
+    status |= labels.str.contains(',ci_failed,', regex=False) * STATUS_CI_FAILED
+    status |= ~pulls['mergeable'].astype(bool) * STATUS_CONFLICT
+    status |= labels.str.contains(',kind/wait_for_update,', regex=False) * STATUS_WAIT_FOR_UPDATE
+    return status
 
 
-def csv_to_xlsx(filepath):
+def status_text(status):
     """
-    Convert a csv file to a xlsx file
-    :param filepath: path of the csv file
-    :return: path of the xlsx file
+    Get the text of status flags
+    :param status: status flags
+    :return: status text
     """
-    if not filepath.endswith('.csv'):
-        return
-    # sorting
-    df = pd.read_csv(filepath, encoding='utf-8')
-    df.to_csv(filepath, mode='w', index=False)
-
-    csv_file = pd.read_csv(filepath, encoding='utf-8')
-    xlsx_filepath = filepath.replace('.csv', '.xlsx')
-    csv_file.to_excel(xlsx_filepath, sheet_name='open_pull_requests_statistics')
-    if not os.path.exists(xlsx_filepath):
-        log.logger.error('ERROR! Fail to generate {}'.format(xlsx_filepath))
-        sys.exit(1)
-    log.logger.info('Generate {}'.format(filepath.replace('.csv', '.xlsx')))
-    return xlsx_filepath
+    if not status:
+        return '待合入'
+    return '、'.join(text for flag, text in STATUS_TEXTS if status & flag)
+
+
+class RateHistory(object):
+    """
+    Persistent history of merged, closed and open Pull Requests of every sig reported by dsapi, keyed by
+    (sig, timestamp). A stored state never changes, so it is never requested again.
+    """
+
+    def __init__(self, path=RATE_HISTORY, retention_days=RATE_HISTORY_DAYS):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS sig_states (
+                sig TEXT NOT NULL,
+                ts INTEGER NOT NULL,
+                merged INTEGER NOT NULL,
+                closed INTEGER NOT NULL,
+                open INTEGER NOT NULL,
+                PRIMARY KEY (sig, ts)
+            )
+        ''')
+        expired = (int(time.time()) - retention_days * 3600 * 24) * 1000
+        with self.conn:
+            self.conn.execute('DELETE FROM sig_states WHERE ts < ?', (expired,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.conn.close()
+
+    def get(self, sig, ts):
+        """
+        Get the state of a sig at a timestamp
+        :param sig: sig name
+        :param ts: timestamp
+        :return: merged, closed and open, or None if not stored
+        """
+        with self.lock:
+            return self.conn.execute('SELECT merged, closed, open FROM sig_states WHERE sig = ? AND ts = ?',
+                                     (sig, ts)).fetchone()
+
+    def latest(self, sig, ts):
+        """
+        Get the latest stored state of a sig before a timestamp
+        :param sig: sig name
+        :param ts: timestamp
+        :return: timestamp, (merged, closed, open), or None if not stored
+        """
+        with self.lock:
+            row = self.conn.execute('SELECT ts, merged, closed, open FROM sig_states WHERE sig = ? AND ts < ? '
+                                    'ORDER BY ts DESC LIMIT 1', (sig, ts)).fetchone()
+        if row is None:
+            return
+        return row[0], row[1:]
+
+    def put(self, sig, ts, state):
+        """
+        Store the state of a sig at a timestamp
+        :param sig: sig name
+        :param ts: timestamp
+        :param state: merged, closed and open
+        """
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO sig_states VALUES (?, ?, ?, ?, ?)', (sig, ts) + tuple(state))
+
+
+class LocalSigState(object):
+    """
+    Estimate the current state of a sig from the last stored state, the pulls closed since then in the pulls
+    snapshot and the open pulls already fetched. The merged and closed counts of a state are cumulative, so the
+    closures since the stored state are added to it. Pulls closed by merging cannot be told apart from those closed
+    without merging, both are counted as closed which does not affect the processed rate.
+    """
+
+    def __init__(self, sig_index, repos_pulls_mapping, store_path=PULLS_STORE):
+        self.sig_repos = {x['name']: x['repositories'] for x in sig_index.sigs}
+        self.repos_pulls_mapping = repos_pulls_mapping or {}
+        self.closures = {}
+        self.syncs = []
+        if store_path and os.path.exists(store_path):
+            with PullsStore(store_path) as store:
+                self.closures = store.closures()
+                self.syncs = store.syncs()
+
+    def estimate(self, sig, ts, history):
+        """
+        Estimate the state of a sig at a timestamp from the latest sync of the pulls. Closures are only known
+        between syncs, so the store has to have synced at or before the stored state, or closures before its first
+        sync are missing, and at or after the timestamp, or the open pulls are not those at the timestamp.
+        :param sig: sig name
+        :param ts: timestamp
+        :param history: RateHistory
+        :return: merged, closed and open, or None if the state cannot be estimated
+        """
+        latest = history.latest(sig, ts)
+        if latest is None or not self.syncs:
+            return
+        last_ts, (merged, closed, _) = latest
+        if self.syncs[0] * 1000 > last_ts or self.syncs[-1] * 1000 < ts:
+            return
+        repos = self.sig_repos.get(sig, [])
+        # the open pulls are those of the latest sync, so are the closures counted
+        closed += sum(1 for x in repos for closed_at in self.closures.get(x, []) if closed_at * 1000 > last_ts)
+        op = sum(len(self.repos_pulls_mapping.get(x, [])) for x in repos)
+        return merged, closed, op
 
 
-def cal_sig_processed_rate(sig_name, ts):
+def cal_sig_processed_rate(sig_name, ts, session=None, history=None, local_state=None, http_cache=None):
     """
     Calculate processed rate of Pull Requests of a sig between now and a week ago
     :param sig_name: sig name
     :param ts: timestamp
+    :param session: session to send the request with
+    :param history: RateHistory to look up first and to store the requested state
+    :param local_state: LocalSigState to estimate the state before requesting it
+    :param http_cache: HTTPCache to send the request through
     :return: -1, 0 or a two bit float number
     """
-    url = 'https://dsapi.osinfra.cn/query/sig/pr/state'
-    params = {
-        'community': 'openeuler',
-        'timestamp': ts,
-        'sig': sig_name
-    }
-    r = requests.get(url, params=params)
-    if r.status_code != 200:
-        processed_rate = -1
-    else:
+    state = history.get(sig_name, ts) if history else None
+    if state is None and local_state is not None and history is not None:
+        state = local_state.estimate(sig_name, ts, history)
+    if state is None:
+        params = {
+            'community': 'openeuler',
+            'timestamp': ts,
+            'sig': sig_name
+        }
+        if session is None:
+            import requests as session
+        if http_cache is not None:
+            r = http_cache.request(session, SIG_STATE_URL, params=params)
+        else:
+            r = request_with_retry(session, SIG_STATE_URL, params=params)
+        if r is None or r.status_code != 200:
+            return -1
         data = r.json()['data']
         if not data:
             return -1
-        merged, closed, op = data['merged'], data['closed'], data['open']
-        if merged == 0 and closed == 0 and op == 0:
-            return 0
-        processed_rate = round((merged + closed) / (merged + closed + op), 2)
+        state = data['merged'], data['closed'], data['open']
+        # the state of a moment in the future is still changing
+        if history and ts <= time.time() * 1000:
+            history.put(sig_name, ts, state)
+    merged, closed, op = state
+    if merged == 0 and closed == 0 and op == 0:
+        return 0
+    processed_rate = round((merged + closed) / (merged + closed + op), 2)
     return processed_rate
 
 
@@ -298,16 +950,27 @@ def cal_compare_timestamp():
     return timestamp_today, timestamp_last
 
 
-def all_sigs_compare(sigs_list):
+@instrumented('all_sigs_compare')
+def all_sigs_compare(sigs_list, concurrency=COMPARE_CONCURRENCY, local_state=None):
     """
-    Generate compare info of all sigs
+    Generate compare info of all sigs, sigs are compared in parallel over a shared session. States of sigs are
+    looked up in the RATE_HISTORY cache before they are requested, requests go through the HTTP_CACHE.
     :param sigs_list: a name list of all sigs
+    :param concurrency: max number of sigs compared at the same time
+    :param local_state: LocalSigState to estimate the current states before requesting them
     :return: compare info of all sigs
     """
-    compare_dict = {}
-    for sig in sigs_list:
-        compare_info = compare_sig_processed_rate(sig)
-        compare_dict[sig] = compare_info
+    history = None
+    if RATE_HISTORY:
+        os.makedirs(os.path.dirname(RATE_HISTORY) or '.', exist_ok=True)
+        history = RateHistory(RATE_HISTORY)
+    with create_session(concurrency) as session, open_http_cache() as http_cache, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        compare_infos = executor.map(
+            lambda x: compare_sig_processed_rate(x, session, history, local_state, http_cache), sigs_list)
+        compare_dict = dict(zip(sigs_list, compare_infos))
+    if history:
+        history.conn.close()
     return compare_dict
 
 
@@ -321,15 +984,19 @@ def single_sig_compare(sig, compare_dict):
     return compare_dict.get(sig)
 
 
-def compare_sig_processed_rate(sig_name):
+def compare_sig_processed_rate(sig_name, session=None, history=None, local_state=None, http_cache=None):
     """
     Compare processed rate of a sig
     :param sig_name: sig name
+    :param session: session to send requests with
+    :param history: RateHistory of sig states
+    :param local_state: LocalSigState to estimate the current state
+    :param http_cache: HTTPCache to send requests through
     :return: compare info
     """
     ts_today, ts_last = cal_compare_timestamp()
-    processed_rate_now = cal_sig_processed_rate(sig_name, ts_today)
-    processed_rate_last = cal_sig_processed_rate(sig_name, ts_last)
+    processed_rate_now = cal_sig_processed_rate(sig_name, ts_today, session, history, local_state, http_cache)
+    processed_rate_last = cal_sig_processed_rate(sig_name, ts_last, session, history, http_cache=http_cache)
     if processed_rate_now == -1 or processed_rate_last == -1:
         return ""
     else:
@@ -343,177 +1010,468 @@ def compare_sig_processed_rate(sig_name):
             return 'PR处理率为{}%, 同比上周下降{}%'.format(processed_rate_now * 100, compare_rate * 100)
 
 
-def excel_optimization(filepath, compare_dict):
+def add_report_styles(wb):
     """
-    Adjust styles of the xlsx file
-    :param filepath: path of the xlsx file
-    :param compare_dict: a dict of every sig and its compare info
+    Register the named styles of the statistics report to a workbook
+    :param wb: workbook
     """
-    if not filepath.endswith('.xlsx'):
-        return
-    html_file = filepath.replace('.xlsx', '.html')
-    wb = openpyxl.load_workbook(filepath)
-    ws = wb.active
-    tmp_list = []
-    for row in ws.rows:
-        tmp_list.append(row[1].value)
-    insert_rows = {}
-    for i in tmp_list:
-        if i not in insert_rows.keys():
-            insert_row = tmp_list.index(i) + 1
-            insert_rows[insert_row] = i
-    # delete auxiliary column
-    ws.delete_cols(1)
-    ws.delete_cols(1)
-    # insert rows
+    from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+
+    side = Side(border_style='thin', color='000000')
+    border = Border(left=side, right=side, top=side, bottom=side)
     alignment_center = Alignment(horizontal='center', vertical='center')
-    insert_count = 0
-    for i in sorted(insert_rows.keys()):
-        sig_name = insert_rows[i]
-        i += insert_count
-
-        ws.insert_rows(i)
-        insert_count += 1
-        ws['A' + str(i)] = sig_name
-        ws['A' + str(i)].font = Font(name='黑体', size=20, bold=True)
-        ws.merge_cells(start_row=i, end_row=i, start_column=1, end_column=6)
-        ws['A' + str(i)].alignment = alignment_center
-
-        compare_info = single_sig_compare(sig_name, compare_dict)
-        ws.insert_rows(i + 1)
-        insert_count += 1
-        ws['A' + str(i + 1)] = compare_info
-        ws['A' + str(i + 1)].font = Font(name='黑体', color='FF0000')
-        ws['A' + str(i + 1)].alignment = alignment_center
-        ws.merge_cells(start_row=i + 1, end_row=i + 1, start_column=1, end_column=6)
-
-        ws.insert_rows(i + 2)
-        insert_count += 1
-        ws['A' + str(i + 2)] = '仓库'
-        ws['B' + str(i + 2)] = '目标分支'
-        ws['C' + str(i + 2)] = '编号'
-        ws['D' + str(i + 2)] = '标题'
-        ws['E' + str(i + 2)] = '状态'
-        ws['F' + str(i + 2)] = '开启天数'
-        ws['A' + str(i + 2)].font = Font(bold=True)
-        ws['A' + str(i + 2)].alignment = alignment_center
-        ws['B' + str(i + 2)].font = Font(bold=True)
-        ws['B' + str(i + 2)].alignment = alignment_center
-        ws['C' + str(i + 2)].font = Font(bold=True)
-        ws['C' + str(i + 2)].alignment = alignment_center
-        ws['D' + str(i + 2)].font = Font(bold=True)
-        ws['D' + str(i + 2)].alignment = alignment_center
-        ws['E' + str(i + 2)].font = Font(bold=True)
-        ws['E' + str(i + 2)].alignment = alignment_center
-        ws['F' + str(i + 2)].font = Font(bold=True)
-        ws['F' + str(i + 2)].alignment = alignment_center
-
-    # replace the original table header
-    ws.insert_rows(5)
-    ws['A5'] = ws['A4'].value
-    ws['B5'] = ws['B4'].value
-    ws['C5'] = ws['C4'].value
-    ws['D5'] = ws['D4'].value
-    ws['E5'] = ws['E4'].value
-    ws['F5'] = ws['F4'].value
-    ws.delete_rows(4)
-    # fill for the Duration
-    cells = ws.iter_rows(min_row=3, min_col=6, max_col=6)
-    yellow_fill = PatternFill("solid", start_color='FFFF00')
-    first_stage_fill = PatternFill('solid', start_color='FFDAB9')
-    second_stage_fill = PatternFill('solid', start_color='FF7F50')
-    third_stage_fill = PatternFill('solid', start_color='FF4500')
-    for i in cells:
-        try:
-            value = int(i[0].value)
-            if 7 < value <= 30:
-                i[0].fill = first_stage_fill
-            elif 30 < value <= 365:
-                i[0].fill = second_stage_fill
-            elif value > 365:
-                i[0].fill = third_stage_fill
-        except (TypeError, ValueError):
-            pass
-    # fill for the status mark
-    status = ws.iter_rows(min_row=3, min_col=5, max_col=5)
-    for j in status:
-        value = j[0].value
-        if not value:
-            continue
-        elif len(value) <= 3 and value != '草稿':
-            continue
+    font = Font(name='Calibri', size=11)
+    wb.add_named_style(NamedStyle('sig_title', font=Font(name='黑体', size=20, bold=True),
+                                  alignment=alignment_center, border=border))
+    wb.add_named_style(NamedStyle('sig_compare', font=Font(name='黑体', color='FF0000'),
+                                  alignment=alignment_center, border=border))
+    wb.add_named_style(NamedStyle('table_header', font=Font(bold=True), alignment=alignment_center, border=border))
+    wb.add_named_style(NamedStyle('pr_cell', font=font, border=border))
+    wb.add_named_style(NamedStyle('pr_status_abnormal', font=font, fill=PatternFill('solid', start_color='FFFF00'),
+                                  border=border))
+    wb.add_named_style(NamedStyle('pr_duration', font=font, alignment=alignment_center, border=border))
+    for style_name, color in DURATION_FILLS:
+        wb.add_named_style(NamedStyle(style_name, font=font, fill=PatternFill('solid', start_color=color),
+                                      alignment=alignment_center, border=border))
+
+
+def duration_style(duration):
+    """
+    Get the named style of a duration cell, the longer a Pull Request is open the deeper the fill
+    :param duration: duration in days
+    :return: style name
+    """
+    if duration > 365:
+        return 'pr_duration_years'
+    elif duration > 30:
+        return 'pr_duration_year'
+    elif duration > 7:
+        return 'pr_duration_month'
+    return 'pr_duration'
+
+
+def status_style(status):
+    """
+    Get the named style of a status cell, abnormal status and drafts are filled
+    :param status: status flags of the Pull Request
+    :return: style name
+    """
+    if not status:
+        return 'pr_cell'
+    return 'pr_status_abnormal'
+
+
+def styled_cell(cell, style, hyperlink=None):
+    """
+    Style a cell of a write-only worksheet
+    :param cell: WriteOnlyCell
+    :param style: named style of the cell
+    :param hyperlink: url the cell links to
+    :return: cell
+    """
+    cell.style = style
+    if hyperlink:
+        cell.hyperlink = hyperlink
+    return cell
+
+
+class FragmentCache(object):
+    """
+    Rendered fragments of sig sections and Pull Request rows keyed by (sig, Pull Request, format). Every reviewer of
+    a repository gets the same rows, so a fragment is rendered once and reused by all reports rendered after it.
+    """
+
+    def __init__(self):
+        self.fragments = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render, *args):
+        """
+        Get a fragment, render it on a miss
+        :param key: key of the fragment
+        :param render: function rendering the fragment
+        :param args: arguments of the function
+        :return: fragment
+        """
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            self.misses += 1
+            fragment = self.fragments[key] = render(*args)
         else:
-            j[0].fill = yellow_fill
-    # align center
-    for row in ws.rows:
-        row[5].alignment = alignment_center
-    # add borders
-    border = Border(left=Side(border_style='thin', color='000000'),
-                    right=Side(border_style='thin', color='000000'),
-                    top=Side(border_style='thin', color='000000'),
-                    bottom=Side(border_style='thin', color='000000'))
-    for row in ws.rows:
-        for cell in row:
-            cell.border = border
+            self.hits += 1
+        return fragment
+
+
+fragment_cache = FragmentCache()
+
+
+def reset_fragment_cache():
+    """
+    Drop all fragments, rendered fragments are only valid for the compare info and Pull Requests of one run
+    """
+    global fragment_cache
+    fragment_cache = FragmentCache()
+
+
+def render_sig_xlsx(sig, compare_info):
+    """
+    Render the title, compare info and table header of a sig as xlsx rows
+    :param sig: sig name
+    :param compare_info: compare info of the sig
+    :return: rows of (value, style name)
+    """
+    return [[(sig, 'sig_title')], [(compare_info, 'sig_compare')], [(x, 'table_header') for x in REPORT_HEADER]]
+
+
+def render_pr_xlsx(record):
+    """
+    Render a Pull Request as a xlsx row, the number and the title are plain text linking to the Pull Request
+    :param record: PullRecord
+    :return: a row of (value, style name[, hyperlink])
+    """
+    return [(record.repo, 'pr_cell'),
+            (record.branch, 'pr_cell'),
+            ('#{}'.format(record.number), 'pr_cell', record.link),
+            (record.title, 'pr_cell', record.link),
+            (record.status_text, status_style(record.status)),
+            (record.age, duration_style(record.age))]
+
+
+def write_statistics_xlsx(filepath, pr_list, compare_dict, cache=None):
+    """
+    Write the statistics report of a reviewer in a single forward pass, every sig starts with a title, the compare
+    info and a table header
+    :param filepath: path of the xlsx file
+    :param pr_list: PullRecords ordered by sig
+    :param compare_dict: a dict of every sig and its compare info
+    :param cache: FragmentCache to reuse rows from
+    :return: path of the xlsx file
+    """
+    import openpyxl
+    from openpyxl.cell import WriteOnlyCell
+
+    cache = cache or FragmentCache()
+    wb = openpyxl.Workbook(write_only=True)
+    add_report_styles(wb)
+    ws = wb.create_sheet('open_pull_requests_statistics')
+    row_count = 0
+    last_sig = None
+    for record in pr_list:
+        rows = []
+        if record.sig != last_sig:
+            last_sig = record.sig
+            rows += cache.get((record.sig, None, 'xlsx'), render_sig_xlsx, record.sig,
+                              single_sig_compare(record.sig, compare_dict))
+            ws.merged_cells.add('A{0}:F{0}'.format(row_count + 1))
+            ws.merged_cells.add('A{0}:F{0}'.format(row_count + 2))
+        rows.append(cache.get((record.sig, record.link, 'xlsx'), render_pr_xlsx, record))
+        for row in rows:
+            ws.append([styled_cell(WriteOnlyCell(ws, x[0]), *x[1:]) for x in row])
+        row_count += len(rows)
     wb.save(filepath)
-    wb.close()
-    # generate html file by the xlsx file
-    xlsx2html(filepath, html_file)
-    log.logger.info('Generate {}'.format(html_file))
+    log.logger.info('Generate {}'.format(filepath))
+    return filepath
+
+
+def render_sig_html(sig, compare_info):
+    """
+    Render the title, compare info and table header of a sig as html rows
+    :param sig: sig name
+    :param compare_info: compare info of the sig
+    :return: html
+    """
+    return '\n'.join([HTML_MERGED_ROW.substitute(style=HTML_STYLES['sig_title'], value=escape(sig)),
+                      HTML_MERGED_ROW.substitute(style=HTML_STYLES['sig_compare'], value=escape(compare_info or '')),
+                      HTML_HEADER_ROW])
+
+
+def render_pr_html(record):
+    """
+    Render a Pull Request as a html row
+    :param record: PullRecord
+    :return: html
+    """
+    return HTML_PR_ROW.substitute(cell_style=HTML_STYLES['pr_cell'],
+                                  repo=escape(record.repo),
+                                  branch=escape(record.branch),
+                                  number_link=record.number_link,
+                                  link=record.title_link,
+                                  status_style=HTML_STYLES[status_style(record.status)],
+                                  status=record.status_text,
+                                  duration_style=HTML_STYLES[duration_style(record.age)],
+                                  duration=record.age)
 
 
-def send_email(xlsx_file, nickname, receivers):
+def render_statistics_html(nickname, pr_list, compare_dict, cache=None):
     """
-    Send email to reviewers
-    :param xlsx_file: path of the xlsx file
+    Render the statistics report of a reviewer as the html body of the email, with the same layout as the xlsx file
     :param nickname: Gitee ID of the receiver
+    :param pr_list: PullRecords ordered by sig
+    :param compare_dict: a dict of every sig and its compare info
+    :param cache: FragmentCache to reuse rows from
+    :return: html
+    """
+    cache = cache or FragmentCache()
+    rows = []
+    last_sig = None
+    for record in pr_list:
+        if record.sig != last_sig:
+            last_sig = record.sig
+            rows.append(cache.get((record.sig, None, 'html'), render_sig_html, record.sig,
+                                  single_sig_compare(record.sig, compare_dict)))
+        rows.append(cache.get((record.sig, record.link, 'html'), render_pr_html, record))
+    return HTML_REPORT.substitute(nickname=escape(nickname), rows='\n'.join(rows))
+
+
+def render_sig_page(sig, pr_list, compare_dict):
+    """
+    Render the open Pull Requests of a sig as a html page
+    :param sig: sig name
+    :param pr_list: PullRecords of the sig
+    :param compare_dict: a dict of every sig and its compare info
+    :return: html
+    """
+    rows = [render_sig_html(sig, single_sig_compare(sig, compare_dict))] + [render_pr_html(x) for x in pr_list]
+    return HTML_SIG_PAGE.substitute(sig=escape(sig), rows='\n'.join(rows))
+
+
+def render_xlsx_bytes(pr_list, compare_dict):
+    """
+    Render PullRecords as the content of an xlsx file
+    :param pr_list: PullRecords ordered by sig
+    :param compare_dict: a dict of every sig and its compare info
+    :return: bytes of the xlsx file
+    """
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        xlsx_file = write_statistics_xlsx(os.path.join(tmp_dir, 'statistics.xlsx'), pr_list, compare_dict)
+        with open(xlsx_file, 'rb') as f:
+            return f.read()
+
+
+def render_report(receiver, pr_list, compare_dict, xlsx_file=None):
+    """
+    Render the statistics report of a reviewer with the fragment cache of the process
+    :param receiver: Gitee ID of the receiver
+    :param pr_list: PullRecords of the receiver ordered by sig
+    :param compare_dict: a dict of every sig and its compare info
+    :param xlsx_file: path of the xlsx file, no xlsx file is written if it is None
+    :return: html body of the email, hits and misses of the fragment cache and seconds spent rendering
+    """
+    start = time.perf_counter()
+    hits, misses = fragment_cache.hits, fragment_cache.misses
+    if xlsx_file:
+        write_statistics_xlsx(xlsx_file, pr_list, compare_dict, fragment_cache)
+    body_of_email = render_statistics_html(receiver, pr_list, compare_dict, fragment_cache)
+    return body_of_email, fragment_cache.hits - hits, fragment_cache.misses - misses, time.perf_counter() - start
+
+
+def render_reports(reports, compare_dict, workers=REPORT_WORKERS):
+    """
+    Render statistics reports of reviewers across worker processes, every process has its own fragment cache
+    :param reports: a list of (receiver, email address, PullRecords, path of the xlsx file)
+    :param compare_dict: a dict of every sig and its compare info
+    :param workers: number of worker processes, render in the current process if less than 2
+    :return: an iterator of html bodies, hits and misses of the fragment cache and seconds spent rendering in the
+             order of reports
+    """
+    receivers = [x[0] for x in reports]
+    pr_lists = [x[2] for x in reports]
+    xlsx_files = [x[3] for x in reports]
+    if workers < 2 or len(reports) < 2:
+        reset_fragment_cache()
+        yield from map(render_report, receivers, pr_lists, repeat(compare_dict), xlsx_files)
+        return
+    with create_process_pool(workers, initializer=reset_fragment_cache) as executor:
+        yield from executor.map(render_report, receivers, pr_lists, repeat(compare_dict), xlsx_files,
+                                chunksize=max(len(reports) // (workers * 4), 1))
+
+
+def create_email(body_of_email, receivers, xlsx_file=None):
+    """
+    Create the report email
+    :param body_of_email: html body of the email
     :param receivers: where send to
+    :param xlsx_file: path of the xlsx file to attach
+    :return: the email as a string
     """
-    username = os.getenv('SMTP_USERNAME', '')
-    port = os.getenv('SMTP_PORT', '')
-    host = os.getenv('SMTP_HOST', '')
-    password = os.getenv('SMTP_PASSWORD', '')
-    sender = os.getenv('SMTP_SENDER')
+    from email.mime.application import MIMEApplication
+    from email.mime.multipart import MIMEMultipart
+    from email.mime.text import MIMEText
+
     msg = MIMEMultipart()
-    html_file = xlsx_file.replace('.xlsx', '.html')
-    with open(html_file, 'r', encoding='utf-8') as f:
-        body_of_email = f.read()
-    body_of_email = body_of_email.replace('<body>', '<body><p>Dear {},</p>'
-                                                    '<p>以下是您参与openEuler社区的SIG仓库下待处理的PR，烦请您及时跟进</p>'.
-                                          format(nickname)).replace('&nbsp;', '0')
     content = MIMEText(body_of_email, 'html', 'utf-8')
     msg.attach(content)
+    if xlsx_file:
+        with open(xlsx_file, 'rb') as f:
+            attachment = MIMEApplication(f.read(), Name=os.path.basename(xlsx_file))
+        attachment['Content-Disposition'] = 'attachment; filename="{}"'.format(os.path.basename(xlsx_file))
+        msg.attach(attachment)
     msg['Subject'] = 'openEuler 待处理PR汇总'
-    msg['From'] = username
+    msg['From'] = SMTP_USERNAME
     msg['To'] = ','.join(receivers)
-    try:
-        if int(port) == 465:
-            server = smtplib.SMTP_SSL(host, port)
-            server.ehlo()
-            server.login(username, password)
-        else:
-            server = smtplib.SMTP(host, port)
-            server.ehlo()
-            server.starttls()
-            server.login(username, password)
-        server.sendmail(sender, receivers, msg.as_string())
-        log.logger.info('Sent report email to: {}'.format(receivers))
-    except smtplib.SMTPException as e:
-        log.logger.error(e)
+    return msg.as_string()
 
 
-def fill_status(status, insert_string):
+class MailDelivery(object):
     """
-    Change status of the Pull Request
-    :param status: a string of current status
-    :param insert_string: abnormal status waiting to add
-    :return: status
+    Deliver emails over a small pool of authenticated SMTP connections which are reused across messages. Every
+    connection sends at most `rate` messages per second, a broken connection is reopened and the message retried.
+    Once a connection cannot be opened or authenticated, the remaining messages fail without connecting again.
     """
-    if status == '待合入':
-        status = insert_string
-    else:
-        status += '、{}'.format(insert_string)
-    return status
+
+    def __init__(self, pool_size=SMTP_POOL_SIZE, rate=SMTP_RATE, retries=SMTP_RETRIES):
+        self.username = SMTP_USERNAME
+        self.port = SMTP_PORT
+        self.host = SMTP_HOST
+        self.password = SMTP_PASSWORD
+        self.sender = SMTP_SENDER
+        self.starttls = SMTP_STARTTLS
+        self.interval = 1 / rate if rate > 0 else 0
+        self.retries = retries
+        self.connections = queue.Queue()
+        for _ in range(pool_size):
+            self.connections.put({'server': None, 'last_sent': 0})
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+        # receiver: None if sent, otherwise the error
+        self.outcomes = {}
+        # error of opening a connection, every message fails with it once set
+        self.failure = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def connect(self):
+        """
+        Open an authenticated connection
+        :return: SMTP connection
+        """
+        import smtplib
+
+        if self.port == 465:
+            server = smtplib.SMTP_SSL(self.host, self.port, timeout=SMTP_TIMEOUT)
+        else:
+            server = smtplib.SMTP(self.host, self.port, timeout=SMTP_TIMEOUT)
+        try:
+            server.ehlo()
+            if self.port != 465 and self.starttls:
+                server.starttls()
+                server.ehlo()
+            if self.username:
+                server.login(self.username, self.password)
+        except BaseException:
+            server.close()
+            raise
+        return server
+
+    @staticmethod
+    def disconnect(connection):
+        """
+        Close the connection, errors of a broken connection are ignored
+        :param connection: a connection of the pool
+        """
+        import smtplib
+
+        server = connection['server']
+        connection['server'] = None
+        if server is None:
+            return
+        try:
+            server.quit()
+        except (smtplib.SMTPException, OSError):
+            server.close()
+
+    def deliver(self, msg, receivers):
+        """
+        Send a message over a pooled connection
+        :param msg: the email as a string
+        :param receivers: where send to
+        :return: None if sent, otherwise the error
+        """
+        import smtplib
+
+        connection = self.connections.get()
+        error = None
+        start = time.perf_counter()
+        try:
+            for attempt in range(self.retries + 1):
+                if self.failure is not None:
+                    error = self.failure
+                    break
+                if connection['server'] is None:
+                    try:
+                        connection['server'] = self.connect()
+                    except smtplib.SMTPAuthenticationError as e:
+                        # every other message would be refused the same
+                        error = self.failure = e
+                        break
+                    except (smtplib.SMTPException, OSError) as e:
+                        error = e
+                        log.logger.warning('SMTP connection failed ({}), attempt {}'.format(e, attempt + 1))
+                        if attempt == self.retries:
+                            self.failure = e
+                        continue
+                try:
+                    wait = connection['last_sent'] + self.interval - time.monotonic()
+                    if wait > 0:
+                        time.sleep(wait)
+                    connection['server'].sendmail(self.sender, receivers, msg)
+                    connection['last_sent'] = time.monotonic()
+                    log.logger.info('Sent report email to: {}'.format(receivers))
+                    error = None
+                    break
+                except smtplib.SMTPServerDisconnected as e:
+                    error = e
+                    self.disconnect(connection)
+                    log.logger.warning('SMTP connection failed ({}), attempt {}'.format(e, attempt + 1))
+                except smtplib.SMTPException as e:
+                    # refused by the server, sending it again does not help
+                    error = e
+                    break
+                except OSError as e:
+                    error = e
+                    self.disconnect(connection)
+                    log.logger.warning('SMTP connection failed ({}), attempt {}'.format(e, attempt + 1))
+                except Exception as e:
+                    # the state of the connection is unknown, the message fails and the connection is reopened
+                    error = e
+                    self.disconnect(connection)
+                    log.logger.error('Unexpected error sending to {}'.format(receivers), exc_info=True)
+                    break
+        finally:
+            self.connections.put(connection)
+        metrics.observe('smtp_send_duration_seconds', time.perf_counter() - start)
+        metrics.inc('smtp_emails_total', outcome='sent' if error is None else 'failed')
+        if error is None:
+            metrics.inc('smtp_bytes_total', len(msg))
+        else:
+            log.logger.error('Fail to send report email to {}: {}'.format(receivers, error))
+        for receiver in receivers:
+            self.outcomes[receiver] = error
+        return error
+
+    def submit(self, body_of_email, receivers, xlsx_file=None):
+        """
+        Queue an email to send
+        :param body_of_email: html body of the email
+        :param receivers: where send to
+        :param xlsx_file: path of the xlsx file to attach
+        :return: future of the delivery
+        """
+        return self.executor.submit(self.deliver, create_email(body_of_email, receivers, xlsx_file), receivers)
+
+    def close(self):
+        """
+        Wait for queued emails and close all connections
+        """
+        self.executor.shutdown(wait=True)
+        while not self.connections.empty():
+            self.disconnect(self.connections.get())
 
 
 def clean_env(data_dir):
@@ -524,142 +1482,1793 @@ def clean_env(data_dir):
     subprocess.call('rm -rf {}'.format(data_dir), shell=True)
 
 
-def get_repos_pulls_mapping():
+def create_session(pool_size=PULLS_CONCURRENCY):
     """
-    Get mappings between repos and pulls
-    :return: a dict of {repo: pulls}
+    Create a session whose connections are pooled and reused across requests
+    :param pool_size: max number of connections kept per host
+    :return: session
     """
-    enterprise_pulls = []
-    page = 1
-    while True:
-        log.logger.info("=" * 25 + " GET ENTERPRISE PULLS: PAGE {} ".format(page) + "=" * 25)
-        url = 'https://ipb.osinfra.cn/pulls'
-        params = {
-            'state': 'open',
-            'direction': 'asc',
-            'page': page,
-            'per_page': 100
-        }
-        r = requests.get(url, params=params)
-        if r.status_code != 200:
-            log.logger.error('Fail to get enterprise pulls list.')
-            return
-        else:
-            enterprise_pulls += r.json()['data']
-        if len(r.json()['data']) < 100:
-            break
-        page += 1
-    return {x['link'].split('/', 3)[3]: x for x in enterprise_pulls}
+    import requests
 
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
 
-def pr_statistics(data_dir, sigs, repos_pulls_mapping, compare_dict):
+
+def request_with_retry(session, url, params=None, retries=HTTP_RETRIES, backoff=HTTP_BACKOFF, timeout=HTTP_TIMEOUT,
+                       headers=None):
     """
-    :param data_dir: directory to store temporary data
-    :param sigs: a dict of every sig and its repositories
-    :param repos_pulls_mapping: mappings between repos and pulls
-    :param compare_dict: a dict of every sig and its compare info
+    Send a GET request, retry with jittered exponential backoff on connection errors and retryable status codes
+    :param session: session to send the request with
+    :param url: url of the request
+    :param params: query parameters
+    :param retries: max number of retries
+    :param backoff: base delay in seconds between retries
+    :param timeout: timeout in seconds of every attempt
+    :param headers: headers of the request
+    :return: the last response, or None if no response was received
     """
-    log.logger.info('=' * 25 + ' STATISTICS ' + '=' * 25)
-    email_mappings = get_email_mappings()
-    mapping_lists = sorted(list(email_mappings.keys()))
-    open_pr_dict = {}
-    open_pr_info = []
-    for sig in sigs:
+    import requests
+
+    r = None
+    for attempt in range(retries + 1):
+        start = time.perf_counter()
+        try:
+            r = session.get(url, params=params, timeout=timeout, headers=headers)
+            metrics.observe('http_request_duration_seconds', time.perf_counter() - start, endpoint=url)
+            metrics.inc('http_requests_total', endpoint=url, status=r.status_code)
+            metrics.inc('http_response_bytes_total', len(r.content), endpoint=url)
+            if r.status_code not in RETRY_STATUS_CODES:
+                return r
+            reason = 'status code {}'.format(r.status_code)
+        except requests.RequestException as e:
+            metrics.inc('http_requests_total', endpoint=url, status='error')
+            r = None
+            reason = e
+        if attempt == retries:
+            break
+        delay = random.uniform(0, backoff * 2 ** attempt)
+        log.logger.warning('Request {} failed ({}), retry in {:.2f}s'.format(url, reason, delay))
+        time.sleep(delay)
+    return r
+
+
+class CachedResponse(object):
+    """
+    A response served from the HTTPCache, with the attributes of a response the callers read
+    """
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class HTTPCache(object):
+    """
+    Persistent cache of GET responses keyed by url and query parameters. A response is served without a request
+    while it is younger than the TTL of its endpoint, then it is revalidated with its ETag or Last-Modified and
+    served again if the server answers 304 Not Modified. Responses neither revalidated nor fresh for a while are
+    dropped.
+    """
+
+    def __init__(self, path=HTTP_CACHE, retention_days=HTTP_CACHE_DAYS, ttls=None):
+        self.lock = threading.Lock()
+        self.ttls = HTTP_CACHE_TTLS if ttls is None else ttls
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        try:
+            self.prepare(retention_days)
+        except sqlite3.DatabaseError as e:
+            # the cache only saves requests, start over from an empty one
+            log.logger.warning('HTTP cache {} is corrupt ({}), start a new one.'.format(path, e))
+            self.conn.close()
+            os.remove(path)
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.prepare(retention_days)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.conn.close()
+
+    def prepare(self, retention_days):
+        """
+        Create the table of responses and drop responses older than the retention
+        :param retention_days: days to keep responses neither revalidated nor fresh
+        """
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                body BLOB NOT NULL,
+                validated_at REAL NOT NULL
+            )
+        ''')
+        with self.conn:
+            self.conn.execute('DELETE FROM responses WHERE validated_at < ?',
+                              (time.time() - retention_days * 3600 * 24,))
+
+    @staticmethod
+    def key(url, params=None):
+        """
+        Get the cache key of a request
+        :param url: url of the request
+        :param params: query parameters
+        :return: key
+        """
+        return json.dumps([url, params or {}], sort_keys=True)
+
+    def get(self, key):
+        """
+        Get a cached response
+        :param key: cache key
+        :return: etag, last modified, body and time of the last validation, or None if not cached
+        """
+        with self.lock:
+            return self.conn.execute('SELECT etag, last_modified, body, validated_at FROM responses WHERE key = ?',
+                                     (key,)).fetchone()
+
+    def put(self, key, etag, last_modified, body, validated_at):
+        """
+        Cache a response
+        :param key: cache key
+        :param etag: ETag of the response
+        :param last_modified: Last-Modified of the response
+        :param body: body of the response
+        :param validated_at: time when the response was received
+        """
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                              (key, etag, last_modified, body, validated_at))
+
+    def touch(self, key, validated_at):
+        """
+        Mark a cached response as revalidated
+        :param key: cache key
+        :param validated_at: time of the validation
+        """
+        with self.lock, self.conn:
+            self.conn.execute('UPDATE responses SET validated_at = ? WHERE key = ?', (validated_at, key))
+
+    def request(self, session, url, params=None):
+        """
+        Send a GET request through the cache
+        :param session: session to send the request with
+        :param url: url of the request
+        :param params: query parameters
+        :return: the response, a CachedResponse if the cached one is used, or None if no response was received
+        """
+        key = self.key(url, params)
+        ttl = self.ttls.get(url, 0)
+        cached = self.get(key)
+        headers = {}
+        if cached is not None:
+            etag, last_modified, body, validated_at = cached
+            if time.time() - validated_at < ttl:
+                metrics.inc('http_cache_total', endpoint=url, result='fresh')
+                metrics.inc('http_cache_saved_bytes_total', len(body), endpoint=url)
+                return CachedResponse(body)
+            if etag:
+                headers['If-None-Match'] = etag
+            if last_modified:
+                headers['If-Modified-Since'] = last_modified
+        now = time.time()
+        r = request_with_retry(session, url, params=params, headers=headers or None)
+        if r is not None and r.status_code == 304 and cached is not None:
+            self.touch(key, now)
+            metrics.inc('http_cache_total', endpoint=url, result='revalidated')
+            metrics.inc('http_cache_saved_bytes_total', len(cached[2]), endpoint=url)
+            return CachedResponse(cached[2])
+        metrics.inc('http_cache_total', endpoint=url, result='miss')
+        if r is not None and r.status_code == 200:
+            etag, last_modified = r.headers.get('ETag'), r.headers.get('Last-Modified')
+            # a response without validators can only be used while it is fresh
+            if etag or last_modified or ttl > 0:
+                self.put(key, etag, last_modified, r.content, now)
+        return r
+
+
+def open_http_cache():
+    """
+    Open the HTTP_CACHE
+    :return: HTTPCache, or a context of None if the cache is disabled
+    """
+    if not HTTP_CACHE:
+        return contextlib.nullcontext()
+    os.makedirs(os.path.dirname(HTTP_CACHE) or '.', exist_ok=True)
+    return HTTPCache(HTTP_CACHE)
+
+
+def get_pulls_page(session, page, http_cache=None):
+    """
+    Get a page of enterprise pulls
+    :param session: session to send the request with
+    :param page: page number
+    :param http_cache: HTTPCache to send the request through
+    :return: pulls of the page and the total number of pulls if the endpoint reports it, or None if failed
+    """
+    log.logger.info("=" * 25 + " GET ENTERPRISE PULLS: PAGE {} ".format(page) + "=" * 25)
+    params = {
+        'state': 'open',
+        'direction': 'asc',
+        'page': page,
+        'per_page': PULLS_PER_PAGE
+    }
+    if http_cache is not None:
+        r = http_cache.request(session, PULLS_URL, params=params)
+    else:
+        r = request_with_retry(session, PULLS_URL, params=params)
+    if r is None or r.status_code != 200:
+        log.logger.error('Fail to get page {} of enterprise pulls list.'.format(page))
+        return
+    res = r.json()
+    return res['data'], res.get('total')
+
+
+def iter_enterprise_pulls(concurrency=PULLS_CONCURRENCY, reported=None):
+    """
+    Iterate over open enterprise pulls page by page. The first page is fetched alone, the following pages are fetched
+    ahead in parallel, at most concurrency pages at a time, and every page is yielded in order as soon as it arrives,
+    so the pulls are processed while later pages are still downloading.
+    :param concurrency: max number of pages fetched at the same time
+    :param reported: a dict to store the total number of pulls reported by the API in as 'total'
+    :return: an iterator of pages of pulls
+    :raise requests.RequestException: if a page cannot be fetched
+    """
+    import requests
+
+    with create_session(concurrency) as session, open_http_cache() as http_cache, \
+            ThreadPoolExecutor(max_workers=concurrency) as executor:
+        first_page = get_pulls_page(session, 1, http_cache)
+        if first_page is None:
+            raise requests.RequestException('Fail to get page 1 of enterprise pulls list.')
+        pulls, total = first_page
+        if reported is not None:
+            reported['total'] = total
+        yield pulls
+        if len(pulls) < PULLS_PER_PAGE:
+            return
+        last_page = math.ceil(total / PULLS_PER_PAGE) if total else None
+        pending = collections.deque()
+        next_page = 2
+        while True:
+            # look ahead until the reported last page, one page at a time past it in case the total was stale
+            while len(pending) < concurrency and (last_page is None or next_page <= last_page or not pending):
+                pending.append((next_page, executor.submit(get_pulls_page, session, next_page, http_cache)))
+                next_page += 1
+            page, future = pending.popleft()
+            page_result = future.result()
+            if page_result is None or len(page_result[0]) < PULLS_PER_PAGE:
+                for _, x in pending:
+                    x.cancel()
+            if page_result is None:
+                raise requests.RequestException('Fail to get page {} of enterprise pulls list.'.format(page))
+            yield page_result[0]
+            if len(page_result[0]) < PULLS_PER_PAGE:
+                return
+
+
+class PullsStore(object):
+    """
+    Local SQLite snapshot of enterprise pulls kept between runs. Every sync applies the differences to the last
+    snapshot: new pulls are inserted, changed pulls are updated and pulls no longer open are marked as closed.
+    """
+
+    def __init__(self, path=PULLS_STORE):
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS pulls (
+                link TEXT PRIMARY KEY,
+                repo TEXT NOT NULL,
+                position INTEGER,
+                digest TEXT NOT NULL,
+                data TEXT NOT NULL,
+                first_seen INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL,
+                closed_at INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS pulls_repo ON pulls (repo);
+            CREATE TABLE IF NOT EXISTS syncs (
+                synced_at INTEGER PRIMARY KEY,
+                inserted INTEGER NOT NULL,
+                updated INTEGER NOT NULL,
+                closed INTEGER NOT NULL
+            );
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.conn.close()
+
+    def sync(self, pulls, synced_at=None, reported=None):
+        """
+        Apply the fetched open pulls to the snapshot, nothing is applied if iterating over the pulls fails. A pull
+        showing up twice because pages shifted during paging is applied once, and pulls missing from the fetched ones
+        are only marked as closed if as many pulls were fetched as the API reported, since a pull skipped by the
+        shift is missing too.
+        :param pulls: an iterable of all open pulls in the order of pages
+        :param synced_at: timestamp of the sync
+        :param reported: a dict which holds the total number of pulls reported by the API as 'total' once the pulls
+                         are iterated over
+        :return: numbers of inserted, updated and closed pulls
+        """
+        synced_at = synced_at or int(time.time())
+        last_digests = dict(self.conn.execute('SELECT link, digest FROM pulls WHERE closed_at IS NULL'))
+        digests = {}
+        inserted = updated = 0
+        with self.conn:
+            for position, pull in enumerate(pulls):
+                link = pull['link']
+                data = json.dumps(pull, ensure_ascii=False, sort_keys=True)
+                digest = hashlib.sha1(data.encode('utf-8')).hexdigest()
+                if link in digests:
+                    # shifted into a later page, keep its first position
+                    if digests[link] != digest:
+                        digests[link] = digest
+                        self.conn.execute('UPDATE pulls SET digest = ?, data = ?, updated_at = ? WHERE link = ?',
+                                          (digest, data, synced_at, link))
+                    continue
+                digests[link] = digest
+                last_digest = last_digests.pop(link, None)
+                if last_digest is None:
+                    inserted += 1
+                    self.conn.execute('INSERT OR REPLACE INTO pulls VALUES (?, ?, ?, ?, ?, ?, ?, NULL)',
+                                      (link, '/'.join(link.split('/')[3:5]), position, digest, data, synced_at,
+                                       synced_at))
+                elif last_digest != digest:
+                    updated += 1
+                    self.conn.execute('UPDATE pulls SET position = ?, digest = ?, data = ?, updated_at = ? '
+                                      'WHERE link = ?', (position, digest, data, synced_at, link))
+                else:
+                    self.conn.execute('UPDATE pulls SET position = ? WHERE link = ?', (position, link))
+            total = (reported or {}).get('total')
+            if total is not None and total != len(digests):
+                log.logger.warning('Fetched {} pulls but {} are reported, no pull is marked as closed.'.format(
+                    len(digests), total))
+                last_digests = {}
+            self.conn.executemany('UPDATE pulls SET closed_at = ?, position = NULL WHERE link = ?',
+                                  [(synced_at, x) for x in last_digests])
+            self.conn.execute('INSERT OR REPLACE INTO syncs VALUES (?, ?, ?, ?)',
+                              (synced_at, inserted, updated, len(last_digests)))
+        return inserted, updated, len(last_digests)
+
+    def syncs(self):
+        """
+        Get timestamps of the syncs
+        :return: timestamps in ascending order
+        """
+        return [x[0] for x in self.conn.execute('SELECT synced_at FROM syncs ORDER BY synced_at')]
+
+    def closures(self):
+        """
+        Get timestamps when pulls were closed
+        :return: a dict of {owner/repo: [closed_at]}
+        """
+        closures = {}
+        for repo, closed_at in self.conn.execute('SELECT repo, closed_at FROM pulls WHERE closed_at IS NOT NULL'):
+            closures.setdefault(repo, []).append(closed_at)
+        return closures
+
+
+class PullsBuckets(dict):
+    """
+    Open pulls grouped by the full name of their repository as {owner/repo: [pulls]}. Pulls are added page by page,
+    status flags are evaluated on every added page and kept in status with the same layout as the pulls.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.status = {}
+        self.positions = {}
+
+    def add(self, pulls):
+        """
+        Add a page of pulls. A pull may show up twice when pages shift during paging, the latest one replaces the
+        earlier one in its place.
+        :param pulls: a list of pulls
+        """
+        if not pulls:
+            return
+        import pandas as pd
+
+        flags = pulls_status(pd.DataFrame(pulls, columns=['draft', 'labels', 'mergeable'])).tolist()
+        for pull, status in zip(pulls, flags):
+            pull_path = pull['link'].split('/', 3)[3]
+            position = self.positions.get(pull_path)
+            if position is None:
+                full_repo = '/'.join(pull_path.split('/')[:2])
+                bucket = self.setdefault(full_repo, [])
+                self.positions[pull_path] = (full_repo, len(bucket))
+                bucket.append(pull)
+                self.status.setdefault(full_repo, []).append(status)
+            else:
+                full_repo, index = position
+                self[full_repo][index] = pull
+                self.status[full_repo][index] = status
+
+    def remove(self, pull_path):
+        """
+        Remove a pull, the pulls after it in its bucket move up
+        :param pull_path: owner/repo/pulls/number of the pull
+        :return: whether the pull was found
+        """
+        position = self.positions.pop(pull_path, None)
+        if position is None:
+            return False
+        full_repo, index = position
+        del self[full_repo][index]
+        del self.status[full_repo][index]
+        for pull in self[full_repo][index:]:
+            path = pull['link'].split('/', 3)[3]
+            self.positions[path] = (full_repo, self.positions[path][1] - 1)
+        if not self[full_repo]:
+            del self[full_repo]
+            del self.status[full_repo]
+        return True
+
+    def collect(self, pages):
+        """
+        Add pages of pulls while passing their pulls on
+        :param pages: an iterable of pages of pulls
+        :return: an iterator of pulls in the order of pages
+        """
+        for page in pages:
+            self.add(page)
+            yield from page
+
+
+@instrumented('get_repos_pulls_mapping')
+def get_repos_pulls_mapping():
+    """
+    Get mappings between repos and pulls. Pages are streamed into per-repo buckets and synced to the PULLS_STORE
+    snapshot while later pages are still being fetched. Reports are never built from the snapshot, the run fails
+    if the fetch fails.
+    :return: PullsBuckets of {owner/repo: [pulls]}, or None if failed
+    """
+    import requests
+
+    repos_pulls_mapping = PullsBuckets()
+    reported = {}
+    pulls = repos_pulls_mapping.collect(iter_enterprise_pulls(reported=reported))
+    if not PULLS_STORE:
+        try:
+            collections.deque(pulls, maxlen=0)
+        except requests.RequestException:
+            log.logger.error('Fail to get enterprise pulls list.')
+            return
+        return repos_pulls_mapping
+    os.makedirs(os.path.dirname(PULLS_STORE) or '.', exist_ok=True)
+    with PullsStore(PULLS_STORE) as store:
+        try:
+            inserted, updated, closed = store.sync(pulls, reported=reported)
+        except requests.RequestException:
+            log.logger.error('Fail to get enterprise pulls list.')
+            return
+    log.logger.info('Sync pulls snapshot: {} inserted, {} updated, {} closed.'.format(inserted, updated, closed))
+    return repos_pulls_mapping
+
+
+def group_pulls_by_repo(pulls):
+    """
+    Group pulls by the full name of their repository
+    :param pulls: a list of pulls
+    :return: PullsBuckets of {owner/repo: [pulls]}
+    """
+    repos_pulls_mapping = PullsBuckets()
+    repos_pulls_mapping.add(list(pulls))
+    return repos_pulls_mapping
+
+
+@instrumented('build_open_pr_dict')
+def build_open_pr_dict(sig_index, repos_pulls_mapping, now):
+    """
+    Build open Pull Requests of every reviewer. All open pulls of sig repositories are put in one frame along with
+    the status flags evaluated while fetching, ages are computed on a whole column, then rows are fanned out to
+    reviewers and ordered in bulk.
+    :param sig_index: SigIndex of every sig, its repositories and reviewers
+    :param repos_pulls_mapping: PullsBuckets of mappings between repos and pulls
+    :param now: reference time of the run
+    :return: a dict of {reviewer: [PullRecords ordered by sig, then by duration from long to short]}
+    """
+    sig_repos = []
+    for sig in sig_index.sigs:
         sig_name = sig['name']
-        sig_repos = sig['repositories']
         log.logger.info('\nStarting to search sig {}'.format(sig_name))
-        if not sig_repos:
+        if not sig['repositories']:
             log.logger.info('Find no repositories in sig {}, skip'.format(sig_name))
             continue
-        maintainers, sig_info_mark = get_maintainers(sig_name)
-        for full_repo in sig_repos:
-            if full_repo.split('/')[0] not in ['src-openeuler', 'openeuler']:
+        maintainers, _ = sig_index.get_maintainers(sig_name)
+        if maintainers is None:
+            log.logger.error('ERROR! Find SIG {} has neither OWNERS file nor sig-info.yaml.'.format(sig_name))
+            sys.exit(1)
+        for full_repo in sig['repositories']:
+            if full_repo.split('/')[0] not in ['src-openeuler', 'openeuler'] or full_repo not in repos_pulls_mapping:
                 continue
-            open_pr_list = []
-            for mapping_key in repos_pulls_mapping.keys():
-                if mapping_key.startswith(full_repo + '/'):
-                    open_pr_list.append(repos_pulls_mapping[mapping_key])
-                    log.logger.info('Find open pr: {}'.format(mapping_key))
-            if not open_pr_list:
-                continue
-            members = maintainers
-            if sig_info_mark:
-                committers_mapping = get_committers_mapping(sig_name)
-                members = get_repo_members(maintainers, committers_mapping, full_repo)
-            for item in open_pr_list:
-                title = item['title']
-                html_url = item['link']
-                number = '#' + html_url.split('/')[-1]
-                created_at = item['created_at']
-                draft = item['draft']
-                labels = item['labels'].split(',')
-                ref_branch = item['ref']
-                status = '待合入'
-                if draft:
-                    status = fill_status(status, '草稿')
-                if 'openeuler-cla/yes' not in labels:
-                    status = fill_status(status, 'CLA认证失败')
-                if 'ci_failed' in labels:
-                    status = fill_status(status, '门禁检查失败')
-                if not item['mergeable']:
-                    status = fill_status(status, '存在冲突')
-                if 'kind/wait_for_update' in labels:
-                    status = fill_status(status, '等待更新')
-                duration = count_duration(created_at)
-                link = "<a href='{0}'>{1}</a>".format(html_url, title)
-                number_link = "<a href='{0}'>{1}</a>".format(html_url, number)
-                open_pr_info.append([sig_name, full_repo, ref_branch, number_link, link, status, duration,
-                                     ','.join(members)])
-    no_addresses_id = []
-    for pr_info in open_pr_info:
-        ids = pr_info[-1]
-        for i in ids.split(','):
-            if i not in mapping_lists:
-                if i not in no_addresses_id:
-                    log.logger.warning('WARNING! gitee_id {} does not match any email address.'.format(i))
-                    no_addresses_id.append(i)
-            if i not in open_pr_dict.keys():
-                open_pr_dict[i] = [pr_info[:-1]]
-            else:
-                open_pr_dict[i].append(pr_info[:-1])
+            if LOG_PR_SAMPLE:
+                for item in repos_pulls_mapping[full_repo]:
+                    if random.random() < LOG_PR_SAMPLE:
+                        log.logger.debug('Find open pr: {}'.format(item['link'].split('/', 3)[3]))
+            sig_repos.append((sig_name, full_repo, sig_index.get_reviewers(sig_name, full_repo)))
+    if not sig_repos:
+        return {}
+    import pandas as pd
+
+    sig_repos = pd.DataFrame(sig_repos, columns=['sig', 'repo', 'reviewers'])
+    sig_repos['repo_position'] = range(len(sig_repos))
+    pulls = pd.DataFrame([x for pulls in repos_pulls_mapping.values() for x in pulls],
+                         columns=['link', 'title', 'ref', 'created_at'])
+    pulls['repo'] = pulls['link'].str.split('/').str[3:5].str.join('/')
+    pulls['pull_position'] = range(len(pulls))
+    pulls['age'] = (pd.Timestamp(now) - pd.to_datetime(pulls['created_at'], format='%Y-%m-%d %H:%M:%S')).dt.days
+    pulls['status'] = [x for status in repos_pulls_mapping.status.values() for x in status]
+    # one row for every sig and pull, in the order of sigs, repositories and pages
+    prs = sig_repos.merge(pulls, on='repo').sort_values(['repo_position', 'pull_position'], kind='stable')
+    prs = prs.reset_index(drop=True)
+    records = [PullRecord(x.sig, x.repo, x.ref, x.link, x.title, int(x.age), int(x.status))
+               for x in prs[['sig', 'repo', 'ref', 'link', 'title', 'age', 'status']].itertuples(index=False)]
+    fan_out = prs[['reviewers', 'sig', 'age']].explode('reviewers').dropna(subset=['reviewers'])
+    fan_out = fan_out.rename_axis('record').reset_index()
+    fan_out = fan_out.sort_values(['reviewers', 'sig', 'age', 'record'], ascending=[True, True, False, True],
+                                  kind='stable')
+    return {reviewer: [records[x] for x in indexes]
+            for reviewer, indexes in fan_out.groupby('reviewers', sort=True)['record']}
+
+
+class SendLedger(object):
+    """
+    Persistent record of the report emails sent by every run, a restarted run skips the receivers already sent to.
+    A message is recorded once the server accepts it, so it is sent twice only if the process dies in between.
+    """
+
+    def __init__(self, run_id, path=SEND_LEDGER):
+        self.run_id = run_id
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # shards of a run may share the ledger
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self.lock = threading.Lock()
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS sends (
+                run_id TEXT NOT NULL,
+                receiver TEXT NOT NULL,
+                email TEXT NOT NULL,
+                sent_at INTEGER NOT NULL,
+                PRIMARY KEY (run_id, receiver)
+            )
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.conn.close()
+
+    def sent(self):
+        """
+        Get receivers already sent to in the run
+        :return: a set of Gitee IDs
+        """
+        with self.lock:
+            return {x[0] for x in self.conn.execute('SELECT receiver FROM sends WHERE run_id = ?', (self.run_id,))}
+
+    def record(self, receiver, email_address):
+        """
+        Record an email sent to a receiver
+        :param receiver: Gitee ID of the receiver
+        :param email_address: email address of the receiver
+        """
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO sends VALUES (?, ?, ?, ?)',
+                              (self.run_id, receiver, email_address, int(time.time())))
+
+
+def record_delivery(ledger, receiver, email_address, future):
+    """
+    Record a delivery in the ledger once it succeeded
+    :param ledger: SendLedger
+    :param receiver: Gitee ID of the receiver
+    :param email_address: email address of the receiver
+    :param future: future of the delivery
+    """
+    if future.exception() is None and future.result() is None:
+        ledger.record(receiver, email_address)
+
+
+class ReportDigests(object):
+    """
+    Persistent digests of the last report sent to every reviewer, to tell whether a report changed since then
+    """
+
+    def __init__(self, path=REPORT_DIGESTS):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        # shards of a run may share the digests
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=60)
+        self.lock = threading.Lock()
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS digests (
+                receiver TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                sent_at INTEGER NOT NULL
+            )
+        ''')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.conn.close()
+
+    def last(self):
+        """
+        Get the last reports sent
+        :return: a dict of {receiver: (digest, sent_at)}
+        """
+        with self.lock:
+            return {x[0]: x[1:] for x in self.conn.execute('SELECT receiver, digest, sent_at FROM digests')}
+
+    def record(self, receiver, digest):
+        """
+        Record the digest of a report sent to a receiver
+        :param receiver: Gitee ID of the receiver
+        :param digest: digest of the report
+        """
+        with self.lock, self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO digests VALUES (?, ?, ?)', (receiver, digest, int(time.time())))
+
+
+def report_digest(pr_list):
+    """
+    Get a stable digest of the ordered rows of a report. Ages of Pull Requests grow every day and compare info of
+    sigs is refreshed every run, neither of them makes a report changed.
+    :param pr_list: ordered PullRecords of the report
+    :return: hex digest
+    """
+    digest = hashlib.sha1()
+    for x in pr_list:
+        row = [x.sig, x.repo, x.branch, x.link, x.title, x.status]
+        digest.update(json.dumps(row, ensure_ascii=False).encode('utf-8') + b'\n')
+    return digest.hexdigest()
+
+
+def report_due(digest, last, policy=SEND_POLICY, days=SEND_POLICY_DAYS):
+    """
+    Decide whether a report is sent under the send policy
+    :param digest: digest of the report
+    :param last: digest and send time of the last report sent to the receiver, or None if never sent
+    :param policy: one of SEND_POLICIES
+    :param days: days after which an unchanged report is sent again under the changed-or-days policy
+    :return: whether to send the report, and its change: new, changed or unchanged
+    """
+    if last is None:
+        change = 'new'
+    elif last[0] != digest:
+        change = 'changed'
+    else:
+        change = 'unchanged'
+    if policy == 'always' or change != 'unchanged':
+        return True, change
+    return policy == 'changed-or-days' and time.time() - last[1] >= days * 3600 * 24, change
+
+
+def record_report_digest(digests, receiver, digest, future):
+    """
+    Record the digest of a report once it is sent
+    :param digests: ReportDigests
+    :param receiver: Gitee ID of the receiver
+    :param digest: digest of the report
+    :param future: future of the delivery
+    """
+    if future.exception() is None and future.result() is None:
+        digests.record(receiver, digest)
+
+
+def write_checkpoint(path, content):
+    """
+    Write a checkpoint file atomically, a checkpoint is either complete or missing
+    :param path: path of the checkpoint file
+    :param content: text of the checkpoint
+    """
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def prune_checkpoints(run_id):
+    """
+    Remove checkpoints of other runs
+    :param run_id: id of the current run
+    """
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return
+    for i in os.listdir(CHECKPOINT_DIR):
+        if i != run_id:
+            subprocess.call(['rm', '-rf', os.path.join(CHECKPOINT_DIR, i)])
+
+
+def save_snapshot(path, sig_index, repos_pulls_mapping, compare_dict, now):
+    """
+    Record everything a run fetched in a gzip compressed json snapshot, reports can be rendered again from it
+    without network access
+    :param path: path of the snapshot file
+    :param sig_index: SigIndex of every sig, its repositories and reviewers
+    :param repos_pulls_mapping: PullsBuckets of mappings between repos and pulls
+    :param compare_dict: a dict of every sig and its compare info
+    :param now: reference time of the run
+    """
+    snapshot = {
+        'version': SNAPSHOT_VERSION,
+        'recorded_at': now.isoformat(),
+        'commit': sig_index.commit,
+        'sigs': sig_index.parsed_sigs,
+        # buckets flattened in order are grouped back into the same buckets
+        'pulls': [x for pulls in repos_pulls_mapping.values() for x in pulls],
+        'compare': compare_dict
+    }
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = path + '.tmp'
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    log.logger.info('Record snapshot of the run to {}'.format(path))
+
+
+def load_snapshot(path):
+    """
+    Load a snapshot recorded by save_snapshot
+    :param path: path of the snapshot file
+    :return: SigIndex, PullsBuckets, compare dict and reference time of the recorded run, or None if failed
+    """
+    try:
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            snapshot = json.load(f)
+    except (OSError, EOFError, ValueError) as e:
+        log.logger.error('Fail to load snapshot {}: {}'.format(path, e))
+        return
+    if snapshot.get('version') != SNAPSHOT_VERSION:
+        log.logger.error('Snapshot {} has version {}, expect {}.'.format(path, snapshot.get('version'),
+                                                                         SNAPSHOT_VERSION))
+        return
+    return (SigIndex(snapshot['sigs'], snapshot['commit']), group_pulls_by_repo(snapshot['pulls']),
+            snapshot['compare'], datetime.datetime.fromisoformat(snapshot['recorded_at']))
+
+
+def shard_of(receiver, count):
+    """
+    Get the shard of a receiver by a stable hash of its Gitee ID, the same on every host and run
+    :param receiver: Gitee ID of the receiver
+    :param count: number of shards
+    :return: index of the shard
+    """
+    return int(hashlib.sha1(receiver.encode('utf-8')).hexdigest(), 16) % count
+
+
+def shard_path(path, shard):
+    """
+    Get the path of a per shard file
+    :param path: path of the file of an unsharded run
+    :param shard: index and number of shards
+    :return: path of the file of the shard
+    """
+    root, ext = os.path.splitext(path)
+    return '{}-{}-of-{}{}'.format(root, shard[0], shard[1], ext)
+
+
+def merge_summaries(paths):
+    """
+    Merge run summaries of shards into the metrics of the whole run
+    :param paths: paths of the run summaries
+    :return: Metrics
+    """
+    merged = Metrics()
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            merged.merge(json.load(f))
+    counts = {x.split('/')[1] for x in merged.shards}
+    indexes = {int(x.split('/')[0]) for x in merged.shards}
+    if len(counts) > 1:
+        log.logger.warning('Summaries come from runs with different numbers of shards: {}'.format(sorted(counts)))
+    elif counts and indexes != set(range(int(counts.pop()))):
+        log.logger.warning('Summaries of some shards are missing, got shards {}'.format(sorted(merged.shards)))
+    return merged
+
+
+@instrumented('pr_statistics')
+def pr_statistics(data_dir, sig_index, repos_pulls_mapping, compare_dict, now=None, receivers=None, deliver=True,
+                  shard=None, ledger=None, checkpoint=None, policy=SEND_POLICY, open_pr_dict=None,
+                  workers=REPORT_WORKERS):
+    """
+    Render the reports of reviewers, then send them or write them to data_dir
+    :param data_dir: directory to store temporary data
+    :param sig_index: SigIndex of every sig, its repositories and reviewers
+    :param repos_pulls_mapping: mappings between repos and pulls
+    :param compare_dict: a dict of every sig and its compare info
+    :param now: reference time of the run, defaults to the current time
+    :param receivers: Gitee IDs of the receivers to report to, all reviewers if None
+    :param deliver: send the reports by email if True, otherwise write them to data_dir as html files
+    :param shard: index and number of shards, only receivers of the shard are reported to
+    :param ledger: SendLedger to skip receivers already sent to and to record deliveries in
+    :param checkpoint: directory of the checkpoints of the run to keep rendered reports in and reuse them from,
+                       only used when delivering
+    :param policy: send policy, one of SEND_POLICIES, reports skipped under it are not rendered either
+    :param open_pr_dict: open Pull Requests of every reviewer kept up to date elsewhere, built from the pulls if None
+    :param workers: number of processes rendering reports, render in the current process if less than 2
+    :return: a dict of every receiver and the error of sending (None if sent), or the path of the html file
+    """
+    log.logger.info('=' * 25 + ' STATISTICS ' + '=' * 25)
+    email_mappings = sig_index.email_mappings
+    if open_pr_dict is None:
+        open_pr_dict = build_open_pr_dict(sig_index, repos_pulls_mapping, now or datetime.datetime.today())
+    for i in open_pr_dict:
+        if i not in email_mappings:
+            log.logger.warning('WARNING! gitee_id {} does not match any email address.'.format(i))
+    if receivers is not None:
+        for receiver in sorted(set(receivers) - set(open_pr_dict)):
+            log.logger.warning('{} has no open Pull Requests to report.'.format(receiver))
+        open_pr_dict = {k: v for k, v in open_pr_dict.items() if k in receivers}
+    if shard is not None:
+        open_pr_dict = {k: v for k, v in open_pr_dict.items() if shard_of(k, shard[1]) == shard[0]}
+        log.logger.info('Shard {}/{} reports to {} reviewers.'.format(shard[0], shard[1], len(open_pr_dict)))
+    sent = ledger.sent() if ledger else set()
+    digests = ReportDigests(REPORT_DIGESTS) if deliver and REPORT_DIGESTS else None
+    if deliver and not digests and policy != 'always':
+        log.logger.warning('REPORT_DIGESTS is empty, send every report instead of under the {} policy.'.format(
+            policy))
+    last_digests = digests.last() if digests else {}
+    report_digests = {}
+    skipped = 0
+    report_dir = data_dir
+    checkpoint = checkpoint if deliver else None
+    if checkpoint:
+        report_dir = os.path.join(checkpoint, 'reports')
+        os.makedirs(report_dir, exist_ok=True)
+    reports = []
+    rendered_reports = []
     for receiver in sorted(list(open_pr_dict.keys())):
-        origin_pr_list = sorted(open_pr_dict[receiver], key=(lambda x: int(x[6])), reverse=True)
-        ordered_pr_list = []
-        pr_sigs = sorted(set([x[0] for x in origin_pr_list]))
-        for pr_sig in pr_sigs:
-            for op in origin_pr_list:
-                if op[0] == pr_sig:
-                    if len(ordered_pr_list) > 0 and op[0] == ordered_pr_list[-1][0] and int(op[-1]) > \
-                            int(ordered_pr_list[-1][-1]):
-                        ordered_pr_list.insert(-1, op)
-                    else:
-                        ordered_pr_list.append(op)
-        statistics_csv = '{}/statistics_{}.csv'.format(data_dir, receiver)
-        f = codecs.open(statistics_csv, 'w', encoding='utf-8')
-        writer = csv.writer(f)
-        for i in ordered_pr_list:
-            writer.writerow(i)
-        f.close()
         email_address = email_mappings.get(receiver)
         if not email_address:
             log.logger.warning('Ready to send statistics for {} but cannot find the email address'.format(receiver))
             continue
+        if receiver in sent:
+            log.logger.info('Statistics for {} are already sent in this run, skip'.format(receiver))
+            continue
+        if digests:
+            report_digests[receiver] = report_digest(open_pr_dict[receiver])
+            due, change = report_due(report_digests[receiver], last_digests.get(receiver), policy)
+            metrics.inc('report_changes_total', change=change)
+            if not due:
+                log.logger.debug('Statistics for {} are unchanged since the last report, skip'.format(receiver))
+                skipped += 1
+                continue
         log.logger.info('Ready to send statistics for {} whose email address is {}'.format(receiver, email_address))
-        statistics_xlsx = csv_to_xlsx(statistics_csv)
-        excel_optimization(statistics_xlsx, compare_dict)
-        send_email(statistics_xlsx, receiver, [email_address])
+        statistics_xlsx = None
+        if REPORT_ATTACH_XLSX:
+            statistics_xlsx = '{}/statistics_{}.xlsx'.format(report_dir, receiver)
+        report = (receiver, email_address, open_pr_dict[receiver], statistics_xlsx)
+        statistics_html = '{}/statistics_{}.html'.format(report_dir, receiver)
+        if checkpoint and os.path.exists(statistics_html) and (not statistics_xlsx or os.path.exists(statistics_xlsx)):
+            with open(statistics_html, 'r', encoding='utf-8') as f:
+                rendered_reports.append((report, f.read()))
+            continue
+        reports.append(report)
+    if digests:
+        metrics.inc('reports_skipped_total', skipped)
+        log.logger.info('Skip {} reviewers whose report is unchanged under the {} policy.'.format(skipped, policy))
+    if rendered_reports:
+        log.logger.info('Reuse {} reports rendered before the restart.'.format(len(rendered_reports)))
+    # render in worker processes while the previous reports are being sent
+    hits = misses = 0
+    written = {}
+    # digests are closed after the pending deliveries have recorded theirs
+    with digests or contextlib.nullcontext(), MailDelivery() if deliver else contextlib.nullcontext() as delivery:
+        def send(receiver, email_address, body_of_email, statistics_xlsx):
+            future = delivery.submit(body_of_email, [email_address], statistics_xlsx)
+            if ledger:
+                future.add_done_callback(functools.partial(record_delivery, ledger, receiver, email_address))
+            if digests:
+                future.add_done_callback(functools.partial(record_report_digest, digests, receiver,
+                                                           report_digests[receiver]))
+
+        for report, body_of_email in rendered_reports:
+            receiver, email_address, _, statistics_xlsx = report
+            send(receiver, email_address, body_of_email, statistics_xlsx)
+        for report, rendered in zip(reports, render_reports(reports, compare_dict, workers)):
+            receiver, email_address, records, statistics_xlsx = report
+            body_of_email, report_hits, report_misses, elapsed = rendered
+            hits += report_hits
+            misses += report_misses
+            metrics.observe('render_duration_seconds', elapsed)
+            metrics.inc('rows_rendered_total', len(records))
+            if checkpoint:
+                write_checkpoint('{}/statistics_{}.html'.format(report_dir, receiver), body_of_email)
+            if deliver:
+                send(receiver, email_address, body_of_email, statistics_xlsx)
+                continue
+            written[receiver] = '{}/statistics_{}.html'.format(data_dir, receiver)
+            with open(written[receiver], 'w', encoding='utf-8') as f:
+                f.write(body_of_email)
+    metrics.inc('fragment_cache_total', hits, result='hit')
+    metrics.inc('fragment_cache_total', misses, result='miss')
+    log.logger.info('Fragment cache: {} hits, {} misses, hit rate {:.1%}.'.format(hits, misses,
+                                                                                  hits / max(hits + misses, 1)))
+    if not deliver:
+        log.logger.info('Write {} reports to {}.'.format(len(written), data_dir))
+        return written
+    failures = [x for x in delivery.outcomes if delivery.outcomes[x] is not None]
+    log.logger.info('Sent {} report emails, {} failed.'.format(len(delivery.outcomes) - len(failures),
+                                                               len(failures)))
+    return delivery.outcomes
 
 
-def main():
+def load_compared_snapshot(snapshot_path):
     """
-    main function
+    Load a snapshot to render reports from, exit if it cannot be loaded or has no compare info yet
+    :param snapshot_path: path of the snapshot file
+    :return: SigIndex, PullsBuckets, compare dict and reference time of the recorded run
+    """
+    snapshot = load_snapshot(snapshot_path)
+    if snapshot is None:
+        sys.exit(1)
+    if snapshot[2] is None:
+        log.logger.error('Snapshot {} has no compare info, run the compare command first.'.format(snapshot_path))
+        sys.exit(1)
+    return snapshot
+
+
+def replay(snapshot_path, receivers=None, data_dir='data', shard=None):
+    """
+    Render reports again from a recorded snapshot and write them to data_dir, without network access
+    :param snapshot_path: path of the snapshot file
+    :param receivers: Gitee IDs of the receivers to render, all reviewers if None
+    :param data_dir: directory to write the reports to
+    :param shard: index and number of shards, only receivers of the shard are rendered
+    :return: a dict of every receiver and the path of the html file
+    """
+    log.logger.info('=' * 25 + ' REPLAY {} '.format(snapshot_path) + '=' * 25)
+    sig_index, repos_pulls_mapping, compare_dict, now = load_compared_snapshot(snapshot_path)
+    os.makedirs(data_dir, exist_ok=True)
+    return pr_statistics(data_dir, sig_index, repos_pulls_mapping, compare_dict, now, receivers, deliver=False,
+                         shard=shard)
+
+
+def send_from_snapshot(snapshot_path, receivers=None, shard=None, run_id=None, policy=SEND_POLICY):
+    """
+    Render reports from a snapshot recorded by a shared fetch stage and send them
+    :param snapshot_path: path of the snapshot file
+    :param receivers: Gitee IDs of the receivers to report to, all reviewers if None
+    :param shard: index and number of shards, only receivers of the shard are reported to
+    :param run_id: id of the run in the send ledger, defaults to the day the snapshot was recorded
+    :param policy: send policy, one of SEND_POLICIES
+    :return: a dict of every receiver and the error of sending, None if sent
+    """
+    sig_index, repos_pulls_mapping, compare_dict, now = load_compared_snapshot(snapshot_path)
+    data_dir = prepare_data_dir('data' if shard is None else 'data-{}-of-{}'.format(*shard))
+    run_id = run_id or RUN_ID or now.date().isoformat()
+    checkpoint = os.path.join(CHECKPOINT_DIR, run_id) if CHECKPOINTS else None
+    with SendLedger(run_id) if CHECKPOINTS else contextlib.nullcontext() as ledger:
+        return pr_statistics(data_dir, sig_index, repos_pulls_mapping, compare_dict, now, receivers, shard=shard,
+                             ledger=ledger, checkpoint=checkpoint, policy=policy)
+
+
+class PageCache(object):
+    """
+    Rendered pages keyed by (view, name, format), bounded by their total size. The least recently used pages are
+    evicted first. A page rendered from a state that was invalidated meanwhile is not kept.
+    """
+
+    def __init__(self, max_bytes=REPORT_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.pages = collections.OrderedDict()
+        self.bytes = 0
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """
+        Get a page
+        :param key: (view, name, format)
+        :return: page, or None if not cached
+        """
+        with self.lock:
+            page = self.pages.get(key)
+            if page is None:
+                self.misses += 1
+                return
+            self.pages.move_to_end(key)
+            self.hits += 1
+            return page
+
+    def put(self, key, page, generation):
+        """
+        Keep a page
+        :param key: (view, name, format)
+        :param page: content of the page
+        :param generation: generation of the state the page is rendered from
+        """
+        with self.lock:
+            if generation != self.generation or len(page) > self.max_bytes:
+                return
+            former = self.pages.pop(key, None)
+            if former is not None:
+                self.bytes -= len(former)
+            self.pages[key] = page
+            self.bytes += len(page)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.pages.popitem(last=False)
+                self.bytes -= len(evicted)
+                self.evictions += 1
+
+    def invalidate(self, views=None):
+        """
+        Drop pages of changed reviewers and sigs
+        :param views: a set of (view, name), all pages if None
+        """
+        with self.lock:
+            self.generation += 1
+            for key in list(self.pages):
+                if views is None or key[:2] in views:
+                    self.bytes -= len(self.pages.pop(key))
+
+    def stats(self):
+        """
+        Get statistics of the cache
+        :return: a dict of sizes, hits, misses and evictions
+        """
+        with self.lock:
+            return {'pages': len(self.pages), 'bytes': self.bytes, 'max_bytes': self.max_bytes, 'hits': self.hits,
+                    'misses': self.misses, 'hit_rate': self.hits / max(self.hits + self.misses, 1),
+                    'evictions': self.evictions}
+
+
+def parse_created_at(value):
+    """
+    Parse the creation time of a pull, in the format of the pulls API or in ISO 8601 like webhooks of Gitee
+    :param value: creation time
+    :return: naive datetime in local time
+    """
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        pass
+    # fromisoformat of python 3.9 does not take the Z suffix
+    created_at = datetime.datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)
+    if created_at.tzinfo is not None:
+        created_at = created_at.astimezone().replace(tzinfo=None)
+    return created_at
+
+
+def parse_pull_event(event):
+    """
+    Validate a pull webhook event before it changes any state
+    :param event: decoded event {"action": ..., "pull": {...}}
+    :return: action and the pull with PULL_FIELDS only and created_at in the format of the pulls API, only link for
+    close and merge
+    """
+    if not isinstance(event, dict) or not isinstance(event.get('pull'), dict):
+        raise ValueError('event needs an action and a pull object')
+    action, pull = event.get('action'), event['pull']
+    if action not in WEBHOOK_ACTIONS:
+        raise ValueError('unknown action {}'.format(action))
+    link = pull.get('link')
+    segments = link.split('/', 3) if isinstance(link, str) else []
+    pull_path = segments[3].split('/') if len(segments) == 4 else []
+    if len(pull_path) != 4 or not all(pull_path) or pull_path[2] != 'pulls' or not pull_path[3].isdigit():
+        raise ValueError('link {} is not a link of a pull'.format(link))
+    if action in ['close', 'merge']:
+        return action, {'link': link}
+    types = {'title': str, 'ref': str, 'created_at': str, 'draft': bool, 'labels': (str, type(None)),
+             'mergeable': (bool, type(None))}
+    missing = [x for x in PULL_FIELDS if x not in pull]
+    if missing:
+        raise ValueError('pull needs {}'.format(', '.join(missing)))
+    invalid = [x for x, t in types.items() if not isinstance(pull[x], t)]
+    if invalid:
+        raise ValueError('invalid {} of the pull'.format(', '.join(invalid)))
+    pull = {x: pull[x] for x in PULL_FIELDS}
+    try:
+        pull['created_at'] = parse_created_at(pull['created_at']).strftime('%Y-%m-%d %H:%M:%S')
+    except ValueError:
+        raise ValueError('invalid created_at {}'.format(pull['created_at'])) from None
+    return action, pull
+
+
+class Daemon(object):
+    """
+    Keep the sigs, the pulls and the open Pull Requests of every reviewer of a run in memory. A pull webhook event
+    updates the pulls of its repository and the reviewers of that repository only, digests are sent from this state
+    without fetching or fanning out again. Pages of reviewers and sigs are rendered from it on demand and cached
+    until their reviewer or sig changes. Requests and the scheduler run in threads, so nothing is forked: reports
+    and sigs are rendered and parsed in the daemon process itself.
+    """
+
+    def __init__(self, policy=SEND_POLICY, token=WEBHOOK_TOKEN):
+        self.policy = policy
+        self.token = token
+        self.lock = threading.Lock()
+        # digests are sent one at a time
+        self.digest_lock = threading.Lock()
+        self.stopped = threading.Event()
+        self.sig_index = None
+        self.repos_pulls_mapping = None
+        self.compare_dict = {}
+        self.now = None
+        self.loaded_at = 0
+        self.next_resync = 0
+        self.open_pr_dict = {}
+        # {owner/repo: [(sig, reviewers)]} and {(sig, owner/repo): position} in the order of the full fan-out
+        self.repo_sigs = {}
+        self.repo_positions = {}
+        self.sig_repos = {}
+        self.events = 0
+        self.last_digest = None
+        self.pages = PageCache()
+
+    def load(self, sig_index, repos_pulls_mapping, compare_dict, now=None):
+        """
+        Replace the state with the result of a fetch
+        :param sig_index: SigIndex of every sig, its repositories and reviewers
+        :param repos_pulls_mapping: PullsBuckets of mappings between repos and pulls
+        :param compare_dict: a dict of every sig and its compare info
+        :param now: reference time of ages, defaults to the current time
+        """
+        now = now or datetime.datetime.today()
+        open_pr_dict = build_open_pr_dict(sig_index, repos_pulls_mapping, now)
+        repo_sigs = {}
+        repo_positions = {}
+        sig_repos = {}
+        for sig in sig_index.sigs:
+            sig_repos[sig['name']] = []
+            for full_repo in sig['repositories']:
+                if full_repo.split('/')[0] not in ['src-openeuler', 'openeuler']:
+                    continue
+                sig_repos[sig['name']].append(full_repo)
+                repo_positions[(sig['name'], full_repo)] = len(repo_positions)
+                repo_sigs.setdefault(full_repo, []).append(
+                    (sig['name'], sig_index.get_reviewers(sig['name'], full_repo)))
+        with self.lock:
+            self.sig_index = sig_index
+            self.repos_pulls_mapping = repos_pulls_mapping
+            self.compare_dict = compare_dict
+            self.now = now
+            self.loaded_at = time.time()
+            self.next_resync = self.loaded_at + DAEMON_RESYNC_HOURS * 3600
+            self.open_pr_dict = open_pr_dict
+            self.repo_sigs = repo_sigs
+            self.repo_positions = repo_positions
+            self.sig_repos = sig_repos
+            self.pages.invalidate()
+        log.logger.info('Load {} pulls of {} repositories for {} reviewers.'.format(
+            sum(len(x) for x in repos_pulls_mapping.values()), len(repos_pulls_mapping), len(open_pr_dict)))
+
+    def resync(self):
+        """
+        Fetch everything again, the current state is kept if the fetch fails and the resync is retried after
+        DAEMON_RETRY_MINUTES. The fetch clears the data directory, so no digest is sent meanwhile and the working
+        directory is locked against runs of other processes, which fails the resync.
+        :return: whether the state is replaced
+        """
+        log.logger.info('=' * 25 + ' DAEMON RESYNC ' + '=' * 25)
+        try:
+            with self.digest_lock, working_dir_lock():
+                _, sig_index, repos_pulls_mapping, compare_dict = fetch_run(sig_workers=1)
+                self.load(sig_index, repos_pulls_mapping, compare_dict)
+        except (SystemExit, Exception):
+            self.next_resync = time.time() + DAEMON_RETRY_MINUTES * 60
+            log.logger.error('Fail to resync, keep the state loaded at {} and retry in {} minutes.'.format(
+                datetime.datetime.fromtimestamp(self.loaded_at), DAEMON_RETRY_MINUTES), exc_info=True)
+            metrics.inc('daemon_failures_total', task='resync')
+            return False
+        return True
+
+    def record_key(self, record):
+        """
+        Get the position of a record in the list of a reviewer, the same as in build_open_pr_dict
+        :param record: PullRecord
+        :return: sort key
+        """
+        position = self.repos_pulls_mapping.positions[record.link.split('/', 3)[3]][1]
+        return record.sig, -record.age, self.repo_positions[(record.sig, record.repo)], position
+
+    def repo_records(self, sig_name, full_repo):
+        """
+        Build the records of the open pulls of a repository, the lock must be held
+        :param sig_name: sig name
+        :param full_repo: owner/repo
+        :return: PullRecords in the order of pages
+        """
+        pulls = self.repos_pulls_mapping.get(full_repo, [])
+        status = self.repos_pulls_mapping.status.get(full_repo, [])
+        return [PullRecord(sig_name, full_repo, pull['ref'], pull['link'], pull['title'],
+                           (self.now - datetime.datetime.strptime(pull['created_at'], '%Y-%m-%d %H:%M:%S')).days,
+                           int(flags))
+                for pull, flags in zip(pulls, status)]
+
+    def sig_records(self, sig_name):
+        """
+        Build the records of the open pulls of a sig, the lock must be held
+        :param sig_name: sig name
+        :return: PullRecords ordered like the list of a reviewer, or None if there is no such sig
+        """
+        if sig_name not in self.sig_repos:
+            return
+        records = [x for full_repo in self.sig_repos[sig_name] for x in self.repo_records(sig_name, full_repo)]
+        return sorted(records, key=self.record_key)
+
+    def fan_out(self, full_repo):
+        """
+        Rebuild the records of a repository in the lists of its reviewers, the lock must be held
+        :param full_repo: owner/repo
+        :return: reviewers whose list is rebuilt
+        """
+        records = {}
+        for sig_name, reviewers in self.repo_sigs.get(full_repo, []):
+            sig_records = self.repo_records(sig_name, full_repo)
+            for reviewer in reviewers:
+                records.setdefault(reviewer, []).extend(sig_records)
+        # every list is built before any of them is replaced
+        pr_lists = {}
+        for reviewer, reviewer_records in records.items():
+            pr_list = [x for x in self.open_pr_dict.get(reviewer, []) if x.repo != full_repo] + reviewer_records
+            pr_lists[reviewer] = sorted(pr_list, key=self.record_key)
+        for reviewer, pr_list in pr_lists.items():
+            if pr_list:
+                self.open_pr_dict[reviewer] = pr_list
+            else:
+                self.open_pr_dict.pop(reviewer, None)
+        return sorted(records)
+
+    def apply(self, action, pull):
+        """
+        Apply a pull webhook event. The event is validated before the lock is taken, the state is left as it was if
+        the event is invalid or the pulls of its repository cannot be rebuilt.
+        :param action: one of WEBHOOK_ACTIONS
+        :param pull: the pull in the format of the pulls API, only link is needed to close it
+        :return: reviewers whose list is rebuilt
+        """
+        start = time.perf_counter()
+        action, pull = parse_pull_event({'action': action, 'pull': pull})
+        pull_path = pull['link'].split('/', 3)[3]
+        full_repo = '/'.join(pull_path.split('/')[:2])
+        with self.lock:
+            bucket = list(self.repos_pulls_mapping.get(full_repo, []))
+            status = list(self.repos_pulls_mapping.status.get(full_repo, []))
+            if action in ['close', 'merge']:
+                changed = self.repos_pulls_mapping.remove(pull_path)
+            else:
+                self.repos_pulls_mapping.add([pull])
+                changed = True
+            try:
+                reviewers = self.fan_out(full_repo) if changed else []
+            except Exception:
+                self.restore_repo(full_repo, bucket, status)
+                raise
+            if changed:
+                self.pages.invalidate({('reviewer', x) for x in reviewers} |
+                                      {('sig', x) for x, _ in self.repo_sigs.get(full_repo, [])})
+            self.events += 1
+        metrics.observe('webhook_apply_duration_seconds', time.perf_counter() - start)
+        metrics.inc('webhook_events_total', action=action, result='applied' if changed else 'ignored')
+        log.logger.info('Apply {} of {}, {} reviewers updated.'.format(action, pull_path, len(reviewers)))
+        return reviewers
+
+    def restore_repo(self, full_repo, bucket, status):
+        """
+        Put back the pulls of a repository taken before a failed event, the lock must be held
+        :param full_repo: owner/repo
+        :param bucket: pulls of the repository
+        :param status: status flags of the pulls
+        """
+        mapping = self.repos_pulls_mapping
+        for pull in mapping.get(full_repo, []):
+            mapping.positions.pop(pull['link'].split('/', 3)[3], None)
+        for index, pull in enumerate(bucket):
+            mapping.positions[pull['link'].split('/', 3)[3]] = (full_repo, index)
+        if bucket:
+            mapping[full_repo] = bucket
+            mapping.status[full_repo] = status
+        else:
+            mapping.pop(full_repo, None)
+            mapping.status.pop(full_repo, None)
+
+    def refresh_ages(self):
+        """
+        Build the lists of reviewers again if the ages of their Pull Requests are from another day
+        """
+        today = datetime.datetime.today()
+        with self.lock:
+            if self.now.date() == today.date():
+                return
+            self.now = today
+            self.open_pr_dict = build_open_pr_dict(self.sig_index, self.repos_pulls_mapping, today)
+            self.pages.invalidate()
+
+    def digest(self, receivers=None, run_id=None):
+        """
+        Send reports from the state
+        :param receivers: Gitee IDs of the receivers to report to, all reviewers if None
+        :param run_id: id of the run in the send ledger, no ledger if None
+        :return: numbers of sent and failed emails
+        """
+        with self.digest_lock:
+            start = time.perf_counter()
+            self.refresh_ages()
+            with self.lock:
+                open_pr_dict = {k: list(v) for k, v in self.open_pr_dict.items()}
+                sig_index, repos_pulls_mapping, compare_dict, now = (self.sig_index, self.repos_pulls_mapping,
+                                                                     self.compare_dict, self.now)
+            data_dir = prepare_data_dir()
+            with SendLedger(run_id) if run_id else contextlib.nullcontext() as ledger:
+                outcomes = pr_statistics(data_dir, sig_index, repos_pulls_mapping, compare_dict, now, receivers,
+                                         ledger=ledger, policy=self.policy, open_pr_dict=open_pr_dict, workers=1)
+            elapsed = time.perf_counter() - start
+            failed = sum(1 for x in outcomes.values() if x is not None)
+            self.last_digest = {'finished_at': int(time.time()), 'seconds': elapsed,
+                                'sent': len(outcomes) - failed, 'failed': failed}
+            metrics.observe('digest_duration_seconds', elapsed)
+            export_metrics()
+            return len(outcomes) - failed, failed
+
+    def page(self, view, name, fmt='html'):
+        """
+        Get the page of a reviewer or a sig, render it on a miss of the page cache
+        :param view: reviewer or sig
+        :param name: Gitee ID of the reviewer or sig name
+        :param fmt: html or xlsx
+        :return: content of the page, or None if the reviewer has no open Pull Requests or there is no such sig
+        """
+        # pages of another day show stale ages
+        self.refresh_ages()
+        key = (view, name, fmt)
+        page = self.pages.get(key)
+        metrics.inc('page_cache_total', result='miss' if page is None else 'hit')
+        if page is not None:
+            return page
+        with self.lock:
+            generation = self.pages.generation
+            compare_dict = self.compare_dict
+            if view == 'reviewer':
+                pr_list = list(self.open_pr_dict[name]) if name in self.open_pr_dict else None
+            else:
+                pr_list = self.sig_records(name)
+        if pr_list is None:
+            return
+        if fmt == 'xlsx':
+            page = render_xlsx_bytes(pr_list, compare_dict)
+        elif view == 'reviewer':
+            page = render_statistics_html(name, pr_list, compare_dict).encode('utf-8')
+        else:
+            page = render_sig_page(name, pr_list, compare_dict).encode('utf-8')
+        self.pages.put(key, page, generation)
+        return page
+
+    def status(self):
+        """
+        Get the status of the daemon
+        :return: a dict of the loaded state, events and the last digest
+        """
+        with self.lock:
+            return {
+                'loaded_at': int(self.loaded_at),
+                'next_resync': int(self.next_resync),
+                'repositories': len(self.repos_pulls_mapping or {}),
+                'pulls': sum(len(x) for x in (self.repos_pulls_mapping or {}).values()),
+                'reviewers': len(self.open_pr_dict),
+                'events': self.events,
+                'last_digest': self.last_digest
+            }
+
+    def stats(self):
+        """
+        Get statistics of pages
+        :return: a dict of the page cache and of requests by view
+        """
+        requests_stats = {x['labels']['view']: {'count': x['count'], 'mean_seconds': x['sum'] / x['count']}
+                          for x in metrics.summary()['summaries'] if x['name'] == 'page_request_duration_seconds'}
+        return {'cache': self.pages.stats(), 'requests': requests_stats}
+
+    def handle_page(self, url):
+        """
+        Handle a request of the page of a reviewer or a sig
+        :param url: parsed url of the request, /reviewer/<gitee_id> or /sig/<name> with an optional format=xlsx
+        :return: status code, content type and body of the response
+        """
+        from urllib.parse import parse_qs, unquote
+
+        start = time.perf_counter()
+        view, name = url.path[1:].split('/', 1)
+        fmt = parse_qs(url.query).get('format', ['html'])[0]
+        if fmt not in REPORT_CONTENT_TYPES:
+            return 400, 'text/plain', 'unknown format {}'.format(fmt)
+        page = self.page(view, unquote(name), fmt)
+        metrics.observe('page_request_duration_seconds', time.perf_counter() - start, view=view)
+        if page is None:
+            return 404, 'text/plain', 'no open Pull Requests of {} {}'.format(view, unquote(name))
+        return 200, REPORT_CONTENT_TYPES[fmt], page
+
+    def handle(self, method, path, headers, body=None):
+        """
+        Handle a request: GET /reviewer/<gitee_id> and GET /sig/<name> (html, or xlsx with format=xlsx),
+        GET /stats, GET /metrics, GET /healthz, POST /webhook with an event {"action": ..., "pull": {...}} and
+        POST /digest[?receivers=id1,id2]
+        :param method: method of the request
+        :param path: path of the request with its query
+        :param headers: headers of the request
+        :param body: body of the request
+        :return: status code, content type and body of the response
+        """
+        from urllib.parse import parse_qs, urlparse
+
+        url = urlparse(path)
+        if method == 'GET' and url.path.startswith(('/reviewer/', '/sig/')):
+            return self.handle_page(url)
+        if method == 'GET' and url.path == '/stats':
+            return 200, 'application/json', json.dumps(self.stats())
+        if method == 'GET' and url.path == '/metrics':
+            return 200, 'text/plain; version=0.0.4', metrics.prometheus()
+        if method == 'GET' and url.path == '/healthz':
+            return 200, 'application/json', json.dumps(self.status())
+        if method != 'POST' or url.path not in ['/webhook', '/digest']:
+            return 404, 'text/plain', 'not found'
+        if self.token and headers.get('X-Gitee-Token') != self.token:
+            return 403, 'text/plain', 'forbidden'
+        if url.path == '/digest':
+            receivers = parse_qs(url.query).get('receivers')
+            receivers = [x for x in receivers[0].split(',') if x] if receivers else None
+            sent, failed = self.digest(receivers)
+            return 200, 'application/json', json.dumps({'sent': sent, 'failed': failed})
+        try:
+            action, pull = parse_pull_event(json.loads(body or b'{}'))
+        except ValueError as e:
+            metrics.inc('webhook_events_total', action='unknown', result='invalid')
+            return 400, 'text/plain', 'invalid event: {}'.format(e)
+        reviewers = self.apply(action, pull)
+        return 200, 'application/json', json.dumps({'reviewers': reviewers})
+
+    def next_send(self, now):
+        """
+        Get the time of the next scheduled digest
+        :param now: current time
+        :return: datetime, or None if digests are not scheduled
+        """
+        if not DAEMON_SEND_AT:
+            return
+        hour, minute = map(int, DAEMON_SEND_AT.split(':'))
+        send_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        return send_at if send_at > now else send_at + datetime.timedelta(days=1)
+
+    def schedule(self):
+        """
+        Send digests at DAEMON_SEND_AT and resync every DAEMON_RESYNC_HOURS until stopped. A failed digest is retried
+        after DAEMON_RETRY_MINUTES until the next one is due.
+        """
+        next_send = send_at = self.next_send(datetime.datetime.today())
+        while True:
+            waits = [self.next_resync - time.time()]
+            if send_at:
+                waits.append((send_at - datetime.datetime.today()).total_seconds())
+            if self.stopped.wait(max(min(waits), 0)):
+                return
+            if time.time() >= self.next_resync:
+                self.resync()
+            if not send_at or datetime.datetime.today() < send_at:
+                continue
+            try:
+                # a restarted or retried digest does not send to anyone twice a day
+                self.digest(run_id='daemon-{}'.format(next_send.date().isoformat()))
+            except Exception:
+                metrics.inc('daemon_failures_total', task='digest')
+                send_at = datetime.datetime.today() + datetime.timedelta(minutes=DAEMON_RETRY_MINUTES)
+                following = self.next_send(next_send)
+                if send_at < following:
+                    log.logger.error('Fail to send the digest of {}, retry in {} minutes.'.format(
+                        next_send.date(), DAEMON_RETRY_MINUTES), exc_info=True)
+                    continue
+                log.logger.error('Fail to send the digest of {}, give up.'.format(next_send.date()), exc_info=True)
+            next_send = send_at = self.next_send(datetime.datetime.today())
+
+
+def create_daemon_server(daemon, host=DAEMON_HOST, port=DAEMON_PORT):
+    """
+    Create the HTTP server of a daemon, requests are handled in threads
+    :param daemon: Daemon
+    :param host: host to listen on
+    :param port: port to listen on
+    :return: server
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class DaemonHandler(BaseHTTPRequestHandler):
+        def log_message(self, fmt, *args):
+            log.logger.debug('{} - {}'.format(self.address_string(), fmt % args))
+
+        def respond(self, status, content_type, body):
+            data = body if isinstance(body, bytes) else body.encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            self.respond(*daemon.handle('GET', self.path, self.headers))
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            self.respond(*daemon.handle('POST', self.path, self.headers, body))
+
+    server = ThreadingHTTPServer((host, port), DaemonHandler)
+    server.daemon_threads = True
+    return server
+
+
+def parse_shard(value):
+    """
+    Parse a shard argument
+    :param value: shard in the form of i/N
+    :return: index and number of shards
     """
-    data_dir = prepare_env()
-    sigs, sigs_list = get_sigs()
-    compare_dict = all_sigs_compare(sigs_list)
+    try:
+        index, count = (int(x) for x in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError('shard must be in the form of i/N, got {}'.format(value))
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError('shard index must be in [0, {}), got {}'.format(count, index))
+    return index, count
+
+
+def export_metrics(shard=None):
+    """
+    Export metrics of the run. A shard only writes its own run summary, the Prometheus textfile is written when
+    the summaries of all shards are merged.
+    :param shard: index and number of shards
+    """
+    if shard is None:
+        metrics.export()
+    elif METRICS_SUMMARY:
+        metrics.export(textfile='', summary_file=shard_path(METRICS_SUMMARY, shard))
+
+
+@contextlib.contextmanager
+def working_dir_lock():
+    """
+    Hold the lock of the working directory during a live run. The community checkout, the data directory, the
+    checkpoints and the stores in CACHE_DIR are shared by every run in the directory, so live runs, shards of a run
+    included, have to run from separate working directories.
+    """
+    import fcntl
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(os.path.join(CACHE_DIR, 'run.lock'), 'w') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            log.logger.error('Another run is using {}, run live shards from separate working directories or fetch '
+                             'once and send with --shard, exit...'.format(os.path.abspath(CACHE_DIR)))
+            sys.exit(1)
+        yield
+
+
+def fetch_run(compare=True, sig_workers=SIG_INDEX_WORKERS):
+    """
+    Fetch everything a run needs, the pulls and the compare info are fetched while the community is synced
+    :param compare: whether to compare processed rates of sigs
+    :param sig_workers: number of processes parsing sigs
+    :return: data directory, SigIndex, PullsBuckets and compare dict (None if not compared)
+    """
+    compare_future = None
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        # the pulls do not depend on the community repository, fetch them while cloning
+        pulls_future = executor.submit(get_repos_pulls_mapping)
+        data_dir = prepare_env()
+        sig_index = get_sigs(workers=sig_workers)
+        if compare and not RATE_LOCAL:
+            compare_future = executor.submit(all_sigs_compare, sig_index.sigs_list)
+        repos_pulls_mapping = pulls_future.result()
+        if compare and RATE_LOCAL:
+            local_state = LocalSigState(sig_index, repos_pulls_mapping)
+            compare_future = executor.submit(all_sigs_compare, sig_index.sigs_list, local_state=local_state)
+        compare_dict = compare_future.result() if compare_future else None
+    if compare_dict is not None:
+        print('Compare Dict: {}'.format(compare_dict))
+    if repos_pulls_mapping is None:
+        log.logger.error('Fail to get pulls, exit...')
+        sys.exit(1)
+    return data_dir, sig_index, repos_pulls_mapping, compare_dict
+
+
+def command_run(args):
+    """
+    Fetch, compare, render and send in one go, resuming from the checkpoints of the run if any
+    :param args: namespace of the arguments
+    """
+    if args.shard:
+        metrics.shards.append('{}/{}'.format(*args.shard))
+    run_id = args.run_id or RUN_ID or datetime.date.today().isoformat()
+    checkpoint = os.path.join(CHECKPOINT_DIR, run_id) if CHECKPOINTS else None
+    fetched = os.path.join(checkpoint, 'fetched.json.gz') if checkpoint else None
+    with working_dir_lock():
+        snapshot = load_snapshot(fetched) if fetched and os.path.exists(fetched) else None
+        if snapshot is not None:
+            log.logger.info('Resume run {} from the checkpoint {}'.format(run_id, fetched))
+            sig_index, repos_pulls_mapping, compare_dict, now = snapshot
+            data_dir = prepare_data_dir()
+        else:
+            data_dir, sig_index, repos_pulls_mapping, compare_dict = fetch_run()
+            now = datetime.datetime.today()
+            if checkpoint:
+                prune_checkpoints(run_id)
+                os.makedirs(checkpoint, exist_ok=True)
+                save_snapshot(fetched, sig_index, repos_pulls_mapping, compare_dict, now)
+        if args.record:
+            save_snapshot(args.record, sig_index, repos_pulls_mapping, compare_dict, now)
+        with SendLedger(run_id) if CHECKPOINTS else contextlib.nullcontext() as ledger:
+            pr_statistics(data_dir, sig_index, repos_pulls_mapping, compare_dict, now, args.receivers,
+                          shard=args.shard, ledger=ledger, checkpoint=checkpoint, policy=args.send_policy)
+    export_metrics(args.shard)
+
+
+def command_fetch(args):
+    """
+    Fetch sigs, pulls and, unless skipped, the compare info into a snapshot shared by later stages
+    :param args: namespace of the arguments
+    """
+    with working_dir_lock():
+        _, sig_index, repos_pulls_mapping, compare_dict = fetch_run(compare=not args.no_compare)
+    save_snapshot(args.snapshot, sig_index, repos_pulls_mapping, compare_dict, datetime.datetime.today())
+    export_metrics()
+
+
+def command_compare(args):
+    """
+    Compare processed rates of sigs and store them in a snapshot
+    :param args: namespace of the arguments
+    """
+    snapshot = load_snapshot(args.snapshot)
+    if snapshot is None:
+        sys.exit(1)
+    sig_index, repos_pulls_mapping, _, now = snapshot
+    local_state = LocalSigState(sig_index, repos_pulls_mapping) if RATE_LOCAL else None
+    compare_dict = all_sigs_compare(sig_index.sigs_list, local_state=local_state)
     print('Compare Dict: {}'.format(compare_dict))
-    repos_pulls_mapping = get_repos_pulls_mapping()
-    pr_statistics(data_dir, sigs, repos_pulls_mapping, compare_dict)
+    save_snapshot(args.snapshot, sig_index, repos_pulls_mapping, compare_dict, now)
+    export_metrics()
+
+
+def command_render(args):
+    """
+    Render reports from a snapshot into a directory without network access
+    :param args: namespace of the arguments
+    """
+    replay(args.snapshot, args.receivers, args.output_dir, args.shard)
+
+
+def command_send(args):
+    """
+    Render reports from a snapshot and send them
+    :param args: namespace of the arguments
+    """
+    if args.shard:
+        metrics.shards.append('{}/{}'.format(*args.shard))
+    send_from_snapshot(args.snapshot, args.receivers, args.shard, args.run_id, args.send_policy)
+    export_metrics(args.shard)
+
+
+def command_daemon(args):
+    """
+    Run as a daemon, loading the state from a snapshot or by fetching everything
+    :param args: namespace of the arguments
+    """
+    daemon = Daemon(args.send_policy)
+    if args.snapshot:
+        snapshot = load_compared_snapshot(args.snapshot)
+        daemon.load(*snapshot)
+    else:
+        daemon.resync()
+        if daemon.sig_index is None:
+            sys.exit(1)
+    server = create_daemon_server(daemon, args.host, args.port)
+    log.logger.info('Listen on {}:{}'.format(*server.server_address[:2]))
+    scheduler = threading.Thread(target=daemon.schedule, daemon=True)
+    scheduler.start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stopped.set()
+        server.server_close()
+        export_metrics()
+
+
+def command_merge_summaries(args):
+    """
+    Merge run summaries of shards
+    :param args: namespace of the arguments
+    """
+    merge_summaries(args.summaries).export()
+
+
+COMMANDS = {
+    'run': (command_run, 'fetch, compare, render and send, the default command'),
+    'fetch': (command_fetch, 'fetch sigs, pulls and compare info into a snapshot'),
+    'compare': (command_compare, 'compare processed rates of sigs into a snapshot'),
+    'render': (command_render, 'render reports from a snapshot into a directory'),
+    'send': (command_send, 'render reports from a snapshot and send them'),
+    'merge-summaries': (command_merge_summaries, 'merge run summaries of shards'),
+    'daemon': (command_daemon, 'keep the state in memory, apply webhook events and send scheduled digests')
+}
+
+
+def parse_args(argv=None):
+    """
+    Parse command line arguments, the run command is used if none is given
+    :param argv: arguments, defaults to sys.argv
+    :return: namespace of the arguments
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if not argv or argv[0] not in COMMANDS and argv[0] not in ['-h', '--help']:
+        argv.insert(0, 'run')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--log-file', default=LOG_FILE, help='path of the log file')
+    common.add_argument('--log-level', default=LOG_LEVEL, choices=list(Logger.level_relations))
+    receivers = argparse.ArgumentParser(add_help=False)
+    receivers.add_argument('--receivers', type=lambda x: [i for i in x.split(',') if i],
+                           help='comma separated Gitee IDs to report to, all reviewers by default')
+    receivers.add_argument('--shard', type=parse_shard, metavar='i/N',
+                           help='only report to the receivers of shard i out of N, partitioned by Gitee ID')
+    parser = argparse.ArgumentParser(description='Send statistics of open Pull Requests to their reviewers')
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    subcommands = {}
+    for name, (func, help_text) in COMMANDS.items():
+        parents = [common, receivers] if name in ['run', 'render', 'send'] else [common]
+        subcommands[name] = subparsers.add_parser(name, parents=parents, help=help_text, description=help_text)
+        subcommands[name].set_defaults(func=func)
+    subcommands['run'].add_argument('--record', metavar='SNAPSHOT',
+                                    help='also record the sigs, pulls and compare info of the run to a snapshot')
+    for name in ['run', 'send', 'daemon']:
+        subcommands[name].add_argument('--send-policy', default=SEND_POLICY, choices=SEND_POLICIES,
+                                       help='send every report, only changed ones, or changed ones and unchanged '
+                                            'ones last sent SEND_POLICY_DAYS ago, defaults to SEND_POLICY')
+    for name in ['run', 'send']:
+        subcommands[name].add_argument('--run-id', help='id of the run in checkpoints and the send ledger, '
+                                                        'defaults to RUN_ID or the day')
+    for name in ['fetch', 'compare', 'render', 'send']:
+        subcommands[name].add_argument('snapshot', metavar='SNAPSHOT', help='path of the snapshot file')
+    subcommands['fetch'].add_argument('--no-compare', action='store_true',
+                                      help='do not compare processed rates, leave it to the compare command')
+    subcommands['render'].add_argument('--output-dir', default='data', help='directory to write the reports to')
+    subcommands['daemon'].add_argument('--host', default=DAEMON_HOST, help='host to listen on')
+    subcommands['daemon'].add_argument('--port', type=int, default=DAEMON_PORT, help='port to listen on')
+    subcommands['daemon'].add_argument('--snapshot', help='load the state from a snapshot instead of fetching it')
+    subcommands['merge-summaries'].add_argument('summaries', nargs='+', metavar='SUMMARY',
+                                                help='run summaries of shards')
+    args = parser.parse_args(argv)
+    if getattr(args, 'send_policy', SEND_POLICY) not in SEND_POLICIES:
+        parser.error('invalid SEND_POLICY {}, choose from {}'.format(args.send_policy, ', '.join(SEND_POLICIES)))
+    if getattr(args, 'send_policy', 'always') != 'always' and not REPORT_DIGESTS:
+        parser.error('send policy {} needs the digests of sent reports, REPORT_DIGESTS is empty'.format(
+            args.send_policy))
+    return args
+
+
+def main(argv=None):
+    """
+    main function
+    :param argv: command line arguments, defaults to sys.argv
+    """
+    args = parse_args(argv)
+    log.setup(args.log_file, level=args.log_level)
+    args.func(args)
 
 
 if __name__ == '__main__':
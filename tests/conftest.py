@@ -0,0 +1,32 @@
+import os
+import sys
+import tempfile
+import threading
+
+import pytest
+
+# settings are read when pr_statistics is imported: retry fast and keep every store out of the working tree
+os.environ.setdefault('CACHE_DIR', tempfile.mkdtemp(prefix='pr-statistics-tests-'))
+os.environ.setdefault('HTTP_RETRIES', '3')
+os.environ.setdefault('HTTP_BACKOFF', '0.01')
+os.environ.setdefault('HTTP_TIMEOUT', '5')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def serve():
+    """
+    Start servers in daemon threads and shut them down after the test
+    :return: a function serving the given server and returning it
+    """
+    servers = []
+
+    def start(server):
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,81 @@
+import os
+import subprocess
+
+import pytest
+
+import pr_statistics
+
+
+def git(*args, cwd=None):
+    return subprocess.run(['git'] + list(args), cwd=cwd, check=True, stdout=subprocess.PIPE,
+                          stderr=subprocess.DEVNULL, universal_newlines=True).stdout.strip()
+
+
+def commit_file(work, path, content):
+    os.makedirs(os.path.dirname(os.path.join(work, path)), exist_ok=True)
+    with open(os.path.join(work, path), 'w') as f:
+        f.write(content)
+    git('add', path, cwd=work)
+    git('commit', '-q', '-m', 'update {}'.format(path), cwd=work)
+    git('push', '-q', 'origin', 'master', cwd=work)
+    return git('rev-parse', 'HEAD', cwd=work)
+
+
+@pytest.fixture
+def upstream(tmp_path, monkeypatch):
+    """
+    A bare community repository with a sig and other directories, COMMUNITY_URL points at it
+    :return: a function committing a file to the upstream and returning the new commit
+    """
+    for key in ['AUTHOR', 'COMMITTER']:
+        monkeypatch.setenv('GIT_{}_NAME'.format(key), 'test')
+        monkeypatch.setenv('GIT_{}_EMAIL'.format(key), 'test@example.com')
+    bare = str(tmp_path / 'community.git')
+    work = str(tmp_path / 'work')
+    git('init', '-q', '--bare', bare)
+    git('clone', '-q', bare, work)
+    git('checkout', '-q', '-b', 'master', cwd=work)
+    commit_file(work, 'README.md', 'community')
+    commit_file(work, 'other/file.txt', 'not a sig')
+    commit_file(work, 'sig/sig-a/sig-info.yaml', 'name: sig-a\n')
+    monkeypatch.setattr(pr_statistics, 'COMMUNITY_URL', 'file://' + bare)
+    monkeypatch.setattr(pr_statistics, 'COMMUNITY_BRANCH', 'master')
+    monkeypatch.setattr(pr_statistics, 'COMMUNITY_SYNC', 'incremental')
+    return lambda path, content: commit_file(work, path, content)
+
+
+def test_first_clone_is_sparse_and_shallow(upstream, tmp_path):
+    community = str(tmp_path / 'community')
+    commit, changed = pr_statistics.sync_community(community)
+    assert changed
+    assert commit == git('rev-parse', 'HEAD', cwd=community)
+    assert git('rev-parse', '--is-shallow-repository', cwd=community) == 'true'
+    assert git('rev-list', '--count', 'HEAD', cwd=community) == '1'
+    directories = [x for x in os.listdir(community) if os.path.isdir(os.path.join(community, x))]
+    assert sorted(directories) == ['.git', 'sig']
+    assert os.path.exists(os.path.join(community, 'sig', 'sig-a', 'sig-info.yaml'))
+
+
+def test_unchanged_upstream(upstream, tmp_path):
+    community = str(tmp_path / 'community')
+    commit, _ = pr_statistics.sync_community(community)
+    assert pr_statistics.sync_community(community) == (commit, False)
+
+
+def test_new_upstream_commit_is_fetched(upstream, tmp_path):
+    community = str(tmp_path / 'community')
+    pr_statistics.sync_community(community)
+    new_commit = upstream('sig/sig-b/sig-info.yaml', 'name: sig-b\n')
+    assert pr_statistics.sync_community(community) == (new_commit, True)
+    assert os.path.exists(os.path.join(community, 'sig', 'sig-b', 'sig-info.yaml'))
+    assert git('rev-parse', '--is-shallow-repository', cwd=community) == 'true'
+
+
+def test_failed_fetch_clones_again(upstream, tmp_path):
+    community = str(tmp_path / 'community')
+    pr_statistics.sync_community(community)
+    git('remote', 'set-url', 'origin', str(tmp_path / 'missing.git'), cwd=community)
+    new_commit = upstream('sig/sig-b/sig-info.yaml', 'name: sig-b\n')
+    assert pr_statistics.sync_community(community) == (new_commit, True)
+    assert git('remote', 'get-url', 'origin', cwd=community) == pr_statistics.COMMUNITY_URL
+    assert os.path.exists(os.path.join(community, 'sig', 'sig-b', 'sig-info.yaml'))
@@ -0,0 +1,194 @@
+import copy
+import datetime
+import fcntl
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import pr_statistics
+
+
+def parsed_sig(name, repositories, maintainers):
+    return {'name': name, 'repositories': repositories, 'maintainers': maintainers, 'sig_info_mark': False,
+            'committers_mapping': {}, 'emails': [(x, '{}@example.com'.format(x)) for x in maintainers]}
+
+
+def pull(repo, number, title='title', created_at='2026-10-01 08:00:00'):
+    return {'link': 'https://gitee.com/openeuler/{}/pulls/{}'.format(repo, number), 'title': title,
+            'ref': 'master', 'created_at': created_at, 'draft': False, 'labels': 'openeuler-cla/yes',
+            'mergeable': True}
+
+
+@pytest.fixture
+def daemon():
+    """
+    A daemon loaded with sig-a (repo-a, user1 and user2) and sig-b (repo-b, user3), one open pull in each repo
+    """
+    sig_index = pr_statistics.SigIndex([parsed_sig('sig-a', ['openeuler/repo-a'], ['user1', 'user2']),
+                                        parsed_sig('sig-b', ['openeuler/repo-b'], ['user3'])], 'abc')
+    daemon = pr_statistics.Daemon(token='')
+    daemon.load(sig_index, pr_statistics.group_pulls_by_repo([pull('repo-a', 1), pull('repo-b', 1)]), {})
+    return daemon
+
+
+def links(daemon, reviewer):
+    return [x.link.rsplit('/', 3)[1] + '/' + x.link.rsplit('/', 1)[1] for x in daemon.open_pr_dict.get(reviewer, [])]
+
+
+def records(daemon):
+    return {k: [(x.sig, x.link, x.title, x.age, x.status) for x in v] for k, v in daemon.open_pr_dict.items()}
+
+
+def post(daemon, event):
+    return daemon.handle('POST', '/webhook', {}, json.dumps(event).encode('utf-8'))
+
+
+def test_events_fan_out_to_the_reviewers_of_the_repo(daemon):
+    user3 = daemon.open_pr_dict['user3']
+    assert post(daemon, {'action': 'open', 'pull': pull('repo-a', 2)})[0] == 200
+    assert links(daemon, 'user1') == links(daemon, 'user2') == ['repo-a/1', 'repo-a/2']
+    assert daemon.open_pr_dict['user3'] is user3
+    assert daemon.apply('update', pull('repo-a', 2, 'changed')) == ['user1', 'user2']
+    assert [x.title for x in daemon.open_pr_dict['user1']] == ['title', 'changed']
+    assert daemon.apply('close', {'link': pull('repo-a', 1)['link']}) == ['user1', 'user2']
+    assert links(daemon, 'user1') == ['repo-a/2']
+    # closed twice
+    assert daemon.apply('merge', {'link': pull('repo-a', 1)['link']}) == []
+    assert daemon.apply('close', {'link': pull('repo-b', 1)['link']}) == ['user3']
+    assert 'user3' not in daemon.open_pr_dict
+    assert daemon.status()['events'] == 5
+
+
+def test_events_invalidate_the_pages_of_the_repo(daemon):
+    for view, name in [('reviewer', 'user1'), ('reviewer', 'user3'), ('sig', 'sig-a'), ('sig', 'sig-b')]:
+        assert daemon.page(view, name)
+    daemon.apply('open', pull('repo-a', 2))
+    assert sorted(daemon.pages.pages) == [('reviewer', 'user3', 'html'), ('sig', 'sig-b', 'html')]
+    assert b'repo-a/pulls/2' in daemon.page('reviewer', 'user1')
+
+
+def test_iso_creation_time_is_accepted(daemon):
+    created_at = datetime.datetime.now().astimezone() - datetime.timedelta(days=3, hours=1)
+    event = {'action': 'open', 'pull': pull('repo-a', 2, created_at=created_at.astimezone(
+        datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ'))}
+    assert post(daemon, event)[0] == 200
+    assert [x.age for x in daemon.open_pr_dict['user1'] if x.link.endswith('/2')] == [3]
+
+
+@pytest.mark.parametrize('event', [
+    {'action': 'open', 'pull': 'not a pull'},
+    {'action': 'open', 'pull': [pull('repo-a', 2)]},
+    {'action': 'reopen', 'pull': pull('repo-a', 2)},
+    {'action': 'close', 'pull': {'link': 'https://gitee.com/openeuler'}},
+    {'action': 'close', 'pull': {'link': 'https://gitee.com/openeuler/repo-a/pulls'}},
+    {'action': 'close', 'pull': {'link': 42}},
+    {'action': 'open', 'pull': dict(pull('repo-a', 2), link='https://gitee.com/openeuler/repo-a/issues/2')},
+    {'action': 'open', 'pull': {'link': pull('repo-a', 2)['link']}},
+    {'action': 'open', 'pull': dict(pull('repo-a', 2), created_at='yesterday')},
+    {'action': 'open', 'pull': dict(pull('repo-a', 2), created_at=None)},
+    {'action': 'open', 'pull': dict(pull('repo-a', 2), title=['title'])},
+    {'action': 'open', 'pull': dict(pull('repo-a', 2), draft='false')},
+    'not an event',
+])
+def test_malformed_events_are_rejected(daemon, event):
+    mapping = copy.deepcopy(dict(daemon.repos_pulls_mapping))
+    open_pr_dict = records(daemon)
+    status, content_type, body = post(daemon, event)
+    assert status == 400 and body.startswith('invalid event')
+    assert dict(daemon.repos_pulls_mapping) == mapping
+    assert records(daemon) == open_pr_dict
+    assert daemon.status()['events'] == 0
+
+
+def test_failed_fan_out_leaves_the_state(daemon, monkeypatch):
+    daemon.apply('open', pull('repo-a', 2))
+    mapping = copy.deepcopy(dict(daemon.repos_pulls_mapping))
+    positions = dict(daemon.repos_pulls_mapping.positions)
+    open_pr_dict = records(daemon)
+
+    def record_key(record):
+        raise KeyError(record.sig)
+
+    monkeypatch.setattr(daemon, 'record_key', record_key)
+    for action, event_pull in [('open', pull('repo-a', 3)), ('update', pull('repo-a', 1, 'changed')),
+                               ('close', {'link': pull('repo-a', 1)['link']})]:
+        with pytest.raises(KeyError):
+            daemon.apply(action, event_pull)
+        assert dict(daemon.repos_pulls_mapping) == mapping
+        assert daemon.repos_pulls_mapping.positions == positions
+        assert records(daemon) == open_pr_dict
+
+
+def test_failed_resync_keeps_the_state_and_retries(monkeypatch):
+    def fetch_run(**kwargs):
+        raise ValueError('broken sig-info.yaml')
+
+    monkeypatch.setattr(pr_statistics, 'fetch_run', fetch_run)
+    daemon = pr_statistics.Daemon()
+    daemon.loaded_at = 1000
+    assert daemon.resync() is False
+    assert daemon.loaded_at == 1000
+    retry = time.time() + pr_statistics.DAEMON_RETRY_MINUTES * 60
+    assert retry - 5 < daemon.next_resync <= retry
+
+
+def test_resync_holds_the_locks(monkeypatch, tmp_path):
+    monkeypatch.setattr(pr_statistics, 'CACHE_DIR', str(tmp_path))
+    daemon = pr_statistics.Daemon()
+    locked = []
+
+    def fetch_run(**kwargs):
+        locked.append(daemon.digest_lock.locked())
+        with open(os.path.join(str(tmp_path), 'run.lock'), 'w') as f:
+            with pytest.raises(OSError):
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        raise ValueError('stop after the checks')
+
+    monkeypatch.setattr(pr_statistics, 'fetch_run', fetch_run)
+    assert daemon.resync() is False
+    assert locked == [True]
+    assert not daemon.digest_lock.locked()
+
+
+def test_resync_fails_while_another_run_holds_the_working_directory(monkeypatch, tmp_path):
+    monkeypatch.setattr(pr_statistics, 'CACHE_DIR', str(tmp_path))
+    fetches = []
+    monkeypatch.setattr(pr_statistics, 'fetch_run', lambda **kwargs: fetches.append(kwargs))
+    daemon = pr_statistics.Daemon()
+    with open(os.path.join(str(tmp_path), 'run.lock'), 'w') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        assert daemon.resync() is False
+    assert fetches == []
+    assert daemon.next_resync > time.time()
+
+
+def test_scheduler_survives_failures(monkeypatch):
+    monkeypatch.setattr(pr_statistics, 'DAEMON_RETRY_MINUTES', 0.001)
+    daemon = pr_statistics.Daemon()
+    daemon.next_resync = time.time() + 3600
+    first_send = datetime.datetime.today() + datetime.timedelta(seconds=0.1)
+    monkeypatch.setattr(daemon, 'next_send', lambda now: first_send if now < first_send else
+                        now + datetime.timedelta(days=1))
+    run_ids = []
+    sent = threading.Event()
+
+    def digest(run_id=None):
+        run_ids.append(run_id)
+        if len(run_ids) < 3:
+            raise OSError('SMTP server unreachable')
+        sent.set()
+        return 1, 0
+
+    monkeypatch.setattr(daemon, 'digest', digest)
+    scheduler = threading.Thread(target=daemon.schedule, daemon=True)
+    scheduler.start()
+    try:
+        assert sent.wait(5)
+    finally:
+        daemon.stopped.set()
+        scheduler.join(5)
+    assert not scheduler.is_alive()
+    assert run_ids == ['daemon-{}'.format(first_send.date().isoformat())] * 3
@@ -0,0 +1,176 @@
+import collections
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+import pr_statistics
+
+PER_PAGE = 5
+
+
+class PullsHandler(BaseHTTPRequestHandler):
+    """
+    Serve /pulls like ipb.osinfra.cn, with a delay and failing status codes injected per page
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        page = int(query['page'][0])
+        per_page = int(query['per_page'][0])
+        with self.server.lock:
+            attempt = self.server.requests[page]
+            self.server.requests[page] += 1
+        delay = self.server.delays.get(page, 0)
+        if delay:
+            time.sleep(delay)
+        failures = self.server.failures.get(page, [])
+        if attempt < len(failures):
+            self.send_error(failures[attempt])
+            return
+        start = (page - 1) * per_page
+        body = {'data': self.server.pulls[start:start + per_page]}
+        if self.server.total is not None:
+            body['total'] = self.server.total
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class PullsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, count, total=None, delays=None, failures=None):
+        super().__init__(('127.0.0.1', 0), PullsHandler)
+        self.pulls = [{'link': 'https://gitee.com/owner/repo/pulls/{}'.format(x), 'draft': False, 'labels': '',
+                       'mergeable': True} for x in range(count)]
+        self.total = total
+        self.delays = delays or {}
+        self.failures = failures or {}
+        self.lock = threading.Lock()
+        self.requests = collections.Counter()
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/pulls'.format(self.server_address[1])
+
+
+@pytest.fixture
+def pulls_api(serve, monkeypatch):
+    """
+    Point the pulls API at a local stub paging PER_PAGE pulls at a time, without the HTTP cache
+    :return: a function starting the stub with the arguments of PullsServer
+    """
+
+    def start(count, total='count', **kwargs):
+        server = serve(PullsServer(count, count if total == 'count' else total, **kwargs))
+        monkeypatch.setattr(pr_statistics, 'PULLS_URL', server.url)
+        return server
+
+    monkeypatch.setattr(pr_statistics, 'PULLS_PER_PAGE', PER_PAGE)
+    monkeypatch.setattr(pr_statistics, 'HTTP_CACHE', '')
+    return start
+
+
+def flatten(pages):
+    return [x for page in pages for x in page]
+
+
+def test_pages_are_yielded_in_order(pulls_api):
+    # later pages answer first
+    api = pulls_api(23, delays={2: 0.3, 3: 0.2, 4: 0.1})
+    pages = list(pr_statistics.iter_enterprise_pulls(concurrency=4))
+    assert [len(x) for x in pages] == [5, 5, 5, 5, 3]
+    assert flatten(pages) == api.pulls
+    assert api.requests == {1: 1, 2: 1, 3: 1, 4: 1, 5: 1}
+
+
+@pytest.mark.parametrize('total', [8, 60, None])
+def test_stale_or_missing_total(pulls_api, total):
+    api = pulls_api(23, total=total)
+    pages = list(pr_statistics.iter_enterprise_pulls(concurrency=3))
+    assert flatten(pages) == api.pulls
+    assert all(api.requests[x] == 1 for x in range(1, 6))
+
+
+def test_empty_trailing_page(pulls_api):
+    api = pulls_api(20)
+    pages = list(pr_statistics.iter_enterprise_pulls(concurrency=4))
+    assert [len(x) for x in pages] == [5, 5, 5, 5, 0]
+    assert flatten(pages) == api.pulls
+    assert 6 not in api.requests
+
+
+def test_retryable_status_codes_are_retried(pulls_api):
+    api = pulls_api(23, failures={1: [503], 3: [503, 429], 5: [502, 500, 504]})
+    pages = list(pr_statistics.iter_enterprise_pulls(concurrency=4))
+    assert flatten(pages) == api.pulls
+    assert api.requests == {1: 2, 2: 1, 3: 3, 4: 1, 5: 4}
+
+
+def test_failed_page_stops_iteration(pulls_api):
+    # page 2 fails after all retries while the following pages are in flight
+    api = pulls_api(40, failures={2: [503] * 10}, delays={3: 0.1, 4: 0.1})
+    pages = []
+    with pytest.raises(requests.RequestException, match='page 2'):
+        for page in pr_statistics.iter_enterprise_pulls(concurrency=4):
+            pages.append(page)
+    assert pages == [api.pulls[:PER_PAGE]]
+    assert api.requests[2] == pr_statistics.HTTP_RETRIES + 1
+
+
+def test_failed_first_page(pulls_api):
+    api = pulls_api(23, failures={1: [503] * 10})
+    with pytest.raises(requests.RequestException, match='page 1'):
+        list(pr_statistics.iter_enterprise_pulls(concurrency=4))
+    assert api.requests == {1: pr_statistics.HTTP_RETRIES + 1}
+
+
+def test_other_status_codes_are_not_retried(pulls_api):
+    api = pulls_api(23, failures={1: [404]})
+    with pr_statistics.create_session() as session:
+        r = pr_statistics.request_with_retry(session, api.url, params={'page': 1, 'per_page': PER_PAGE})
+    assert r.status_code == 404
+    assert api.requests == {1: 1}
+
+
+def test_backoff_between_retries(pulls_api, monkeypatch):
+    api = pulls_api(23, failures={1: [503] * 10})
+    delays = []
+    monkeypatch.setattr(pr_statistics.time, 'sleep', delays.append)
+    with pr_statistics.create_session() as session:
+        r = pr_statistics.request_with_retry(session, api.url, params={'page': 1, 'per_page': PER_PAGE},
+                                             retries=3, backoff=0.5)
+    assert r.status_code == 503
+    assert api.requests == {1: 4}
+    assert len(delays) == 3
+    assert all(0 <= x <= 0.5 * 2 ** attempt for attempt, x in enumerate(delays))
+
+
+def test_connection_errors_are_retried():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    with pr_statistics.create_session() as session:
+        r = pr_statistics.request_with_retry(session, 'http://127.0.0.1:{}/pulls'.format(port), retries=2, backoff=0)
+    assert r is None
+
+
+def test_failed_fetch_does_not_fall_back_to_the_store(pulls_api, monkeypatch, tmp_path):
+    monkeypatch.setattr(pr_statistics, 'PULLS_STORE', str(tmp_path / 'pulls.sqlite3'))
+    api = pulls_api(23)
+    repos_pulls_mapping = pr_statistics.get_repos_pulls_mapping()
+    assert repos_pulls_mapping['owner/repo'] == api.pulls
+    api.failures = {3: [503] * 10}
+    assert pr_statistics.get_repos_pulls_mapping() is None
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import pr_statistics
+
+
+class ValidatorsHandler(BaseHTTPRequestHandler):
+    """
+    Serve the body of the server with an ETag and a Last-Modified if enabled, a request with a matching
+    If-None-Match or If-Modified-Since is answered with 304 Not Modified
+    """
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        data = json.dumps(self.server.body).encode('utf-8')
+        etag = '"{}"'.format(hashlib.sha1(data).hexdigest())
+        with self.server.lock:
+            self.server.requests.append(dict(self.headers))
+        not_modified = ((self.server.etag and self.headers.get('If-None-Match') == etag) or
+                        (self.server.last_modified and
+                         self.headers.get('If-Modified-Since') == self.server.last_modified))
+        self.send_response(304 if not_modified else 200)
+        if self.server.etag:
+            self.send_header('ETag', etag)
+        if self.server.last_modified:
+            self.send_header('Last-Modified', self.server.last_modified)
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class ValidatorsServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, etag=True, last_modified=None):
+        super().__init__(('127.0.0.1', 0), ValidatorsHandler)
+        self.body = {'data': [1, 2, 3]}
+        self.etag = etag
+        self.last_modified = last_modified
+        self.lock = threading.Lock()
+        self.requests = []
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/pulls'.format(self.server_address[1])
+
+
+@pytest.fixture
+def session():
+    with pr_statistics.create_session() as session:
+        yield session
+
+
+def test_fresh_response_is_served_without_a_request(serve, session, tmp_path):
+    api = serve(ValidatorsServer())
+    with pr_statistics.HTTPCache(str(tmp_path / 'http.sqlite3'), ttls={api.url: 60}) as cache:
+        first = cache.request(session, api.url, params={'page': 1})
+        second = cache.request(session, api.url, params={'page': 1})
+    assert first.status_code == 200 and second.status_code == 200
+    assert isinstance(second, pr_statistics.CachedResponse)
+    assert second.json() == api.body
+    assert len(api.requests) == 1
+
+
+def test_parameters_are_part_of_the_key(serve, session, tmp_path):
+    api = serve(ValidatorsServer())
+    with pr_statistics.HTTPCache(str(tmp_path / 'http.sqlite3'), ttls={api.url: 60}) as cache:
+        cache.request(session, api.url, params={'page': 1})
+        cache.request(session, api.url, params={'page': 2})
+    assert len(api.requests) == 2
+
+
+@pytest.mark.parametrize('etag, last_modified', [(True, None), (False, 'Sat, 17 Oct 2026 00:00:00 GMT')])
+def test_stale_response_is_revalidated(serve, session, tmp_path, etag, last_modified):
+    api = serve(ValidatorsServer(etag, last_modified))
+    with pr_statistics.HTTPCache(str(tmp_path / 'http.sqlite3'), ttls={api.url: 0}) as cache:
+        cache.request(session, api.url)
+        key = cache.key(api.url)
+        cache.touch(key, 1000)
+        r = cache.request(session, api.url)
+        validated_at = cache.get(key)[3]
+    assert isinstance(r, pr_statistics.CachedResponse)
+    assert r.json() == api.body
+    assert len(api.requests) == 2
+    if etag:
+        assert 'If-None-Match' in api.requests[1]
+    else:
+        assert api.requests[1]['If-Modified-Since'] == last_modified
+    assert validated_at > time.time() - 60
+
+
+def test_expired_response_is_replaced_when_changed(serve, session, tmp_path):
+    api = serve(ValidatorsServer())
+    with pr_statistics.HTTPCache(str(tmp_path / 'http.sqlite3'), ttls={api.url: 60}) as cache:
+        cache.request(session, api.url)
+        key = cache.key(api.url)
+        # older than the TTL of the endpoint
+        cache.touch(key, time.time() - 120)
+        api.body = {'data': [4, 5]}
+        r = cache.request(session, api.url)
+        assert r.json() == api.body
+        assert cache.request(session, api.url).json() == api.body
+    assert not isinstance(r, pr_statistics.CachedResponse)
+    assert len(api.requests) == 2
+    assert 'If-None-Match' in api.requests[1]
+
+
+def test_response_without_validators_is_not_kept(serve, session, tmp_path):
+    api = serve(ValidatorsServer(etag=False))
+    with pr_statistics.HTTPCache(str(tmp_path / 'http.sqlite3'), ttls={api.url: 0}) as cache:
+        cache.request(session, api.url)
+        assert cache.get(cache.key(api.url)) is None
+        cache.request(session, api.url)
+    assert len(api.requests) == 2
+    assert all('If-None-Match' not in x for x in api.requests)
+
+
+def test_old_responses_are_dropped(serve, session, tmp_path):
+    api = serve(ValidatorsServer())
+    path = str(tmp_path / 'http.sqlite3')
+    with pr_statistics.HTTPCache(path, ttls={api.url: 0}) as cache:
+        cache.request(session, api.url)
+        cache.touch(cache.key(api.url), time.time() - 8 * 3600 * 24)
+    with pr_statistics.HTTPCache(path, retention_days=7, ttls={api.url: 0}) as cache:
+        assert cache.get(cache.key(api.url)) is None
+
+
+def test_corrupt_cache_file_is_ignored(serve, session, tmp_path, monkeypatch):
+    api = serve(ValidatorsServer())
+    path = tmp_path / 'http.sqlite3'
+    path.write_bytes(b'not a database\n' * 512)
+    monkeypatch.setattr(pr_statistics, 'HTTP_CACHE', str(path))
+    with pr_statistics.open_http_cache() as cache:
+        cache.ttls = {api.url: 60}
+        assert cache.request(session, api.url).json() == api.body
+        assert cache.request(session, api.url).json() == api.body
+    assert len(api.requests) == 1
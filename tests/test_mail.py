@@ -0,0 +1,209 @@
+import os
+import smtplib
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+import pr_statistics
+
+
+class StubSMTPHandler(socketserver.StreamRequestHandler):
+    """
+    Accept messages without STARTTLS, drop the connection once it sent drop_after messages, refuse the recipients
+    in refused, every login if reject_auth and every connection if reject_connection
+    """
+
+    def reply(self, line):
+        self.wfile.write((line + '\r\n').encode('utf-8'))
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+            self.server.open_connections += 1
+        try:
+            self.serve()
+        finally:
+            with self.server.lock:
+                self.server.open_connections -= 1
+
+    def serve(self):
+        if self.server.reject_connection:
+            self.reply('554 no service')
+            return
+        sent = 0
+        self.reply('220 stub')
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            if command.upper().startswith(('EHLO', 'HELO')):
+                self.reply('250-stub')
+                self.reply('250-AUTH PLAIN')
+                self.reply('250 8BITMIME')
+            elif command.upper().startswith('AUTH'):
+                with self.server.lock:
+                    self.server.logins += 1
+                self.reply('535 authentication failed' if self.server.reject_auth else '235 ok')
+            elif command.upper().startswith('MAIL'):
+                if self.server.drop_after and sent >= self.server.drop_after:
+                    return
+                self.reply('250 ok')
+            elif command.upper().startswith('RCPT'):
+                if any(x in command for x in self.server.refused):
+                    self.reply('550 no such user')
+                else:
+                    self.reply('250 ok')
+            elif command.upper() == 'DATA':
+                self.reply('354 end data with <CR><LF>.<CR><LF>')
+                for line in iter(self.rfile.readline, b''):
+                    if line == b'.\r\n':
+                        break
+                sent += 1
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply('250 queued')
+            elif command.upper() == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('250 ok')
+
+
+class StubSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, drop_after=0, refused=(), reject_auth=False, reject_connection=False):
+        super().__init__(('127.0.0.1', 0), StubSMTPHandler)
+        self.drop_after = drop_after
+        self.refused = refused
+        self.reject_auth = reject_auth
+        self.reject_connection = reject_connection
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.open_connections = 0
+        self.logins = 0
+        self.messages = 0
+
+
+@pytest.fixture
+def smtp(serve, monkeypatch):
+    """
+    Point MailDelivery at a local stub SMTP server
+    :return: a function starting the stub with the arguments of StubSMTPServer
+    """
+
+    def start(**kwargs):
+        server = serve(StubSMTPServer(**kwargs))
+        monkeypatch.setattr(pr_statistics, 'SMTP_HOST', '127.0.0.1')
+        monkeypatch.setattr(pr_statistics, 'SMTP_PORT', server.server_address[1])
+        return server
+
+    monkeypatch.setattr(pr_statistics, 'SMTP_STARTTLS', False)
+    monkeypatch.setattr(pr_statistics, 'SMTP_USERNAME', '')
+    monkeypatch.setattr(pr_statistics, 'SMTP_SENDER', 'sender@example.com')
+    return start
+
+
+def send(delivery, count):
+    futures = [delivery.submit('<p>report {}</p>'.format(x), ['user{}@example.com'.format(x)])
+               for x in range(count)]
+    return [x.result() for x in futures]
+
+
+def test_connection_is_reused_across_messages(smtp):
+    server = smtp()
+    with pr_statistics.MailDelivery(pool_size=1) as delivery:
+        assert send(delivery, 5) == [None] * 5
+    assert server.connections == 1
+    assert server.messages == 5
+
+
+def test_pool_opens_at_most_pool_size_connections(smtp):
+    server = smtp()
+    with pr_statistics.MailDelivery(pool_size=2) as delivery:
+        assert send(delivery, 8) == [None] * 8
+    assert server.connections <= 2
+    assert server.messages == 8
+
+
+def test_reconnect_after_drop(smtp):
+    server = smtp(drop_after=2)
+    with pr_statistics.MailDelivery(pool_size=1, retries=1) as delivery:
+        assert send(delivery, 5) == [None] * 5
+    assert server.connections == 3
+    assert server.messages == 5
+    assert all(x is None for x in delivery.outcomes.values())
+
+
+def test_refused_message_is_not_retried(smtp):
+    server = smtp(refused=['user1@'])
+    with pr_statistics.MailDelivery(pool_size=1, retries=2) as delivery:
+        outcomes = send(delivery, 3)
+    assert outcomes[0] is None and outcomes[2] is None
+    assert isinstance(outcomes[1], smtplib.SMTPRecipientsRefused)
+    assert delivery.outcomes['user1@example.com'] is outcomes[1]
+    assert server.connections == 1
+    assert server.messages == 2
+
+
+def test_unexpected_error_is_a_failed_outcome(smtp, monkeypatch):
+    server = smtp()
+    sendmail = smtplib.SMTP.sendmail
+
+    def broken_sendmail(self, sender, receivers, msg):
+        if receivers == ['user1@example.com']:
+            raise ValueError('broken message')
+        return sendmail(self, sender, receivers, msg)
+
+    monkeypatch.setattr(smtplib.SMTP, 'sendmail', broken_sendmail)
+    with pr_statistics.MailDelivery(pool_size=1) as delivery:
+        outcomes = send(delivery, 3)
+    assert outcomes[0] is None and outcomes[2] is None
+    assert isinstance(outcomes[1], ValueError)
+    assert delivery.outcomes['user1@example.com'] is outcomes[1]
+    assert server.messages == 2
+
+
+def test_failed_login_fails_the_remaining_messages(smtp, monkeypatch):
+    server = smtp(reject_auth=True)
+    monkeypatch.setattr(pr_statistics, 'SMTP_USERNAME', 'sender')
+    with pr_statistics.MailDelivery(pool_size=2) as delivery:
+        outcomes = send(delivery, 6)
+    assert all(isinstance(x, smtplib.SMTPAuthenticationError) for x in outcomes)
+    assert server.logins <= 2
+    assert server.messages == 0
+    # connections failing the login are closed
+    for _ in range(50):
+        if server.open_connections == 0:
+            break
+        time.sleep(0.01)
+    assert server.open_connections == 0
+
+
+def test_failed_connection_fails_the_remaining_messages(smtp):
+    server = smtp(reject_connection=True)
+    with pr_statistics.MailDelivery(pool_size=1, retries=2) as delivery:
+        outcomes = send(delivery, 5)
+    assert all(isinstance(x, smtplib.SMTPConnectError) for x in outcomes)
+    assert server.connections == 3
+
+
+def test_empty_port_is_zero():
+    env = dict(os.environ, SMTP_PORT='')
+    output = subprocess.check_output([sys.executable, '-c', 'import pr_statistics; print(pr_statistics.SMTP_PORT)'],
+                                     cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), env=env)
+    assert output.strip() == b'0'
+
+
+@pytest.mark.parametrize('policy', ['changed', 'changed-or-days'])
+def test_send_policy_needs_the_report_digests(monkeypatch, policy):
+    monkeypatch.setattr(pr_statistics, 'REPORT_DIGESTS', '')
+    with pytest.raises(SystemExit):
+        pr_statistics.parse_args(['send', 'statistics.json.gz', '--send-policy', policy])
+    assert pr_statistics.parse_args(['send', 'statistics.json.gz', '--send-policy', 'always']).send_policy == 'always'
@@ -0,0 +1,47 @@
+import json
+
+import pr_statistics
+
+
+def pull(number, title='title'):
+    return {'link': 'https://gitee.com/owner/repo/pulls/{}'.format(number), 'title': title}
+
+
+def rows(store):
+    return {x[0].rsplit('/', 1)[1]: x[1:] for x in
+            store.conn.execute('SELECT link, first_seen, updated_at, closed_at FROM pulls')}
+
+
+def open_pulls(store):
+    return [json.loads(x[0]) for x in
+            store.conn.execute('SELECT data FROM pulls WHERE closed_at IS NULL ORDER BY position')]
+
+
+def test_sync_inserts_updates_and_closes(tmp_path):
+    with pr_statistics.PullsStore(str(tmp_path / 'pulls.sqlite3')) as store:
+        assert store.sync([pull(1), pull(2), pull(3)], synced_at=100, reported={'total': 3}) == (3, 0, 0)
+        assert store.sync([pull(1), pull(3, 'changed'), pull(4)], synced_at=200, reported={'total': 3}) == (1, 1, 1)
+        assert rows(store) == {'1': (100, 100, None), '2': (100, 100, 200), '3': (100, 200, None),
+                               '4': (200, 200, None)}
+        assert store.closures() == {'owner/repo': [200]}
+        assert [x['link'] for x in open_pulls(store)] == [pull(1)['link'], pull(3)['link'], pull(4)['link']]
+
+
+def test_sync_applies_a_shifted_pull_once(tmp_path):
+    with pr_statistics.PullsStore(str(tmp_path / 'pulls.sqlite3')) as store:
+        store.sync([pull(1), pull(2), pull(3)], synced_at=100, reported={'total': 3})
+        # pull 2 shows up on two pages, the second time with a new title
+        assert store.sync([pull(1), pull(2), pull(2, 'changed'), pull(3)], synced_at=200,
+                          reported={'total': 3}) == (0, 0, 0)
+        assert rows(store)['2'] == (100, 200, None)
+        assert [x['title'] for x in open_pulls(store)] == ['title', 'changed', 'title']
+
+
+def test_sync_does_not_close_pulls_when_some_were_skipped(tmp_path):
+    with pr_statistics.PullsStore(str(tmp_path / 'pulls.sqlite3')) as store:
+        store.sync([pull(1), pull(2), pull(3)], synced_at=100, reported={'total': 3})
+        # pull 2 is skipped by a page shift, the API still reports 3 open pulls
+        assert store.sync([pull(1), pull(3)], synced_at=200, reported={'total': 3}) == (0, 0, 0)
+        assert store.closures() == {}
+        assert store.sync([pull(1), pull(2), pull(3)], synced_at=300, reported={'total': 3}) == (0, 0, 0)
+        assert rows(store)['2'] == (100, 100, None)
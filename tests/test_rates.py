@@ -0,0 +1,55 @@
+import types
+
+import pytest
+
+import pr_statistics
+
+SIG_INDEX = types.SimpleNamespace(sigs=[{'name': 'sig-a', 'repositories': ['owner/repo']}])
+LAST_TS = 150 * 1000
+
+
+def pull(number):
+    return {'link': 'https://gitee.com/owner/repo/pulls/{}'.format(number)}
+
+
+@pytest.fixture
+def history(tmp_path):
+    with pr_statistics.RateHistory(str(tmp_path / 'rates.sqlite3')) as history:
+        # merged and closed are cumulative
+        history.put('sig-a', LAST_TS, (10, 5, 3))
+        yield history
+
+
+def local_state(tmp_path, syncs):
+    path = str(tmp_path / 'pulls.sqlite3')
+    with pr_statistics.PullsStore(path) as store:
+        for synced_at, numbers in syncs:
+            store.sync([pull(x) for x in numbers], synced_at=synced_at, reported={'total': len(numbers)})
+    return pr_statistics.LocalSigState(SIG_INDEX, {'owner/repo': [pull(x) for x in syncs[-1][1]]}, path)
+
+
+def test_closures_since_the_stored_state_are_added(tmp_path, history):
+    # pull 2 is closed before the timestamp, pull 1 after it but before the latest sync
+    state = local_state(tmp_path, [(100, [1, 2, 3]), (250, [1, 3]), (400, [3, 4])])
+    assert state.estimate('sig-a', 300 * 1000, history) == (10, 7, 2)
+
+
+def test_no_estimate_without_a_sync_before_the_stored_state(tmp_path, history):
+    state = local_state(tmp_path, [(200, [1, 2, 3]), (400, [3, 4])])
+    assert state.estimate('sig-a', 300 * 1000, history) is None
+
+
+def test_no_estimate_without_a_sync_after_the_timestamp(tmp_path, history):
+    state = local_state(tmp_path, [(100, [1, 2, 3]), (250, [1, 3])])
+    assert state.estimate('sig-a', 300 * 1000, history) is None
+
+
+def test_no_estimate_without_a_stored_state(tmp_path, history):
+    state = local_state(tmp_path, [(100, [1, 2, 3]), (400, [3, 4])])
+    assert state.estimate('sig-a', LAST_TS, history) is None
+
+
+def test_estimate_is_used_before_the_api(tmp_path, history):
+    state = local_state(tmp_path, [(100, [1, 2, 3]), (250, [1, 3]), (400, [3, 4])])
+    session = types.SimpleNamespace(get=None)
+    assert pr_statistics.cal_sig_processed_rate('sig-a', 300 * 1000, session, history, state) == round(17 / 19, 2)
@@ -0,0 +1,34 @@
+import openpyxl
+
+import pr_statistics
+
+
+def records():
+    return [pr_statistics.PullRecord('sig-a', 'openeuler/repo-a', 'master',
+                                     'https://gitee.com/openeuler/repo-a/pulls/{}'.format(x), 'fix <b> & {}'.format(x),
+                                     x * 40, pr_statistics.STATUS_CONFLICT if x % 2 else 0) for x in range(1, 4)]
+
+
+def test_xlsx_cells_are_plain_text_with_hyperlinks(tmp_path):
+    path = pr_statistics.write_statistics_xlsx(str(tmp_path / 'statistics.xlsx'), records(), {})
+    ws = openpyxl.load_workbook(path)['open_pull_requests_statistics']
+    row = [x for x in ws.iter_rows(min_row=4, max_row=4)][0]
+    assert [x.value for x in row[:4]] == ['openeuler/repo-a', 'master', '#1', 'fix <b> & 1']
+    assert row[2].hyperlink.target == 'https://gitee.com/openeuler/repo-a/pulls/1'
+    assert row[3].hyperlink.target == 'https://gitee.com/openeuler/repo-a/pulls/1'
+
+
+def test_html_escapes_titles():
+    html = pr_statistics.render_pr_html(records()[0])
+    assert "<a href='https://gitee.com/openeuler/repo-a/pulls/1'>#1</a>" in html
+    assert 'fix &lt;b&gt; &amp; 1' in html
+
+
+def test_reports_are_the_same_at_any_worker_count():
+    pr_lists = [records(), records()[1:], records()[:1]]
+    reports = [('user{}'.format(i), 'user{}@example.com'.format(i), x, None) for i, x in enumerate(pr_lists)]
+    compare_dict = {'sig-a': 'compare info'}
+    single = [x[0] for x in pr_statistics.render_reports(reports, compare_dict, workers=1)]
+    pooled = [x[0] for x in pr_statistics.render_reports(reports, compare_dict, workers=2)]
+    assert pooled == single
+    assert all('Dear user{}'.format(i) in x for i, x in enumerate(single))
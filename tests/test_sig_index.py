@@ -0,0 +1,30 @@
+import pickle
+
+import pr_statistics
+
+PARSED_SIG = {
+    'name': 'sig-a',
+    'repositories': ['openeuler/repo-a'],
+    'maintainers': ['user1'],
+    'sig_info_mark': False,
+    'committers_mapping': {},
+    'emails': [('user1', 'user1@example.com')]
+}
+
+
+def test_saved_index_is_loaded(tmp_path):
+    path = str(tmp_path / 'sig_index_abc.pickle')
+    pr_statistics.SigIndex([PARSED_SIG], 'abc').save(path)
+    sig_index = pr_statistics.SigIndex.load(path)
+    assert sig_index.commit == 'abc'
+    assert sig_index.sigs_list == ['sig-a']
+    assert sig_index.email_mappings == {'user1': 'user1@example.com'}
+
+
+def test_index_of_another_version_is_not_loaded(tmp_path):
+    path = tmp_path / 'sig_index_abc.pickle'
+    # an index written before versions were stored
+    path.write_bytes(pickle.dumps({'commit': 'abc', 'sigs': [{'name': 'sig-a'}]}))
+    assert pr_statistics.SigIndex.load(str(path)) is None
+    path.write_bytes(pickle.dumps({'version': pr_statistics.SIG_INDEX_VERSION + 1, 'commit': 'abc', 'sigs': []}))
+    assert pr_statistics.SigIndex.load(str(path)) is None